@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Benchmark reprodutível do renamerPRO© sobre um corpus sintético de NF-e
+Mede extração de chaves, varredura de pasta, renomeação (linha a linha e em lote)
+e renderização completa, e gera um relatório JSON com docs/s, latência p50/p95
+e pico de memória (RSS).
+
+Uso:
+    python benchmarks/bench_danfe.py [-n 1000] [--itens 20] [--rastros 1] [--tamanho-kb 0]
+                                     [--etapas chaves,varredura,renomeacao,render]
+                                     [--stub] [--atraso-stub-ms 50] [--php CAMINHO] [--via-pipe]
+                                     [--leitura-antecipada-mb 64] [--latencia-leitura-ms 30]
+                                     [-w auto|N] [--corpus PASTA] [--saida resultado.json]
+
+Sem --php e sem PHP em php/php.exe, use --stub: o renderizador substituto
+(renderizador_stub.py) fala o mesmo protocolo do gerador_danfe.php.
+--latencia-leitura-ms simula um armazenamento lento (ex.: compartilhamento SMB)
+acrescentando uma espera a cada leitura de XML feita pelo Python.
+Os índices e caches usam um diretório de dados temporário (RENAMERPRO_DADOS).
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR_BENCHMARKS))
+
+from corpus import gerar_corpus  # noqa: E402
+from danfe_agendador import resolver_workers  # noqa: E402
+from danfe_chaves import extrair_chave_xml, extrair_chaves_paralelo  # noqa: E402
+from danfe_dados import VARIAVEL_DADOS  # noqa: E402
+from danfe_motor import MotorDanfe  # noqa: E402
+from danfe_varredura import iterar_xmls  # noqa: E402
+
+ETAPAS = ("chaves", "varredura", "renomeacao", "render")
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo (None se vazio)"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo e dos filhos já encerrados, em MB"""
+    try:
+        import resource
+    except ImportError:
+        return _pico_rss_windows_mb()
+    escala = 1 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes no macOS, KB no Linux
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * escala
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * escala
+    return round(proprio / 2 ** 20, 1), round(filhos / 2 ** 20, 1)
+
+
+def _pico_rss_windows_mb():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ContadoresMemoria(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        contadores = ContadoresMemoria()
+        contadores.cb = ctypes.sizeof(contadores)
+        processo = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(processo, ctypes.byref(contadores), contadores.cb)
+        return round(contadores.PeakWorkingSetSize / 2 ** 20, 1), None
+    except (AttributeError, OSError):
+        return None, None
+
+
+def resumir(documentos, tempo_total, latencias, erros=0, **extras):
+    """Métricas de uma etapa no formato do relatório"""
+    proprio, filhos = pico_rss_mb()
+    resultado = {
+        "documentos": documentos,
+        "erros": erros,
+        "tempo_s": round(tempo_total, 4),
+        "docs_por_segundo": round(documentos / tempo_total, 2) if tempo_total > 0 else None,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 3) if latencias else None,
+        "pico_rss_mb": proprio,
+        "pico_rss_filhos_mb": filhos,
+    }
+    resultado.update(extras)
+    return resultado
+
+
+def medir_chaves(arquivos):
+    latencias = []
+    erros = 0
+    inicio = time.perf_counter()
+    for caminho, chave in arquivos:
+        t0 = time.perf_counter()
+        encontrada = extrair_chave_xml(caminho)
+        latencias.append(time.perf_counter() - t0)
+        erros += encontrada != chave
+    tempo_total = time.perf_counter() - inicio
+
+    # Mesma extração em lotes distribuídos entre processos (uma vez por CPU)
+    caminhos = [caminho for caminho, _ in arquivos]
+    inicio = time.perf_counter()
+    chaves = extrair_chaves_paralelo(caminhos, minimo=0)
+    tempo_processos = time.perf_counter() - inicio
+    erros += sum(encontrada != chave for encontrada, (_, chave) in zip(chaves, arquivos))
+    return resumir(len(arquivos), tempo_total, latencias, erros,
+                   processos_docs_por_segundo=round(len(arquivos) / tempo_processos, 2) if tempo_processos > 0 else None)
+
+
+def medir_varredura(pasta, documentos, repeticoes):
+    """Cada repetição varre a pasta inteira; a latência é a de uma varredura completa"""
+    latencias = []
+    encontrados = 0
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        encontrados = sum(1 for _ in iterar_xmls(pasta))
+        latencias.append(time.perf_counter() - t0)
+    mediana = percentil(latencias, 50)
+    return resumir(encontrados, mediana, latencias, erros=abs(encontrados - documentos), repeticoes=repeticoes)
+
+
+def medir_renomeacao(motor, arquivos):
+    """Renomeia todos os XMLs pela chave e depois desfaz (fora da medição)"""
+    chaves_xml = {chave: caminho for caminho, chave in arquivos}
+    latencias = []
+    erros = 0
+    inicio = time.perf_counter()
+    for indice, (_, chave) in enumerate(arquivos):
+        t0 = time.perf_counter()
+        status, _ = motor.renomear_por_chave(chave, f"NF_BENCH_{indice:07d}", chaves_xml)
+        latencias.append(time.perf_counter() - t0)
+        erros += status != "ok"
+    tempo_total = time.perf_counter() - inicio
+
+    for caminho_original, chave in arquivos:
+        if chaves_xml[chave] != caminho_original:
+            os.rename(chaves_xml[chave], caminho_original)
+
+    # Mesmos nomes pelo motor em lote (plano em memória, execução paralela, diário)
+    chaves_xml = {chave: caminho for caminho, chave in arquivos}
+    pedidos = [(indice, chave, f"NF_BENCH_{indice:07d}") for indice, (_, chave) in enumerate(arquivos)]
+    inicio = time.perf_counter()
+    operacoes, _ = motor.renomear_lote(pedidos, chaves_xml)
+    tempo_lote = time.perf_counter() - inicio
+    erros += sum(operacao.status != "ok" for operacao in operacoes)
+    motor.desfazer_ultima_renomeacao(chaves_xml)
+    return resumir(len(arquivos), tempo_total, latencias, erros,
+                   lote_docs_por_segundo=round(len(arquivos) / tempo_lote, 2) if tempo_lote > 0 else None)
+
+
+class MotorBenchmark(MotorDanfe):
+    """MotorDanfe com latência por documento e renderizador configurável"""
+
+    def __init__(self, executavel=None, script=None, latencia_leitura_ms=0, **kwargs):
+        super().__init__(**kwargs)
+        self.executavel_php = executavel
+        self.script = script
+        self.latencia_leitura_ms = latencia_leitura_ms
+        self.latencias = []
+        self._lock = threading.Lock()
+
+    def caminhos_php(self):
+        php_full_path, script_php_full, php_dir = super().caminhos_php()
+        return php_full_path, self.script or script_php_full, php_dir
+
+    def ler_xml(self, arquivo_xml):
+        if self.latencia_leitura_ms:
+            time.sleep(self.latencia_leitura_ms / 1000)
+        return super().ler_xml(arquivo_xml)
+
+    def processar_xml_individual(self, arquivo_xml, pasta_saida, tempos=None):
+        t0 = time.perf_counter()
+        try:
+            return super().processar_xml_individual(arquivo_xml, pasta_saida, tempos)
+        finally:
+            with self._lock:
+                self.latencias.append(time.perf_counter() - t0)
+
+
+def medir_render(arquivos, pasta_saida, args):
+    if args.stub:
+        os.environ["RENAMERPRO_STUB_ATRASO_MS"] = str(args.atraso_stub_ms)
+        motor = MotorBenchmark(sys.executable, os.path.join(DIR_BENCHMARKS, "renderizador_stub.py"),
+                               args.latencia_leitura_ms, log=lambda texto: None)
+    else:
+        motor = MotorBenchmark(args.php, latencia_leitura_ms=args.latencia_leitura_ms, log=lambda texto: None)
+    motor.usar_cache_render = args.com_cache
+    motor.orcamento_leitura = max(args.leitura_antecipada_mb, 0) * 2 ** 20
+    motor.enviar_conteudo = args.via_pipe or motor.orcamento_leitura > 0
+
+    sucessos, erros, tempo_total = motor.processar_xmls_paralelo(
+        [caminho for caminho, _ in arquivos], pasta_saida,
+        max_workers=resolver_workers(args.workers)
+    )
+    return resumir(sucessos + erros, tempo_total, motor.latencias, erros,
+                   renderizador="stub" if args.stub else "php", via_pipe=motor.enviar_conteudo,
+                   leitura_antecipada_mb=args.leitura_antecipada_mb,
+                   latencia_leitura_ms=args.latencia_leitura_ms)
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Benchmark do renamerPRO© com corpus sintético de NF-e")
+    parser.add_argument("-n", "--quantidade", type=int, default=1000, help="Documentos no corpus (padrão: 1000)")
+    parser.add_argument("--itens", type=int, default=20, help="Itens por nota (padrão: 20)")
+    parser.add_argument("--rastros", type=int, default=1, help="Lotes de rastro por item (padrão: 1)")
+    parser.add_argument("--tamanho-kb", type=int, default=0, help="Tamanho mínimo de cada XML em KB")
+    parser.add_argument("--proc", type=float, default=0.8, help="Proporção de procNFe (padrão: 0.8)")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do corpus (padrão: 42)")
+    parser.add_argument("--corpus", help="Pasta do corpus (padrão: temporária, apagada no fim)")
+    parser.add_argument("--etapas", default=",".join(ETAPAS), help=f"Etapas a medir (padrão: {','.join(ETAPAS)})")
+    parser.add_argument("--repeticoes-varredura", type=int, default=5, help="Varreduras completas medidas")
+    parser.add_argument("--stub", action="store_true", help="Usa o renderizador substituto em vez do PHP")
+    parser.add_argument("--atraso-stub-ms", type=float, default=0, help="Tempo simulado de render por documento")
+    parser.add_argument("--php", help="Executável PHP (padrão: php/php.exe do projeto)")
+    parser.add_argument("--com-cache", action="store_true", help="Mantém o cache de PDFs ativo na etapa render")
+    parser.add_argument("--via-pipe", action="store_true", help="XML e PDF trafegam pelo pipe do worker")
+    parser.add_argument("--leitura-antecipada-mb", type=int, default=0, help="Orçamento da leitura antecipada (0: desligada)")
+    parser.add_argument("--latencia-leitura-ms", type=float, default=0, help="Latência simulada por leitura de XML")
+    parser.add_argument("-w", "--workers", default="auto", help="Documentos simultâneos no render: auto ou N")
+    parser.add_argument("--saida", help="Grava o relatório JSON neste arquivo (padrão: STDOUT)")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    etapas = [etapa.strip() for etapa in args.etapas.split(",") if etapa.strip()]
+    desconhecidas = set(etapas) - set(ETAPAS)
+    if desconhecidas:
+        print(f"❌ Etapas desconhecidas: {', '.join(sorted(desconhecidas))}", file=sys.stderr)
+        return 2
+
+    temporario = tempfile.mkdtemp(prefix="renamerpro_bench_")
+    os.environ[VARIAVEL_DADOS] = os.path.join(temporario, "dados")
+    pasta_corpus = os.path.abspath(args.corpus) if args.corpus else os.path.join(temporario, "corpus")
+    try:
+        inicio = time.perf_counter()
+        arquivos = gerar_corpus(pasta_corpus, args.quantidade, args.itens, args.rastros,
+                                args.tamanho_kb, args.proc, args.semente)
+        tempo_corpus = time.perf_counter() - inicio
+        tamanho_medio = sum(os.path.getsize(caminho) for caminho, _ in arquivos) / max(len(arquivos), 1)
+
+        resultados = {}
+        for etapa in etapas:
+            print(f"⏱️ {etapa}...", file=sys.stderr)
+            if etapa == "chaves":
+                resultados[etapa] = medir_chaves(arquivos)
+            elif etapa == "varredura":
+                resultados[etapa] = medir_varredura(pasta_corpus, len(arquivos), max(args.repeticoes_varredura, 1))
+            elif etapa == "renomeacao":
+                resultados[etapa] = medir_renomeacao(MotorDanfe(log=lambda texto: None), arquivos)
+            elif etapa == "render":
+                resultados[etapa] = medir_render(arquivos, os.path.join(temporario, "pdfs"), args)
+
+        relatorio = {
+            "corpus": {
+                "documentos": len(arquivos),
+                "itens": args.itens,
+                "rastros_por_item": args.rastros,
+                "proporcao_proc": args.proc,
+                "semente": args.semente,
+                "tamanho_medio_kb": round(tamanho_medio / 1024, 1),
+                "tempo_geracao_s": round(tempo_corpus, 3),
+            },
+            "ambiente": {
+                "python": platform.python_version(),
+                "sistema": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "etapas": resultados,
+        }
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+    conteudo = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(conteudo + "\n")
+    else:
+        print(conteudo)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+<?php
+// Micro-benchmark do enriquecimento de rastro (adicionarDadosRastroNaDescricao)
+// Compara a implementação anterior (XPath por produto e por campo, reparse e
+// saveXML com formatOutput) com a passada única sobre o DOM já validado,
+// em notas sintéticas de 10, 100 e 1000 itens com dois lotes cada.
+//
+// Uso: php benchmarks/bench_rastro.php [repeticoes]
+
+define('GERADOR_DANFE_BIBLIOTECA', true);
+require __DIR__ . '/../gerador_danfe.php';
+
+$repeticoes = isset($argv[1]) ? max(1, (int)$argv[1]) : 5;
+
+printf("%-8s %14s %14s %9s\n", 'itens', 'anterior (ms)', 'atual (ms)', 'ganho');
+foreach ([10, 100, 1000] as $itens) {
+    $xml = gerarNotaSintetica($itens);
+
+    $tempoLegado = medirMediana($repeticoes, function () use ($xml) {
+        return rastroLegado($xml);
+    });
+    $tempoAtual = medirMediana($repeticoes, function () use ($xml) {
+        return rastroAtual($xml);
+    });
+
+    // As duas versões devem produzir as mesmas descrições
+    if (descricoes(rastroLegado($xml)) !== descricoes(rastroAtual($xml))) {
+        fwrite(STDERR, "Divergência nas descrições com $itens itens\n");
+        exit(1);
+    }
+
+    printf("%-8d %14.2f %14.2f %8.1fx\n", $itens, $tempoLegado, $tempoAtual, $tempoLegado / max($tempoAtual, 1e-6));
+}
+
+/**
+ * Fluxo atual: o DOM da validação é reaproveitado e só é serializado se mudou
+ */
+function rastroAtual($xml) {
+    $dom = new DOMDocument();
+    $dom->loadXML($xml);
+    $xpath = new DOMXPath($dom);
+    return adicionarDadosRastroNaDescricao($dom, $xpath) ? $dom->saveXML() : $xml;
+}
+
+/**
+ * Fluxo anterior, mantido aqui apenas como referência de desempenho
+ */
+function rastroLegado($xml) {
+    $validacao = new DOMDocument();
+    $validacao->loadXML($xml);
+
+    $dom = new DOMDocument();
+    $dom->preserveWhiteSpace = false;
+    $dom->formatOutput = true;
+    $dom->loadXML($xml);
+
+    $xpath = new DOMXPath($dom);
+    $xpath->registerNamespace('nfe', 'http://www.portalfiscal.inf.br/nfe');
+
+    foreach ($xpath->query('//det/prod | //nfe:det/nfe:prod') as $prod) {
+        $rastros = $xpath->query('.//rastro | .//nfe:rastro', $prod);
+        if ($rastros->length == 0) {
+            continue;
+        }
+
+        $rastroInfo = [];
+        foreach ($rastros as $rastro) {
+            $infoRastro = [];
+            $nLote = $xpath->query('.//nLote | .//nfe:nLote', $rastro);
+            $qLote = $xpath->query('.//qLote | .//nfe:qLote', $rastro);
+            $dFab = $xpath->query('.//dFab | .//nfe:dFab', $rastro);
+            $dVal = $xpath->query('.//dVal | .//nfe:dVal', $rastro);
+
+            if ($nLote->length > 0) {
+                $infoRastro[] = "LOTE: " . trim($nLote->item(0)->nodeValue);
+            }
+            if ($qLote->length > 0) {
+                $infoRastro[] = "QTD LOTE: " . number_format(floatval($qLote->item(0)->nodeValue), 3, ',', '.');
+            }
+            if ($dFab->length > 0) {
+                $infoRastro[] = "FAB: " . formatarData($dFab->item(0)->nodeValue);
+            }
+            if ($dVal->length > 0) {
+                $infoRastro[] = "VAL: " . formatarData($dVal->item(0)->nodeValue);
+            }
+            if (!empty($infoRastro)) {
+                $rastroInfo[] = implode(' | ', $infoRastro);
+            }
+        }
+
+        if (!empty($rastroInfo)) {
+            $xProd = $xpath->query('.//xProd | .//nfe:xProd', $prod);
+            if ($xProd->length > 0) {
+                $dadosRastro = "\n" . str_repeat("-", 45) . "\n";
+                $dadosRastro .= "📋 DADOS DE RASTRO:\n";
+                $dadosRastro .= implode("\n", $rastroInfo) . "\n";
+                $dadosRastro .= str_repeat("-", 45);
+                $xProd->item(0)->nodeValue = trim($xProd->item(0)->nodeValue) . $dadosRastro;
+            }
+        }
+    }
+
+    return $dom->saveXML();
+}
+
+/**
+ * NF-e sintética (namespace do portal fiscal) com $itens produtos de 2 lotes cada
+ */
+function gerarNotaSintetica($itens) {
+    $det = '';
+    for ($i = 1; $i <= $itens; $i++) {
+        $det .= "<det nItem=\"$i\"><prod>"
+            . "<cProd>$i</cProd><xProd>MEDICAMENTO $i 500MG CX 30 COMP</xProd><NCM>30049099</NCM>"
+            . "<CFOP>5102</CFOP><uCom>CX</uCom><qCom>10.0000</qCom><vUnCom>12.5000000000</vUnCom>"
+            . "<vProd>125.00</vProd>";
+        for ($l = 1; $l <= 2; $l++) {
+            $det .= "<rastro><nLote>L$i-$l</nLote><qLote>5.000</qLote>"
+                . "<dFab>2024-01-0$l</dFab><dVal>2026-01-0$l</dVal></rastro>";
+        }
+        $det .= "<med><cProdANVISA>1234567890123</cProdANVISA><vPMC>20.00</vPMC></med>"
+            . "</prod><imposto><vTotTrib>0.00</vTotTrib></imposto></det>\n";
+    }
+
+    return '<?xml version="1.0" encoding="UTF-8"?>' . "\n"
+        . '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe><infNFe Id="NFe'
+        . str_repeat('3', 44) . '" versao="4.00"><ide><mod>55</mod></ide>' . "\n"
+        . $det
+        . '</infNFe></NFe></nfeProc>';
+}
+
+/**
+ * Lista das descrições xProd de um XML (para conferir que as versões coincidem)
+ */
+function descricoes($xml) {
+    $dom = new DOMDocument();
+    $dom->loadXML($xml);
+    $lista = [];
+    foreach ($dom->getElementsByTagNameNS('*', 'xProd') as $xProd) {
+        $lista[] = $xProd->nodeValue;
+    }
+    return $lista;
+}
+
+/**
+ * Mediana, em milissegundos, de $repeticoes execuções da função
+ */
+function medirMediana($repeticoes, $funcao) {
+    $tempos = [];
+    for ($i = 0; $i < $repeticoes; $i++) {
+        $inicio = hrtime(true);
+        $funcao();
+        $tempos[] = (hrtime(true) - $inicio) / 1e6;
+    }
+    sort($tempos);
+    return $tempos[intdiv(count($tempos), 2)];
+}
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Gerador de corpus sintético de NF-e para medições de desempenho
+Cria XMLs NFe/procNFe com formato válido (chave de acesso e CNPJs com dígitos
+verificadores corretos), quantidade de itens, lotes de rastro e tamanho mínimo
+configuráveis. A mesma semente gera sempre o mesmo corpus.
+
+Uso:
+    python benchmarks/corpus.py PASTA [-n 1000] [--itens 20] [--rastros 1]
+                                [--tamanho-kb 0] [--proc 0.8] [--semente 42]
+"""
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+UFS = ["11", "12", "13", "15", "21", "23", "26", "29", "31", "33", "35", "41", "42", "43", "50", "52", "53"]
+NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
+
+
+def digito_modulo11(numero):
+    """Dígito verificador módulo 11 com pesos 2..9 (chave de acesso)"""
+    soma = 0
+    peso = 2
+    for digito in reversed(numero):
+        soma += int(digito) * peso
+        peso = 2 if peso == 9 else peso + 1
+    resto = soma % 11
+    return "0" if resto < 2 else str(11 - resto)
+
+
+def gerar_cnpj(aleatorio):
+    """CNPJ de 14 dígitos com os dois dígitos verificadores corretos"""
+    base = "".join(str(aleatorio.randint(0, 9)) for _ in range(8)) + "0001"
+    for pesos in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        resto = sum(int(d) * p for d, p in zip(base, pesos)) % 11
+        base += "0" if resto < 2 else str(11 - resto)
+    return base
+
+
+def montar_chave(cuf, emissao, cnpj, serie, numero, codigo):
+    """Chave de acesso de 44 dígitos (cUF AAMM CNPJ mod série nNF tpEmis cNF cDV)"""
+    sem_dv = f"{cuf}{emissao:%y%m}{cnpj}55{serie:03d}{numero:09d}1{codigo:08d}"
+    return sem_dv + digito_modulo11(sem_dv)
+
+
+def _itens(quantidade, rastros, aleatorio):
+    partes = []
+    for i in range(1, quantidade + 1):
+        quantidade_item = aleatorio.randint(1, 50)
+        valor = aleatorio.randint(100, 50000) / 100
+        rastro = "".join(
+            f"<rastro><nLote>L{aleatorio.randint(1000, 99999)}-{r}</nLote>"
+            f"<qLote>{quantidade_item:.3f}</qLote><dFab>2024-0{r % 9 + 1}-10</dFab>"
+            f"<dVal>2026-0{r % 9 + 1}-10</dVal></rastro>"
+            for r in range(1, rastros + 1)
+        )
+        partes.append(
+            f'<det nItem="{i}"><prod><cProd>{1000 + i}</cProd><cEAN>SEM GTIN</cEAN>'
+            f"<xProd>PRODUTO SINTETICO {i} 500MG CX C/ 30</xProd><NCM>30049099</NCM>"
+            f"<CFOP>5102</CFOP><uCom>CX</uCom><qCom>{quantidade_item:.4f}</qCom>"
+            f"<vUnCom>{valor:.10f}</vUnCom><vProd>{quantidade_item * valor:.2f}</vProd>"
+            f"<cEANTrib>SEM GTIN</cEANTrib><uTrib>CX</uTrib><qTrib>{quantidade_item:.4f}</qTrib>"
+            f"<vUnTrib>{valor:.10f}</vUnTrib><indTot>1</indTot>{rastro}</prod>"
+            f"<imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST><modBC>3</modBC>"
+            f"<vBC>0.00</vBC><pICMS>18.00</pICMS><vICMS>0.00</vICMS></ICMS00></ICMS></imposto></det>"
+        )
+    return "".join(partes)
+
+
+def gerar_nfe(aleatorio, itens=20, rastros=1, tamanho_min_kb=0, proc=True):
+    """Retorna (chave, conteúdo XML em bytes) de uma NF-e sintética modelo 55"""
+    cuf = aleatorio.choice(UFS)
+    emissao = datetime(2024, 1, 1) + timedelta(days=aleatorio.randint(0, 540), seconds=aleatorio.randint(0, 86399))
+    cnpj_emitente = gerar_cnpj(aleatorio)
+    serie = aleatorio.randint(1, 9)
+    numero = aleatorio.randint(1, 999999)
+    codigo = aleatorio.randint(0, 99999999)
+    chave = montar_chave(cuf, emissao, cnpj_emitente, serie, numero, codigo)
+    data_hora = emissao.strftime("%Y-%m-%dT%H:%M:%S-03:00")
+
+    nfe = (
+        f'<NFe xmlns="{NAMESPACE}"><infNFe Id="NFe{chave}" versao="4.00">'
+        f"<ide><cUF>{cuf}</cUF><cNF>{codigo:08d}</cNF><natOp>VENDA DE MERCADORIA</natOp>"
+        f"<mod>55</mod><serie>{serie}</serie><nNF>{numero}</nNF><dhEmi>{data_hora}</dhEmi>"
+        f"<tpNF>1</tpNF><idDest>1</idDest><cMunFG>3550308</cMunFG><tpImp>1</tpImp>"
+        f"<tpEmis>1</tpEmis><cDV>{chave[-1]}</cDV><tpAmb>2</tpAmb><finNFe>1</finNFe>"
+        f"<indFinal>0</indFinal><indPres>9</indPres><procEmi>0</procEmi><verProc>1.0</verProc></ide>"
+        f"<emit><CNPJ>{cnpj_emitente}</CNPJ><xNome>EMITENTE SINTETICO LTDA</xNome>"
+        f"<enderEmit><xLgr>RUA DE TESTE</xLgr><nro>100</nro><xBairro>CENTRO</xBairro>"
+        f"<cMun>3550308</cMun><xMun>SAO PAULO</xMun><UF>SP</UF><CEP>01000000</CEP></enderEmit>"
+        f"<IE>111111111111</IE><CRT>3</CRT></emit>"
+        f"<dest><CNPJ>{gerar_cnpj(aleatorio)}</CNPJ><xNome>DESTINATARIO SINTETICO</xNome>"
+        f"<enderDest><xLgr>AV DE TESTE</xLgr><nro>200</nro><xBairro>CENTRO</xBairro>"
+        f"<cMun>3550308</cMun><xMun>SAO PAULO</xMun><UF>SP</UF><CEP>01000000</CEP></enderDest>"
+        f"<indIEDest>9</indIEDest></dest>"
+        f"{_itens(itens, rastros, aleatorio)}"
+        f"<total><ICMSTot><vBC>0.00</vBC><vICMS>0.00</vICMS><vProd>0.00</vProd><vNF>0.00</vNF></ICMSTot></total>"
+        f"<transp><modFrete>9</modFrete></transp>"
+        f"<pag><detPag><tPag>90</tPag><vPag>0.00</vPag></detPag></pag>"
+        f"<infAdic><infCpl>DOCUMENTO SINTETICO PARA MEDICAO DE DESEMPENHO</infCpl></infAdic>"
+        f"</infNFe>"
+        f'<Signature xmlns="http://www.w3.org/2000/09/xmldsig#"><SignedInfo/>'
+        f"<SignatureValue>{'A' * 344}</SignatureValue></Signature></NFe>"
+    )
+
+    if proc:
+        corpo = (
+            f'<nfeProc xmlns="{NAMESPACE}" versao="4.00">{nfe}'
+            f'<protNFe versao="4.00"><infProt><tpAmb>2</tpAmb><verAplic>SINTETICO</verAplic>'
+            f"<chNFe>{chave}</chNFe><dhRecbto>{data_hora}</dhRecbto>"
+            f"<nProt>1{aleatorio.randint(0, 10 ** 14 - 1):014d}</nProt><digVal>{'B' * 28}</digVal>"
+            f"<cStat>100</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe></nfeProc>"
+        )
+    else:
+        corpo = nfe
+
+    conteudo = '<?xml version="1.0" encoding="UTF-8"?>' + corpo
+    falta = tamanho_min_kb * 1024 - len(conteudo)
+    if falta > 0:
+        # Enchimento em comentário no fim: não altera a estrutura do documento
+        conteudo += f"<!-- {'x' * falta} -->"
+    return chave, conteudo.encode("utf-8")
+
+
+def gerar_corpus(pasta, quantidade, itens=20, rastros=1, tamanho_min_kb=0, proporcao_proc=0.8, semente=42):
+    """Grava `quantidade` XMLs em `pasta` e retorna [(caminho, chave)]"""
+    aleatorio = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    arquivos = []
+    for _ in range(quantidade):
+        proc = aleatorio.random() < proporcao_proc
+        chave, conteudo = gerar_nfe(aleatorio, itens, rastros, tamanho_min_kb, proc)
+        caminho = os.path.join(pasta, f"{chave}-{'procNFe' if proc else 'nfe'}.xml")
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+        arquivos.append((caminho, chave))
+    return arquivos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera XMLs sintéticos de NF-e para benchmarks")
+    parser.add_argument("pasta", help="Pasta de destino")
+    parser.add_argument("-n", "--quantidade", type=int, default=1000, help="Número de documentos (padrão: 1000)")
+    parser.add_argument("--itens", type=int, default=20, help="Itens por nota (padrão: 20)")
+    parser.add_argument("--rastros", type=int, default=1, help="Lotes de rastro por item (padrão: 1)")
+    parser.add_argument("--tamanho-kb", type=int, default=0, help="Tamanho mínimo de cada XML em KB")
+    parser.add_argument("--proc", type=float, default=0.8, help="Proporção de procNFe (padrão: 0.8)")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do gerador (padrão: 42)")
+    args = parser.parse_args(argv)
+
+    arquivos = gerar_corpus(args.pasta, args.quantidade, args.itens, args.rastros,
+                            args.tamanho_kb, args.proc, args.semente)
+    print(f"✅ {len(arquivos)} XMLs gerados em {os.path.abspath(args.pasta)}")
+
+
+if __name__ == "__main__":
+    main()
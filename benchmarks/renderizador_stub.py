@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Renderizador substituto para máquinas sem PHP
+Fala o mesmo protocolo do gerador_danfe.php (modo avulso e --worker, inclusive
+com o XML enviado pelo pipe) e grava um PDF mínimo no destino, simulando o tempo de renderização configurado em
+RENAMERPRO_STUB_ATRASO_MS. Mede todo o caminho Python (pool, agendador, cache,
+movimentação dos PDFs) sem depender do NFePHP.
+"""
+
+import base64
+import json
+import os
+import sys
+import time
+
+ATRASO_MS = float(os.environ.get("RENAMERPRO_STUB_ATRASO_MS", "0"))
+
+PDF_MINIMO = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def renderizar(arquivo_xml, nome_personalizado=None, destino=None):
+    inicio = time.perf_counter()
+    with open(arquivo_xml, "rb") as f:
+        conteudo = f.read()
+    if b"<mod>55</mod>" not in conteudo:
+        raise ValueError("Modelo deve ser 55 (NFe)")
+    tempo_parse = (time.perf_counter() - inicio) * 1000
+
+    if ATRASO_MS:
+        time.sleep(ATRASO_MS / 1000)
+    tempo_render = ATRASO_MS
+
+    inicio = time.perf_counter()
+    if destino:
+        arquivo_pdf = destino
+    else:
+        nome_base = nome_personalizado or os.path.basename(arquivo_xml)
+        if nome_base.endswith((".pdf", ".xml")):
+            nome_base = nome_base[:-4]
+        arquivo_pdf = os.path.join(os.path.dirname(arquivo_xml), nome_base + ".pdf")
+    temporario = f"{arquivo_pdf}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(PDF_MINIMO)
+    os.replace(temporario, arquivo_pdf)
+
+    return {
+        "status": "ok",
+        "pdf": arquivo_pdf,
+        "paginas": 1,
+        "bytes": len(PDF_MINIMO),
+        "tempos_ms": {
+            "parse": round(tempo_parse, 2),
+            "render": round(tempo_render, 2),
+            "escrita": round((time.perf_counter() - inicio) * 1000, 2),
+        },
+    }
+
+
+def responder(arquivo_xml, nome_personalizado=None, destino=None):
+    try:
+        resposta = renderizar(arquivo_xml, nome_personalizado, destino)
+    except Exception as e:
+        resposta = {"status": "erro", "mensagem": str(e)}
+    print(json.dumps(resposta, ensure_ascii=False), flush=True)
+    return resposta["status"] == "ok"
+
+
+def responder_conteudo(conteudo):
+    """Modo pipe: XML recebido em memória, PDF devolvido em base64"""
+    inicio = time.perf_counter()
+    if b"<mod>55</mod>" not in conteudo:
+        resposta = {"status": "erro", "mensagem": "Modelo deve ser 55 (NFe)"}
+    else:
+        tempo_parse = (time.perf_counter() - inicio) * 1000
+        if ATRASO_MS:
+            time.sleep(ATRASO_MS / 1000)
+        resposta = {
+            "status": "ok",
+            "pdf_base64": base64.b64encode(PDF_MINIMO).decode("ascii"),
+            "paginas": 1,
+            "bytes": len(PDF_MINIMO),
+            "tempos_ms": {"parse": round(tempo_parse, 2), "render": ATRASO_MS},
+        }
+    print(json.dumps(resposta), flush=True)
+
+
+def main(argv):
+    if len(argv) < 1:
+        print(json.dumps({"status": "erro", "mensagem": "Arquivo XML não especificado!"}))
+        return 1
+
+    if argv[0] == "--worker":
+        for linha in sys.stdin:
+            linha = linha.strip()
+            if linha:
+                job = json.loads(linha)
+                if "conteudo" in job:
+                    responder_conteudo(base64.b64decode(job["conteudo"]))
+                else:
+                    responder(job["xml"], job.get("nome"), job.get("destino"))
+        return 0
+
+    destino = None
+    nome_personalizado = None
+    argumentos = iter(argv[1:])
+    for argumento in argumentos:
+        if argumento == "--destino":
+            destino = next(argumentos, None)
+        else:
+            nome_personalizado = argumento
+    return 0 if responder(argv[0], nome_personalizado, destino) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
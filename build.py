@@ -62,6 +62,9 @@ a = Analysis(
         'webbrowser',
         'time',
         'os',
+        'danfe_planilha',
+        'pandas',
+        'openpyxl',
     ],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,186 @@
+"""
+Agendador adaptativo de concorrência para o processamento em massa
+Dimensiona o número de documentos simultâneos pela quantidade de CPUs e pelo
+tempo medido de cada DANFE, subindo enquanto a vazão cresce e recuando quando
+a latência ou a pressão de memória aumentam
+"""
+
+import ctypes
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Variável de ambiente para fixar a concorrência (ex.: servidores de terminal compartilhados)
+VARIAVEL_WORKERS = "RENAMERPRO_WORKERS"
+
+# Critérios de ajuste
+GANHO_MINIMO = 0.05        # Subir enquanto a vazão crescer pelo menos 5%
+QUEDA_MAXIMA = 0.10        # Recuar se a vazão cair mais de 10%
+FATOR_LATENCIA = 2.0       # Recuar se a latência média dobrar sem ganho de vazão
+MEMORIA_LIVRE_MINIMA = 10  # Recuar abaixo de 10% de memória livre
+JANELAS_SONDAGEM = 10      # Após um recuo, voltar a sondar níveis acima depois de 10 janelas
+
+
+def memoria_livre_percentual():
+    """Percentual de memória física livre do sistema (None se não for possível medir)"""
+    try:
+        if sys.platform == "win32":
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return 100 - status.dwMemoryLoad
+            return None
+
+        with open("/proc/meminfo", encoding="ascii") as f:
+            valores = dict(linha.split(":", 1) for linha in f)
+        total = int(valores["MemTotal"].split()[0])
+        disponivel = int(valores["MemAvailable"].split()[0])
+        return 100 * disponivel // total
+    except Exception:
+        return None
+
+
+def resolver_workers(valor=None):
+    """Converte a escolha do usuário em número fixo de workers (None = automático)"""
+    if valor is None or str(valor).strip().lower() in ("", "auto"):
+        valor = os.environ.get(VARIAVEL_WORKERS, "")
+    try:
+        workers = int(str(valor).strip())
+    except ValueError:
+        return None
+    return workers if workers > 0 else None
+
+
+class AgendadorAdaptativo:
+    """Executa tarefas em threads ajustando a concorrência por subida de encosta (hill climbing)"""
+
+    def __init__(self, max_workers=None, log=None, ao_ajustar=None):
+        self.cpus = os.cpu_count() or 2
+        self.fixo = max_workers is not None
+        self.log = log or (lambda texto: None)
+        self.ao_ajustar = ao_ajustar
+
+        if self.fixo:
+            self.limite = self.nivel = max_workers
+        else:
+            # Cada DANFE ocupa um processo PHP de thread única: no máximo um por CPU
+            self.limite = self.cpus
+            self.nivel = min(2, self.limite)
+
+        self._teto = self.limite
+        self._janelas_no_teto = 0
+        self._latencias = []
+        self._vazao_anterior = None
+        self._latencia_base = None
+        self._inicio_janela = None
+
+    def descricao(self):
+        if self.fixo:
+            return f"{self.nivel} simultâneos, fixo"
+        return f"automático, {self.nivel} a {self.limite} simultâneos"
+
+    def executar(self, funcao, itens, ao_concluir):
+        """Chama funcao(item) para cada item e ao_concluir(item, future) na thread do agendador"""
+        if self.fixo:
+            self.log(f"⚙️ Concorrência fixa: {self.nivel} workers (CPUs: {self.cpus})")
+        else:
+            self.log(f"⚙️ Concorrência automática: iniciando com {self.nivel} workers "
+                     f"(CPUs: {self.cpus}, limite: {self.limite})")
+
+        itens = iter(itens)
+        pendentes = {}
+        esgotado = False
+        self._inicio_janela = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.limite) as executor:
+            while True:
+                # Manter exatamente `nivel` documentos em andamento
+                while not esgotado and len(pendentes) < self.nivel:
+                    try:
+                        item = next(itens)
+                    except StopIteration:
+                        esgotado = True
+                        break
+                    pendentes[executor.submit(self._medir, funcao, item)] = item
+
+                if not pendentes:
+                    break
+
+                concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                for future in concluidos:
+                    ao_concluir(pendentes.pop(future), future)
+
+                if not self.fixo:
+                    self._avaliar()
+
+    def _medir(self, funcao, item):
+        inicio = time.perf_counter()
+        try:
+            return funcao(item)
+        finally:
+            self._latencias.append(time.perf_counter() - inicio)
+
+    def _avaliar(self):
+        """Fecha uma janela de medição e decide se sobe, mantém ou recua a concorrência"""
+        janela = max(2 * self.nivel, 4)
+        if len(self._latencias) < janela:
+            return
+
+        agora = time.perf_counter()
+        latencias, self._latencias = self._latencias, []
+        vazao = len(latencias) / max(agora - self._inicio_janela, 1e-6)
+        latencia = sum(latencias) / len(latencias)
+        self._inicio_janela = agora
+
+        if self._latencia_base is None or latencia < self._latencia_base:
+            self._latencia_base = latencia
+
+        self._janelas_no_teto += 1
+        if self._janelas_no_teto >= JANELAS_SONDAGEM:
+            self._teto = self.limite
+
+        memoria_livre = memoria_livre_percentual()
+        anterior = self._vazao_anterior
+        self._vazao_anterior = vazao
+        ganho = None if anterior is None else vazao / anterior - 1
+
+        medidas = f"{vazao:.2f} docs/s, latência {latencia:.2f}s"
+        if memoria_livre is not None and memoria_livre < MEMORIA_LIVRE_MINIMA:
+            self._ajustar(-1, f"memória livre baixa ({memoria_livre}%), {medidas}")
+        elif ganho is not None and latencia > FATOR_LATENCIA * self._latencia_base and ganho <= 0:
+            self._ajustar(-1, f"latência subiu ({self._latencia_base:.2f}s → {latencia:.2f}s), {medidas}")
+        elif ganho is None or ganho >= GANHO_MINIMO:
+            if self.nivel < self._teto:
+                self._ajustar(+1, f"vazão subindo ({medidas})")
+        elif ganho <= -QUEDA_MAXIMA:
+            self._ajustar(-1, f"vazão caiu {abs(ganho):.0%} ({medidas})")
+
+    def _ajustar(self, passo, motivo):
+        novo = min(max(self.nivel + passo, 1), self.limite)
+        if novo == self.nivel:
+            return
+
+        self.log(f"⚙️ Concorrência {self.nivel} → {novo}: {motivo}")
+        if passo < 0:
+            # O nível anterior se mostrou pior: não voltar a ele por algumas janelas
+            # e medir de novo a vazão de referência no nível reduzido
+            self._teto = novo
+            self._janelas_no_teto = 0
+            self._vazao_anterior = None
+        self.nivel = novo
+        if self.ao_ajustar:
+            self.ao_ajustar(novo)
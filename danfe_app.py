@@ -1,13 +1,20 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import subprocess
+import multiprocessing
 import os
 import threading
 import webbrowser
 import time
-import xml.etree.ElementTree as ET
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from danfe_agendador import resolver_workers
+from danfe_chaves import OperacaoCancelada
+from danfe_log import INTERVALO_DRENAGEM_MS, LINHAS_NA_TELA, CanalLog
+from danfe_motor import MotorDanfe
+from danfe_tabela import TabelaRenomeacao
+from danfe_varredura import converter_data
+
+# Linhas de widgets da tabela de renomeação; as demais linhas do modelo não existem na tela
+LINHAS_TABELA_VISIVEIS = 4
 
 
 class DanfeAppMassa:
@@ -51,13 +58,28 @@ class DanfeAppMassa:
         self.pasta_xml = tk.StringVar()
         self.pasta_saida = tk.StringVar()
         self.status_texto = tk.StringVar(value="Sistema pronto para processamento")
+        self.workers_var = tk.StringVar(value="Auto")
+        self.recursivo_var = tk.BooleanVar(value=False)
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.relatorio_var = tk.BooleanVar(value=True)
+        self.retomar_var = tk.BooleanVar(value=True)
         self.arquivos_xml = []
         self.processando = False
         self.chaves_xml = {}
-        self.linhas_renomeacao = []
-        self.vcredist_tentado = False
+        self.tabela_renomeacao = TabelaRenomeacao()
+        self.primeira_linha_tabela = 0
+        self.linhas_visiveis = []
+        self.cancelar_chaves = None  # threading.Event do escaneamento de chaves em andamento
+        self.cancelar_massa = None   # threading.Event do processamento em massa em andamento
+        
+        # Mensagens das threads de trabalho: fila drenada em lotes pela interface
+        self.canal_log = CanalLog()
+        
+        # Engine de processamento (sem interface); mensagens vão para o log da aba principal
+        self.motor = MotorDanfe(log=self.canal_log.escrever)
         
         self.criar_interface()
+        self.drenar_canal_log()
 
     def criar_botao_profissional(self, parent, text, command, width=200, height=45, 
                                 cor_principal=None, cor_hover=None, icone=""):
@@ -255,6 +277,51 @@ class DanfeAppMassa:
         )
         btn_saida.grid(row=0, column=1)
         
+        # Filtros de varredura (subpastas, padrão de nome, CNPJ do emitente, data)
+        filtros_container = ctk.CTkFrame(input_frame, fg_color="transparent")
+        filtros_container.grid(row=4, column=0, sticky="ew", pady=(0, 10))
+        
+        ctk.CTkCheckBox(
+            filtros_container,
+            text="🗂️ Incluir subpastas",
+            variable=self.recursivo_var,
+            font=ctk.CTkFont(size=12),
+            text_color=self.cores['cinza_text']
+        ).pack(side="left", padx=(0, 10))
+        
+        self.entrada_padrao = ctk.CTkEntry(
+            filtros_container,
+            placeholder_text="Padrão (*.xml)",
+            font=ctk.CTkFont(size=12),
+            width=130,
+            height=32,
+            corner_radius=8,
+            border_color=self.cores['azul_light']
+        )
+        self.entrada_padrao.pack(side="left", padx=5)
+        
+        self.entrada_cnpj = ctk.CTkEntry(
+            filtros_container,
+            placeholder_text="CNPJ do emitente",
+            font=ctk.CTkFont(size=12),
+            width=160,
+            height=32,
+            corner_radius=8,
+            border_color=self.cores['azul_light']
+        )
+        self.entrada_cnpj.pack(side="left", padx=5)
+        
+        self.entrada_desde = ctk.CTkEntry(
+            filtros_container,
+            placeholder_text="Modificados desde (DD/MM/AAAA)",
+            font=ctk.CTkFont(size=12),
+            width=220,
+            height=32,
+            corner_radius=8,
+            border_color=self.cores['azul_light']
+        )
+        self.entrada_desde.pack(side="left", padx=5)
+        
         # Info e Controles
         controle_card = self.criar_card_profissional(
             container,
@@ -300,6 +367,51 @@ class DanfeAppMassa:
         self.btn_processar.pack(side="left", padx=8)
         self.btn_processar.configure(state="disabled")
         
+        # Concorrência (Auto = ajuste adaptativo; número = valor fixo)
+        workers_frame = ctk.CTkFrame(controle_card, fg_color="transparent")
+        workers_frame.pack(pady=(0, 3))
+        
+        ctk.CTkLabel(
+            workers_frame,
+            text="⚙️ Documentos simultâneos:",
+            font=ctk.CTkFont(size=12, weight="bold"),
+            text_color=self.cores['cinza_text']
+        ).pack(side="left", padx=(0, 8))
+        
+        self.opcao_workers = ctk.CTkOptionMenu(
+            workers_frame,
+            variable=self.workers_var,
+            values=["Auto", "1", "2", "4", "8", "16"],
+            width=90,
+            fg_color=self.cores['azul_primary'],
+            button_color=self.cores['azul_secondary']
+        )
+        self.opcao_workers.pack(side="left")
+        
+        ctk.CTkCheckBox(
+            workers_frame,
+            text="⏭️ Pular XMLs já convertidos (incremental)",
+            variable=self.incremental_var,
+            font=ctk.CTkFont(size=12),
+            text_color=self.cores['cinza_text']
+        ).pack(side="left", padx=(15, 0))
+        
+        ctk.CTkCheckBox(
+            workers_frame,
+            text="📊 Relatório de tempos",
+            variable=self.relatorio_var,
+            font=ctk.CTkFont(size=12),
+            text_color=self.cores['cinza_text']
+        ).pack(side="left", padx=(15, 0))
+        
+        ctk.CTkCheckBox(
+            workers_frame,
+            text="⏯️ Retomar lote interrompido",
+            variable=self.retomar_var,
+            font=ctk.CTkFont(size=12),
+            text_color=self.cores['cinza_text']
+        ).pack(side="left", padx=(15, 0))
+        
         # Progresso
         progresso_frame = ctk.CTkFrame(controle_card, fg_color="transparent")
         progresso_frame.pack(fill="x", padx=12, pady=(0, 3))
@@ -481,6 +593,18 @@ class DanfeAppMassa:
         )
         self.btn_lote_dados.pack(side="left", padx=8)
         
+        self.btn_planilha = self.criar_botao_profissional(
+            linha1,
+            "PLANILHA",
+            self.importar_planilha,
+            width=130,
+            height=40,
+            cor_principal="#6C757D",
+            cor_hover="#5A6268",
+            icone="📊"
+        )
+        self.btn_planilha.pack(side="left", padx=8)
+        
         self.btn_limpar_dados = self.criar_botao_profissional(
             linha1,
             "LIMPAR",
@@ -509,6 +633,18 @@ class DanfeAppMassa:
         )
         self.btn_validar_renomear.pack(side="right", padx=(8, 0))
         
+        self.btn_desfazer_renomeacao = self.criar_botao_profissional(
+            linha2,
+            "DESFAZER",
+            self.desfazer_renomeacao_thread,
+            width=130,
+            height=40,
+            cor_principal="#6C757D",
+            cor_hover="#5A6268",
+            icone="↩️"
+        )
+        self.btn_desfazer_renomeacao.pack(side="right", padx=8)
+        
         self.btn_processar_selecionados = self.criar_botao_profissional(
             linha2,
             "PROCESSAR TODOS",
@@ -521,6 +657,25 @@ class DanfeAppMassa:
         )
         self.btn_processar_selecionados.pack(side="right", padx=8)
         
+        # Progresso do escaneamento de chaves
+        self.progresso_chaves = ctk.CTkProgressBar(
+            botoes_container,
+            height=12,
+            corner_radius=8,
+            progress_color=self.cores['laranja_warning']
+        )
+        self.progresso_chaves.pack(fill="x", pady=(10, 4))
+        self.progresso_chaves.set(0)
+        
+        self.label_progresso_chaves = ctk.CTkLabel(
+            botoes_container,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color=self.cores['cinza_text'],
+            anchor="w"
+        )
+        self.label_progresso_chaves.pack(fill="x")
+        
         # Tabela profissional
         tabela_card = self.criar_card_profissional(
             container,
@@ -571,19 +726,32 @@ class DanfeAppMassa:
             text_color=self.cores['azul_primary']
         ).grid(row=0, column=3, padx=15, pady=12, sticky="w")
         
-        # Área scrollável responsiva
-        self.scroll_frame = ctk.CTkScrollableFrame(
+        # Tabela virtualizada: poucas linhas de widgets reaproveitadas, dados no modelo
+        tabela_frame = ctk.CTkFrame(
             tabela_card,
             fg_color=self.cores['cinza_medium'],
-            corner_radius=8,
-            height=180
+            corner_radius=8
         )
-        self.scroll_frame.pack(fill="x", padx=12, pady=(0, 12))
+        tabela_frame.pack(fill="x", padx=12, pady=(0, 4))
+        
+        self.barra_tabela = ctk.CTkScrollbar(tabela_frame, command=self.rolar_tabela)
+        self.barra_tabela.pack(side="right", fill="y", padx=(0, 4), pady=4)
         
-        # Configurar responsividade do scroll
-        self.scroll_frame.grid_columnconfigure(0, weight=1)
+        self.linhas_tabela_frame = ctk.CTkFrame(tabela_frame, fg_color="transparent")
+        self.linhas_tabela_frame.pack(side="left", fill="both", expand=True, pady=4)
+        self.linhas_tabela_frame.bind("<MouseWheel>", self.rolar_tabela_roda)
         
-        self.linhas_renomeacao = []
+        self.linhas_visiveis = [self.criar_linha_visivel() for _ in range(LINHAS_TABELA_VISIVEIS)]
+        
+        self.label_total_tabela = ctk.CTkLabel(
+            tabela_card,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color=self.cores['cinza_text'],
+            anchor="e"
+        )
+        self.label_total_tabela.pack(fill="x", padx=12, pady=(0, 8))
+        self.redesenhar_tabela()
         
         # Log profissional da renomeação
         log_renomear_card = self.criar_card_profissional(
@@ -608,16 +776,16 @@ class DanfeAppMassa:
 📋 Aguardando configuração de diretório...
 💡 Selecione o diretório e escaneie as chaves para começar.""")
 
-    def adicionar_linha_renomeacao(self):
+    def criar_linha_visivel(self):
+        """Linha de widgets reaproveitada: mostra a linha do modelo indicada em 'indice'"""
         # Container responsivo para linha
         linha_frame = ctk.CTkFrame(
-            self.scroll_frame,
+            self.linhas_tabela_frame,
             fg_color=self.cores['branco_suave'],
             corner_radius=8,
             border_width=1,
             border_color=self.cores['azul_light']
         )
-        linha_frame.pack(fill="x", padx=5, pady=3)
         
         # Grid responsivo
         linha_frame.grid_columnconfigure(0, weight=2)  # Chave
@@ -650,17 +818,26 @@ class DanfeAppMassa:
         # Status
         label_status = ctk.CTkLabel(
             linha_frame,
-            text="⏳ Aguardando",
+            text="",
             font=ctk.CTkFont(size=11),
             text_color=self.cores['cinza_text']
         )
         label_status.grid(row=0, column=2, padx=5, pady=8, sticky="w")
         
+        linha = {
+            'frame': linha_frame,
+            'chave': entry_chave,
+            'nome': entry_nome,
+            'status': label_status,
+            'indice': None,
+            'versao': None
+        }
+        
         # Botão remover
         btn_remover = ctk.CTkButton(
             linha_frame,
             text="🗑️",
-            command=lambda: self.remover_linha_renomeacao(linha_frame),
+            command=lambda: self.remover_linha_renomeacao(linha),
             width=35,
             height=35,
             font=ctk.CTkFont(size=10),
@@ -670,20 +847,95 @@ class DanfeAppMassa:
         )
         btn_remover.grid(row=0, column=3, padx=(5, 10), pady=8)
         
-        self.linhas_renomeacao.append({
-            'frame': linha_frame,
-            'chave': entry_chave,
-            'nome': entry_nome,
-            'status': label_status
-        })
+        # Cada edição vai direto para o modelo
+        for entry in (entry_chave, entry_nome):
+            entry.bind("<KeyRelease>", lambda evento: self.gravar_linha_visivel(linha))
+            entry.bind("<FocusOut>", lambda evento: self.gravar_linha_visivel(linha))
+        
+        for widget in (linha_frame, entry_chave, entry_nome, label_status):
+            widget.bind("<MouseWheel>", self.rolar_tabela_roda)
+            widget.bind("<Button-4>", self.rolar_tabela_roda)
+            widget.bind("<Button-5>", self.rolar_tabela_roda)
+        
+        return linha
+
+    def gravar_linha_visivel(self, linha):
+        # Índice de uma versão anterior do modelo (lote recarregado, linha removida): descartar
+        if linha['indice'] is not None and linha['versao'] == self.tabela_renomeacao.versao:
+            self.tabela_renomeacao.definir_chave(linha['indice'], linha['chave'].get())
+            self.tabela_renomeacao.definir_nome(linha['indice'], linha['nome'].get())
 
-    def remover_linha_renomeacao(self, linha_frame):
-        # Encontrar e remover a linha
-        for i, linha in enumerate(self.linhas_renomeacao):
-            if linha['frame'] == linha_frame:
-                linha_frame.destroy()
-                self.linhas_renomeacao.pop(i)
-                break
+    def preencher_entry(self, entry, valor):
+        # Só reescreve se mudou: não move o cursor de quem está digitando
+        if entry.get() != valor:
+            entry.delete(0, 'end')
+            if valor:
+                entry.insert(0, valor)
+
+    def redesenhar_tabela(self):
+        """Mostra nas linhas de widgets as linhas do modelo a partir de primeira_linha_tabela"""
+        tabela = self.tabela_renomeacao
+        for linha in self.linhas_visiveis:
+            self.gravar_linha_visivel(linha)
+        
+        total = len(tabela)
+        self.primeira_linha_tabela = max(0, min(self.primeira_linha_tabela, total - LINHAS_TABELA_VISIVEIS))
+        
+        for posicao, linha in enumerate(self.linhas_visiveis):
+            indice = self.primeira_linha_tabela + posicao
+            if indice >= total:
+                linha['indice'] = None
+                linha['frame'].pack_forget()
+                continue
+            
+            linha['indice'] = indice
+            linha['versao'] = tabela.versao
+            self.preencher_entry(linha['chave'], tabela.chaves[indice])
+            self.preencher_entry(linha['nome'], tabela.nomes[indice])
+            linha['status'].configure(text=tabela.rotulo_status(indice))
+            linha['frame'].pack(fill="x", padx=5, pady=3)
+        
+        if total:
+            inicio = self.primeira_linha_tabela / total
+            fim = min(self.primeira_linha_tabela + LINHAS_TABELA_VISIVEIS, total) / total
+            self.barra_tabela.set(inicio, fim)
+            self.label_total_tabela.configure(
+                text=f"Linhas {self.primeira_linha_tabela + 1}–{int(fim * total)} de {total}"
+            )
+        else:
+            self.barra_tabela.set(0, 1)
+            self.label_total_tabela.configure(text="Nenhuma linha — use NOVA LINHA ou LOTE DE DADOS")
+
+    def rolar_tabela(self, *args):
+        """Comando da barra de rolagem ('moveto', fração) ou ('scroll', n, 'units'|'pages')"""
+        if args[0] == "moveto":
+            self.primeira_linha_tabela = int(float(args[1]) * len(self.tabela_renomeacao))
+        elif args[0] == "scroll":
+            passo = LINHAS_TABELA_VISIVEIS if args[2] == "pages" else 1
+            self.primeira_linha_tabela += int(args[1]) * passo
+        self.redesenhar_tabela()
+
+    def rolar_tabela_roda(self, evento):
+        # Windows/macOS: delta ±120 por passo; Linux: botões 4 e 5
+        para_cima = evento.num == 4 or getattr(evento, "delta", 0) > 0
+        self.primeira_linha_tabela += -1 if para_cima else 1
+        self.redesenhar_tabela()
+        return "break"
+
+    def adicionar_linha_renomeacao(self):
+        indice = self.tabela_renomeacao.adicionar()
+        # Rolar até a nova linha e deixar o cursor nela
+        self.primeira_linha_tabela = indice - LINHAS_TABELA_VISIVEIS + 1
+        self.redesenhar_tabela()
+        for linha in self.linhas_visiveis:
+            if linha['indice'] == indice:
+                linha['chave'].focus()
+
+    def remover_linha_renomeacao(self, linha):
+        if linha['indice'] is not None:
+            self.gravar_linha_visivel(linha)
+            self.tabela_renomeacao.remover(linha['indice'])
+            self.redesenhar_tabela()
                 
     def selecionar_pasta_renomear(self):
         pasta = filedialog.askdirectory(title="Selecione a pasta com XMLs para renomear")
@@ -692,70 +944,116 @@ class DanfeAppMassa:
             self.entrada_pasta_renomear.insert(0, pasta)
             
     def escanear_chaves_xml(self):
+        # Com um escaneamento em andamento o botão passa a cancelá-lo
+        if self.cancelar_chaves is not None:
+            self.cancelar_chaves.set()
+            self.btn_escanear_chaves.configure(state="disabled", text="⏳ CANCELANDO...")
+            return
+            
         pasta = self.entrada_pasta_renomear.get()
         if not pasta:
             messagebox.showerror("Erro", "Selecione a pasta com XMLs primeiro!")
             return
             
         self.chaves_xml = {}
-        arquivos_processados = 0
+        cancelar = self.cancelar_chaves = threading.Event()
         
+        self.btn_escanear_chaves.configure(text="⛔ CANCELAR")
+        self.btn_validar_renomear.configure(state="disabled")
+        self.progresso_chaves.set(0)
+        self.label_progresso_chaves.configure(text="🔍 Listando arquivos...")
         self.log_renomeacao.delete("0.0", "end")
         self.log_renomeacao.insert("0.0", "🔍 Escaneando chaves de acesso...\n\n")
         
-        # Usar função auxiliar (elimina duplicação)
-        arquivos_xml = self.escanear_xmls_pasta(pasta)
-        
-        try:
-            for arquivo in arquivos_xml:
-                nome_arquivo = os.path.basename(arquivo)
-                chave = self.extrair_chave_xml(arquivo)
-                
-                if chave:
-                    self.chaves_xml[chave] = arquivo
-                    arquivos_processados += 1
-                    self.log_renomeacao.insert("end", f"✅ {nome_arquivo}: {chave}\n")
-                else:
-                    self.log_renomeacao.insert("end", f"❌ {nome_arquivo}: Chave não encontrada\n")
-                        
-            self.log_renomeacao.insert("end", f"\n📊 Total: {arquivos_processados} chaves mapeadas\n")
-            self.log_renomeacao.insert("end", "✅ Escaneamento concluído! Agora preencha as chaves desejadas.\n")
-            
-        except Exception as e:
-            self.log_renomeacao.insert("end", f"❌ Erro ao escanear: {str(e)}\n")
-            
-        self.log_renomeacao.see("end")
-        
-    def extrair_chave_xml(self, caminho_arquivo):
-        try:
-            tree = ET.parse(caminho_arquivo)
-            root = tree.getroot()
+        # Escaneamento em segundo plano: resultados e progresso chegam pelo canal de log
+        def escanear():
+            lidos_agora = set()
+            marco = {}  # primeiro lote concluído: referência para a estimativa de término
             
-            # Buscar chave de acesso em diferentes locais possíveis
-            namespaces = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+            def linha_resultado(arquivo, chave):
+                nome_arquivo = os.path.basename(arquivo)
+                return f"✅ {nome_arquivo}: {chave}" if chave else f"❌ {nome_arquivo}: Chave não encontrada"
             
-            # Tentar encontrar a chave
-            chave_elem = root.find('.//nfe:chNFe', namespaces)
-            if chave_elem is not None:
-                return chave_elem.text
+            def ao_progresso(lidos, total, lote):
+                lidos_agora.update(arquivo for arquivo, _ in lote)
+                self.canal_log.escrever("\n".join(linha_resultado(a, c) for a, c in lote), "renomeacao")
+                
+                agora = time.perf_counter()
+                marco.setdefault("inicio", (agora, lidos))
+                inicio, lidos_inicio = marco["inicio"]
+                texto = f"📖 {lidos} / {total} XMLs lidos"
+                if lidos > lidos_inicio:
+                    restante = (agora - inicio) / (lidos - lidos_inicio) * (total - lidos)
+                    texto += f" · restam ~{self.formatar_duracao(restante)}"
                 
-            # Tentar sem namespace
-            chave_elem = root.find('.//chNFe')
-            if chave_elem is not None:
-                return chave_elem.text
+                def aplicar():
+                    self.progresso_chaves.set(lidos / total)
+                    self.label_progresso_chaves.configure(text=texto)
                 
-            # Buscar no atributo Id
-            id_elem = root.find('.//*[@Id]')
-            if id_elem is not None:
-                id_value = id_elem.get('Id')
-                if id_value and len(id_value) >= 44:
-                    return id_value[-44:]  # Pegar os últimos 44 caracteres
-                    
-            return None
+                self.canal_log.atualizar("progresso_chaves", aplicar)
             
-        except Exception:
-            return None
+            resultados = None
+            estatisticas = None
+            try:
+                # Índice persistente: só relê XMLs novos ou alterados desde o último escaneamento
+                resultados, estatisticas = self.motor.mapear_chaves_pasta(
+                    pasta, ao_progresso=ao_progresso, cancelar=cancelar
+                )
+            except OperacaoCancelada:
+                self.canal_log.escrever("\n⛔ Escaneamento cancelado.", "renomeacao")
+            except Exception as e:
+                self.canal_log.escrever(f"❌ Erro ao escanear: {str(e)}", "renomeacao")
+            
+            chaves = {}
+            if resultados is not None:
+                # Arquivos vindos do índice que não têm chave também aparecem no log
+                sem_chave = []
+                for arquivo, chave in resultados:
+                    if chave:
+                        chaves[chave] = arquivo
+                    elif arquivo not in lidos_agora:
+                        sem_chave.append(linha_resultado(arquivo, chave))
+                if sem_chave:
+                    self.canal_log.escrever("\n".join(sem_chave), "renomeacao")
+                
+                self.canal_log.escrever(f"\n📊 Total: {len(chaves)} chaves mapeadas", "renomeacao")
+                if estatisticas:
+                    self.canal_log.escrever(
+                        f"♻️ Índice: {estatisticas['reaproveitadas']} reaproveitadas, "
+                        f"{estatisticas['lidas']} lidas, {estatisticas['removidas']} removidas",
+                        "renomeacao"
+                    )
+                self.canal_log.escrever("✅ Escaneamento concluído! Agora preencha as chaves desejadas.", "renomeacao")
             
+            self.canal_log.atualizar(
+                "fim_escaneamento_chaves",
+                lambda: self.concluir_escaneamento_chaves(chaves, resultados is not None)
+            )
+        
+        self.executar_thread_segura(escanear)
+        
+    def concluir_escaneamento_chaves(self, chaves, concluido):
+        """Aplica o mapa de chaves na interface (thread da interface)"""
+        self.chaves_xml = chaves
+        self.cancelar_chaves = None
+        self.btn_escanear_chaves.configure(state="normal", text="🔍 ESCANEAR CHAVES")
+        self.btn_validar_renomear.configure(state="normal")
+        if concluido:
+            self.progresso_chaves.set(1)
+            self.label_progresso_chaves.configure(text=f"✅ {len(chaves)} chaves mapeadas")
+        else:
+            self.progresso_chaves.set(0)
+            self.label_progresso_chaves.configure(text="⛔ Escaneamento interrompido")
+        
+    def formatar_duracao(self, segundos):
+        """Duração curta para estimativas: '42 s', '3 min 05 s', '1 h 12 min'"""
+        segundos = int(round(segundos))
+        if segundos < 60:
+            return f"{segundos} s"
+        if segundos < 3600:
+            return f"{segundos // 60} min {segundos % 60:02d} s"
+        return f"{segundos // 3600} h {segundos % 3600 // 60:02d} min"
+        
     def validar_e_renomear_thread(self):
         # Usar função auxiliar (elimina duplicação)
         self.executar_thread_segura(self.validar_e_renomear)
@@ -773,65 +1071,69 @@ class DanfeAppMassa:
         sucessos = 0
         erros = 0
         
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", "\n🚀 INICIANDO VALIDAÇÃO E RENOMEAÇÃO...\n\n"))
+        self.canal_log.escrever("\n🚀 INICIANDO VALIDAÇÃO E RENOMEAÇÃO...\n", "renomeacao")
         
-        for linha in self.linhas_renomeacao:
-            chave_original = linha['chave'].get().strip()
-            nome_final = linha['nome'].get().strip()
-            
-            if not chave_original or not nome_final:
-                continue
-                
-            chave = chave_original.strip()
-            
-            # Validar chave (usando função auxiliar - elimina duplicação)
-            if not self.validar_chave_nfe(chave):
-                self.root.after(0, lambda l=linha: l['status'].configure(text="❌ Chave"))
-                self.root.after(0, lambda c=chave: self.log_renomeacao.insert("end", f"❌ Chave inválida: {c}\n"))
-                erros += 1
-                continue
-                
-            # Verificar se chave existe
-            if chave not in self.chaves_xml:
-                self.root.after(0, lambda l=linha: l['status'].configure(text="❌ N/Existe"))
-                self.root.after(0, lambda c=chave: self.log_renomeacao.insert("end", f"❌ Chave não encontrada: {c}\n"))
-                erros += 1
-                continue
-                
-            # Renomear arquivo
-            try:
-                arquivo_original = self.chaves_xml[chave]
-                pasta_arquivo = os.path.dirname(arquivo_original)
-                novo_nome = os.path.join(pasta_arquivo, f"{nome_final}.xml")
-                
-                if os.path.exists(novo_nome):
-                    self.root.after(0, lambda l=linha: l['status'].configure(text="❌ Existe"))
-                    self.root.after(0, lambda n=nome_final: self.log_renomeacao.insert("end", f"❌ Arquivo já existe: {n}.xml\n"))
-                    erros += 1
-                    continue
-                    
-                os.rename(arquivo_original, novo_nome)
-                self.root.after(0, lambda l=linha: l['status'].configure(text="✅ OK"))
-                self.root.after(0, lambda o=os.path.basename(arquivo_original), n=nome_final: 
-                              self.log_renomeacao.insert("end", f"✅ {o} → {n}.xml\n"))
+        versao = self.tabela_renomeacao.versao
+        linhas = self.tabela_renomeacao.preenchidas()
+        
+        # Todas as chaves validadas de uma vez, antes de qualquer acesso à pasta
+        motivos = self.motor.validar_chaves_nfe([chave for _, chave, _ in linhas])
+        resultados = []
+        pedidos = []
+        for (indice, chave, nome_final), motivo in zip(linhas, motivos):
+            if motivo:
+                mensagem = f"❌ Chave inválida ({self.motor.descrever_motivo_chave(motivo)}): {chave}"
+                resultados.append((indice, "chave_invalida", mensagem))
+            else:
+                pedidos.append((indice, chave, nome_final))
+        
+        # O lote inteiro é planejado, executado e, se algo falhar, revertido pelo motor
+        # PDFs gerados pela aba de processamento em massa ficam na pasta de saída dela
+        operacoes, diario = self.motor.renomear_lote(pedidos, self.chaves_xml, pastas_pdf=[self.pasta_saida.get()])
+        resultados.extend((operacao.indice, operacao.status, operacao.mensagem) for operacao in operacoes)
+        resultados.sort()
+        
+        for indice, status, mensagem in resultados:
+            if status == "ok":
                 sucessos += 1
-                
-                # Atualizar o dicionário
-                self.chaves_xml[chave] = novo_nome
-                
-            except Exception as e:
-                self.root.after(0, lambda l=linha: l['status'].configure(text="❌ Erro"))
-                self.root.after(0, lambda e=str(e): self.log_renomeacao.insert("end", f"❌ Erro: {e}\n"))
+            else:
                 erros += 1
-                
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"\n🎉 RENOMEAÇÃO CONCLUÍDA!\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"✅ Sucessos: {sucessos}\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"❌ Erros: {erros}\n"))
-        self.root.after(0, lambda: self.log_renomeacao.see("end"))
+            # Status no modelo; a tela redesenha só as linhas visíveis, uma vez por drenagem
+            if self.tabela_renomeacao.versao == versao:
+                self.tabela_renomeacao.definir_status(indice, status)
+            self.canal_log.escrever(mensagem, "renomeacao")
+        self.canal_log.atualizar("tabela_renomeacao", self.redesenhar_tabela)
+        
+        if diario:
+            self.canal_log.escrever("↩️ Para voltar os nomes anteriores deste lote, use DESFAZER", "renomeacao")
+        self.canal_log.escrever(f"\n🎉 RENOMEAÇÃO CONCLUÍDA!", "renomeacao")
+        self.canal_log.escrever(f"✅ Sucessos: {sucessos}", "renomeacao")
+        self.canal_log.escrever(f"❌ Erros: {erros}", "renomeacao")
         
         if sucessos > 0:
             messagebox.showinfo("Concluído!", f"Renomeação finalizada!\n\n✅ {sucessos} arquivos renomeados\n❌ {erros} erros")
     
+    def desfazer_renomeacao_thread(self):
+        resposta = messagebox.askyesno(
+            "Desfazer Renomeação",
+            "↩️ Voltar os nomes anteriores de todos os arquivos do último lote renomeado?"
+        )
+        if resposta:
+            self.executar_thread_segura(self.desfazer_renomeacao)
+    
+    def desfazer_renomeacao(self):
+        self.canal_log.escrever("\n↩️ DESFAZENDO ÚLTIMO LOTE...", "renomeacao")
+        revertidos, erros = self.motor.desfazer_ultima_renomeacao(self.chaves_xml)
+        for mensagem in erros:
+            self.canal_log.escrever(mensagem, "renomeacao")
+        
+        if not revertidos and not erros:
+            self.canal_log.escrever("ℹ️ Nenhum lote para desfazer", "renomeacao")
+            return
+        self.canal_log.escrever(f"✅ Arquivos com o nome anterior: {revertidos}", "renomeacao")
+        if erros:
+            self.canal_log.escrever(f"❌ Não revertidos: {len(erros)} (o lote continua disponível para DESFAZER)", "renomeacao")
+    
     def limpar_dados_massa(self):
         resposta = messagebox.askyesno(
             "Confirmar Limpeza", 
@@ -840,9 +1142,8 @@ class DanfeAppMassa:
         
         if resposta:
             # Limpar todas as linhas existentes
-            for linha in self.linhas_renomeacao:
-                linha['frame'].destroy()
-            self.linhas_renomeacao.clear()
+            self.tabela_renomeacao.limpar()
+            self.redesenhar_tabela()
             
             # Log
             self.log_renomeacao.insert("end", f"\n🧹 DADOS LIMPOS:\n")
@@ -867,7 +1168,7 @@ class DanfeAppMassa:
             return
         
         # Escanear TODOS os XMLs da pasta (usando função auxiliar - elimina duplicação)
-        todos_xmls = self.escanear_xmls_pasta(pasta_xml)
+        todos_xmls = self.motor.escanear_xmls_pasta(pasta_xml)
         
         if not todos_xmls:
             messagebox.showerror("Erro", "Nenhum arquivo XML encontrado na pasta!")
@@ -884,31 +1185,30 @@ class DanfeAppMassa:
         self.root.after(0, lambda: self.btn_processar_selecionados.configure(state="disabled", text="🔄 Processando..."))
         self.root.after(0, lambda: self.btn_validar_renomear.configure(state="disabled"))
         
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"\n🚀 PROCESSANDO TODOS OS XMLs DA PASTA:\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"📊 Total: {total} arquivos\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"📤 Pasta saída: {pasta_saida}\n\n"))
+        self.canal_log.escrever(f"\n🚀 PROCESSANDO TODOS OS XMLs DA PASTA:", "renomeacao")
+        self.canal_log.escrever(f"📊 Total: {total} arquivos", "renomeacao")
+        self.canal_log.escrever(f"📤 Pasta saída: {pasta_saida}\n", "renomeacao")
         
         inicio = time.time()
         
         # Processar com função auxiliar (elimina duplicação)
         def callback_sucesso(nome):
-            self.log_renomeacao.insert("end", f"✅ {nome}\n")
+            self.canal_log.escrever(f"✅ {nome}", "renomeacao")
             
         def callback_erro(nome):
-            self.log_renomeacao.insert("end", f"❌ {nome}\n")
+            self.canal_log.escrever(f"❌ {nome}", "renomeacao")
             
         sucessos, erros, tempo_total = self.processar_xmls_paralelo(
             todos_xmls, pasta_saida, callback_sucesso, callback_erro
         )
         
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"\n🎉 PROCESSAMENTO CONCLUÍDO!\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"✅ PDFs criados: {sucessos}\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"❌ Erros: {erros}\n"))
-        self.root.after(0, lambda: self.log_renomeacao.insert("end", f"⏱️ Tempo total: {tempo_total:.1f} segundos\n"))
+        self.canal_log.escrever(f"\n🎉 PROCESSAMENTO CONCLUÍDO!", "renomeacao")
+        self.canal_log.escrever(f"✅ PDFs criados: {sucessos}", "renomeacao")
+        self.canal_log.escrever(f"❌ Erros: {erros}", "renomeacao")
+        self.canal_log.escrever(f"⏱️ Tempo total: {tempo_total:.1f} segundos", "renomeacao")
         
         self.root.after(0, lambda: self.btn_processar_selecionados.configure(state="normal", text="🎯 PROCESSAR TODOS XMLs"))
         self.root.after(0, lambda: self.btn_validar_renomear.configure(state="normal"))
-        self.root.after(0, lambda: self.log_renomeacao.see("end"))
         
         # Usar função auxiliar (elimina duplicação)
         self.mostrar_conclusao_processamento(sucessos, erros, tempo_total, pasta_saida)
@@ -917,62 +1217,30 @@ class DanfeAppMassa:
         
     # ============= FUNÇÕES AUXILIARES (ELIMINAM DUPLICAÇÕES) =============
     
-    def escanear_xmls_pasta(self, pasta):
-        """Função auxiliar para escanear XMLs de uma pasta (elimina duplicação)"""
-        arquivos_xml = []
-        try:
-            for arquivo in os.listdir(pasta):
-                if arquivo.lower().endswith('.xml'):
-                    caminho_completo = os.path.join(pasta, arquivo)
-                    arquivos_xml.append(caminho_completo)
-        except Exception as e:
-            print(f"Erro ao escanear pasta: {e}")
-        return arquivos_xml
-
-    def validar_chave_nfe(self, chave):
-        """Função auxiliar para validar chave NFe (elimina duplicação)"""
-        chave = str(chave).strip()
-        return len(chave) == 44 and chave.isdigit()
-
     def executar_thread_segura(self, target_func):
         """Função auxiliar para threading (elimina duplicação)"""
         thread = threading.Thread(target=target_func)
         thread.daemon = True
         thread.start()
 
-    def processar_xmls_paralelo(self, arquivos_xml, pasta_saida, callback_sucesso=None, callback_erro=None):
-        """Função auxiliar para processamento paralelo (elimina duplicação)"""
-        sucessos = 0
-        erros = 0
-        inicio = time.time()
-        
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {
-                executor.submit(self.processar_xml_individual, arquivo, pasta_saida): arquivo 
-                for arquivo in arquivos_xml
-            }
-            
-            for future in as_completed(futures):
-                arquivo = futures[future]
-                nome_arquivo = os.path.basename(arquivo)
-                
-                try:
-                    resultado = future.result()
-                    if resultado:
-                        sucessos += 1
-                        if callback_sucesso:
-                            self.root.after(0, lambda n=nome_arquivo: callback_sucesso(n))
-                    else:
-                        erros += 1
-                        if callback_erro:
-                            self.root.after(0, lambda n=nome_arquivo: callback_erro(n))
-                except Exception as e:
-                    erros += 1
-                    if callback_erro:
-                        self.root.after(0, lambda n=nome_arquivo, e=str(e): callback_erro(f"{n} - ERRO: {e}"))
-        
-        tempo_total = time.time() - inicio
-        return sucessos, erros, tempo_total
+    def processar_xmls_paralelo(self, arquivos_xml, pasta_saida, callback_sucesso=None, callback_erro=None,
+                                callback_ignorado=None, cancelar=None):
+        """Função auxiliar para processamento paralelo (elimina duplicação)
+
+        Os callbacks rodam na thread do agendador: devem apenas publicar no canal_log.
+        Sem "Retomar lote interrompido" o diário da pasta é descartado e o lote
+        recomeça do zero (o novo lote continua gravando o diário).
+        """
+        if not self.retomar_var.get():
+            self.motor.descartar_diario(pasta_saida)
+        return self.motor.processar_xmls_paralelo(
+            arquivos_xml, pasta_saida, callback_sucesso, callback_erro,
+            max_workers=resolver_workers(self.workers_var.get()),
+            incremental=self.incremental_var.get(),
+            callback_ignorado=callback_ignorado,
+            relatorio=self.relatorio_var.get(),
+            cancelar=cancelar
+        )
 
     def mostrar_conclusao_processamento(self, sucessos, erros, tempo_total, pasta_saida):
         """Função auxiliar para mostrar conclusão (elimina duplicação)"""
@@ -1016,6 +1284,17 @@ class DanfeAppMassa:
         if pasta:
             self.pasta_saida.set(pasta)
             
+    def filtros_varredura(self):
+        """Filtros da aba principal no formato de danfe_varredura.iterar_xmls"""
+        return {
+            "recursivo": self.recursivo_var.get(),
+            "padrao": self.entrada_padrao.get().strip() or None,
+            "cnpj": self.entrada_cnpj.get().strip() or None,
+            "modificado_desde": converter_data(self.entrada_desde.get()),
+            # Subpastas em compartilhamentos de rede: várias leituras de diretório simultâneas
+            "threads": 8 if self.recursivo_var.get() else 1,
+        }
+
     def escanear_pasta(self):
         if not self.pasta_xml.get():
             messagebox.showerror("Erro", "Selecione a pasta com XMLs primeiro!")
@@ -1023,8 +1302,33 @@ class DanfeAppMassa:
             
         pasta = self.pasta_xml.get()
         
-        # Usar função auxiliar (elimina duplicação)
-        self.arquivos_xml = self.escanear_xmls_pasta(pasta)
+        try:
+            filtros = self.filtros_varredura()
+        except ValueError as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        
+        self.arquivos_xml = []
+        self.btn_escanear.configure(state="disabled")
+        self.btn_processar.configure(state="disabled")
+        self.label_arquivos.configure(text="🔍 Escaneando...")
+        
+        # Varredura em segundo plano: a contagem aparece enquanto as pastas são lidas
+        def varrer():
+            encontrados = []
+            for arquivo in self.motor.iterar_xmls_pasta_seguro(pasta, **filtros):
+                encontrados.append(arquivo)
+                if len(encontrados) % 250 == 0:
+                    total_parcial = len(encontrados)
+                    self.root.after(0, lambda t=total_parcial: self.label_arquivos.configure(
+                        text=f"🔍 Escaneando... {t} arquivo(s) XML encontrado(s)"))
+            self.root.after(0, lambda: self.concluir_escaneamento(pasta, encontrados))
+        
+        self.executar_thread_segura(varrer)
+        
+    def concluir_escaneamento(self, pasta, arquivos_xml):
+        self.arquivos_xml = arquivos_xml
+        self.btn_escanear.configure(state="normal")
                 
         total = len(self.arquivos_xml)
         
@@ -1051,11 +1355,35 @@ class DanfeAppMassa:
             self.adicionar_log(f"\n✅ Pronto para processar! Clique em 'PROCESSAR TODOS'")
             
     def adicionar_log(self, texto):
-        self.log_text.insert("end", texto + "\n")
-        self.log_text.see("end")
+        # Seguro em qualquer thread: a mensagem aparece na próxima drenagem do canal
+        self.canal_log.escrever(texto)
+        
+    def drenar_canal_log(self):
+        """Aplica na tela, em lote, as mensagens e atualizações publicadas desde a última drenagem"""
+        try:
+            linhas, atualizacoes = self.canal_log.drenar()
+            widgets = {"log": self.log_text, "renomeacao": self.log_renomeacao}
+            for destino, textos in linhas.items():
+                self.inserir_linhas_log(widgets[destino], textos)
+            for atualizacao in atualizacoes:
+                atualizacao()
+        finally:
+            self.root.after(INTERVALO_DRENAGEM_MS, self.drenar_canal_log)
+        
+    def inserir_linhas_log(self, widget, textos):
+        """Insere várias linhas de uma vez, mantendo só as LINHAS_NA_TELA mais recentes"""
+        widget.insert("end", "\n".join(textos[-LINHAS_NA_TELA:]) + "\n")
+        excedente = int(widget.index("end-1c").split(".")[0]) - LINHAS_NA_TELA
+        if excedente > 0:
+            widget.delete("1.0", f"{excedente + 1}.0")
+        widget.see("end")
         
     def processar_massa_thread(self):
         if self.processando:
+            # Em andamento o botão cancela o lote (os documentos em curso terminam)
+            if self.cancelar_massa is not None:
+                self.cancelar_massa.set()
+                self.btn_processar.configure(state="disabled", text="⏳ Cancelando...")
             return
             
         # Usar função auxiliar (elimina duplicação)
@@ -1067,52 +1395,71 @@ class DanfeAppMassa:
             return
             
         self.processando = True
+        cancelar = self.cancelar_massa = threading.Event()
         total = len(self.arquivos_xml)
         sucessos = 0
         erros = 0
+        ignorados = 0
         
         pasta_saida = self.pasta_saida.get() or self.pasta_xml.get()
         
-        self.root.after(0, lambda: self.btn_processar.configure(state="disabled", text="🔄 Processando..."))
+        self.root.after(0, lambda: self.btn_processar.configure(state="normal", text="⛔ CANCELAR"))
         self.root.after(0, lambda: self.btn_escanear.configure(state="disabled"))
         self.root.after(0, lambda: self.status_texto.set("Processando XMLs em massa..."))
         
-        self.root.after(0, lambda: self.adicionar_log(f"\n🚀 INICIANDO PROCESSAMENTO EM MASSA:"))
-        self.root.after(0, lambda: self.adicionar_log(f"📊 Total: {total} arquivos"))
-        self.root.after(0, lambda: self.adicionar_log(f"📤 Pasta saída: {pasta_saida}"))
-        self.root.after(0, lambda: self.adicionar_log(f"⚡ Processamento paralelo ativado (5 simultâneos)\n"))
+        self.adicionar_log(f"\n🚀 INICIANDO PROCESSAMENTO EM MASSA:")
+        self.adicionar_log(f"📊 Total: {total} arquivos")
+        self.adicionar_log(f"📤 Pasta saída: {pasta_saida}")
+        self.adicionar_log(f"⚡ Processamento paralelo ativado\n")
         
         inicio = time.time()
         
         # Processar com função auxiliar (elimina duplicação)
+        # Callbacks rodam na thread do agendador: só contam e publicam no canal
+        def atualizar_progresso():
+            processados = sucessos + erros + ignorados
+            
+            def aplicar():
+                self.progresso_geral.set(processados / total)
+                self.label_progresso.configure(text=f"{processados} / {total} arquivos processados")
+            
+            self.canal_log.atualizar("progresso_massa", aplicar)
+            
         def callback_sucesso(nome):
             nonlocal sucessos
             sucessos += 1
             self.adicionar_log(f"✅ {nome}")
-            self.progresso_geral.set(sucessos / total)
-            self.label_progresso.configure(text=f"{sucessos} / {total} arquivos processados")
+            atualizar_progresso()
             
         def callback_erro(nome):
             nonlocal erros
             erros += 1
             self.adicionar_log(f"❌ {nome}")
-            processados = sucessos + erros
-            self.progresso_geral.set(processados / total)
-            self.label_progresso.configure(text=f"{processados} / {total} arquivos processados")
+            atualizar_progresso()
+            
+        def callback_ignorado(nome):
+            nonlocal ignorados
+            ignorados += 1
+            atualizar_progresso()
             
         sucessos, erros, tempo_total = self.processar_xmls_paralelo(
-            self.arquivos_xml, pasta_saida, callback_sucesso, callback_erro
+            self.arquivos_xml, pasta_saida, callback_sucesso, callback_erro, callback_ignorado,
+            cancelar=cancelar
         )
+        self.cancelar_massa = None
         
-        self.root.after(0, lambda: self.adicionar_log(f"\n🎉 PROCESSAMENTO CONCLUÍDO!"))
-        self.root.after(0, lambda: self.adicionar_log(f"✅ Sucessos: {sucessos}"))
-        self.root.after(0, lambda: self.adicionar_log(f"❌ Erros: {erros}"))
-        self.root.after(0, lambda: self.adicionar_log(f"⏱️ Tempo total: {tempo_total:.1f} segundos"))
-        self.root.after(0, lambda: self.adicionar_log(f"⚡ Média: {tempo_total/total:.1f}s por arquivo"))
+        self.adicionar_log(f"\n⛔ PROCESSAMENTO CANCELADO!" if cancelar.is_set() else f"\n🎉 PROCESSAMENTO CONCLUÍDO!")
+        self.adicionar_log(f"✅ Sucessos: {sucessos}")
+        self.adicionar_log(f"❌ Erros: {erros}")
+        if ignorados:
+            self.adicionar_log(f"⏭️ Pulados (inalterados ou já concluídos): {ignorados}")
+        self.adicionar_log(f"⏱️ Tempo total: {tempo_total:.1f} segundos")
+        self.adicionar_log(f"⚡ Média: {tempo_total/total:.1f}s por arquivo")
         
         self.root.after(0, lambda: self.btn_processar.configure(state="normal", text="🎯 PROCESSAR TODOS"))
         self.root.after(0, lambda: self.btn_escanear.configure(state="normal"))
-        self.root.after(0, lambda: self.status_texto.set(f"✅ Concluído: {sucessos} sucessos, {erros} erros"))
+        situacao = "⛔ Cancelado" if cancelar.is_set() else "✅ Concluído"
+        self.root.after(0, lambda: self.status_texto.set(f"{situacao}: {sucessos} sucessos, {erros} erros"))
         
         # Usar função auxiliar (elimina duplicação)
         self.mostrar_conclusao_processamento(sucessos, erros, tempo_total, pasta_saida)
@@ -1122,166 +1469,6 @@ class DanfeAppMassa:
 
         
     
-    def instalar_vcredist(self):
-        """Instala Visual C++ Redistributable 2015-2022 automaticamente"""
-        try:
-            import urllib.request
-            
-            # URL do Visual C++ Redistributable x64 2015-2022
-            url = "https://aka.ms/vs/17/release/vc_redist.x64.exe"
-            arquivo_installer = "vc_redist.x64.exe"
-            
-            self.adicionar_log("📥 Baixando Visual C++ Redistributable...")
-            
-            # Baixar o installer
-            urllib.request.urlretrieve(url, arquivo_installer)
-            
-            self.adicionar_log("⚙️ Instalando Visual C++ Redistributable...")
-            
-            # Executar instalação silenciosa
-            resultado = subprocess.run(
-                [arquivo_installer, "/quiet", "/norestart"],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutos
-            )
-            
-            # Limpar arquivo temporário
-            if os.path.exists(arquivo_installer):
-                os.remove(arquivo_installer)
-            
-            if resultado.returncode == 0:
-                self.adicionar_log("✅ Visual C++ Redistributable instalado com sucesso!")
-                return True
-            else:
-                self.adicionar_log(f"❌ Erro na instalação (código: {resultado.returncode})")
-                return False
-                
-        except Exception as e:
-            self.adicionar_log(f"❌ Erro ao instalar dependências: {str(e)}")
-            return False
-
-    def processar_xml_individual(self, arquivo_xml, pasta_saida):
-        try:
-            # Verificar se arquivo XML existe
-            if not os.path.exists(arquivo_xml):
-                self.adicionar_log(f"❌ Arquivo não encontrado: {arquivo_xml}")
-                return False
-            
-            # Verificar se pasta de saída existe
-            if not os.path.exists(pasta_saida):
-                try:
-                    os.makedirs(pasta_saida, exist_ok=True)
-                except Exception as e:
-                    self.adicionar_log(f"❌ Erro ao criar pasta: {pasta_saida} - {str(e)}")
-                    return False
-            
-            # Usar PHP para gerar DANFE
-            # Obter o diretório do script atual
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            php_full_path = os.path.join(script_dir, "php", "php.exe")
-            script_php_full = os.path.join(script_dir, "gerador_danfe.php")
-            
-            # Verificar se arquivos existem
-            if not os.path.exists(php_full_path):
-                self.adicionar_log(f"❌ PHP não encontrado: {php_full_path}")
-                return False
-            
-            if not os.path.exists(script_php_full):
-                self.adicionar_log(f"❌ Script PHP não encontrado: {script_php_full}")
-                return False
-            
-            # Comando para executar PHP (usar caminhos absolutos)
-            cmd = [php_full_path, script_php_full, arquivo_xml]
-            
-                        # Executar PHP com melhor tratamento de erro
-            try:
-                # Executar do diretório php para carregar extensões
-                php_dir = os.path.join(script_dir, "php")
-                resultado = subprocess.run(
-                    cmd, 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=120,
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                    cwd=php_dir  # Executar do diretório php para carregar extensões
-                )
-            except FileNotFoundError:
-                self.adicionar_log(f"❌ PHP executável não encontrado: {php_full_path}")
-                return False
-            except Exception as e:
-                self.adicionar_log(f"❌ Erro ao executar PHP: {str(e)}")
-                return False
-            
-            # Verificar se é erro de DLL faltando (Visual C++ Redistributable)
-            if resultado.returncode == 3221225781:  # 0xC0000135 - DLL_NOT_FOUND
-                # Tentar instalar apenas uma vez
-                if not self.vcredist_tentado:
-                    self.adicionar_log(f"❌ PHP precisa do Visual C++ Redistributable 2015-2022")
-                    self.adicionar_log(f"🔧 Instalando dependências automaticamente...")
-                    
-                    if self.instalar_vcredist():
-                        self.adicionar_log(f"🔄 Reinicie o aplicativo para usar o PHP corrigido")
-                    
-                    self.vcredist_tentado = True
-                
-                self.adicionar_log(f"❌ {os.path.basename(arquivo_xml)} - Dependência Visual C++ necessária")
-                return False
-            
-            # Verificar resultado
-            if resultado.returncode == 0 and "SUCCESS:" in resultado.stdout:
-                arquivo_pdf = resultado.stdout.strip().replace("SUCCESS:", "")
-                
-                # Verificar se PDF foi criado
-                if not os.path.exists(arquivo_pdf):
-                    self.adicionar_log(f"❌ PDF não foi criado: {arquivo_pdf}")
-                    return False
-                
-                # Mover PDF para pasta de saída se necessário
-                if pasta_saida != os.path.dirname(arquivo_xml):
-                    nome_pdf = os.path.basename(arquivo_pdf)
-                    novo_caminho = os.path.join(pasta_saida, nome_pdf)
-                    
-                    try:
-                        # Se arquivo já existe na pasta de destino, removê-lo
-                        if os.path.exists(novo_caminho):
-                            os.remove(novo_caminho)
-                        
-                        os.rename(arquivo_pdf, novo_caminho)
-                        nome_pdf = os.path.basename(novo_caminho)
-                    except Exception as e:
-                        self.adicionar_log(f"❌ Erro ao mover PDF: {str(e)}")
-                        return False
-                else:
-                    nome_pdf = os.path.basename(arquivo_pdf)
-                
-                self.adicionar_log(f"✅ {nome_pdf}")
-                return True
-            else:
-                # Log do erro detalhado
-                error_msg = resultado.stderr.strip() if resultado.stderr else "Erro desconhecido"
-                stdout_msg = resultado.stdout.strip() if resultado.stdout else ""
-                
-                if "ERROR:" in stdout_msg:
-                    error_msg = stdout_msg.replace("ERROR:", "").strip()
-                
-                # Se não há saída, pode ser problema com dependências
-                if not stdout_msg and not error_msg:
-                    if resultado.returncode == 3221225781:
-                        error_msg = "Dependência Visual C++ necessária"
-                    else:
-                        error_msg = f"PHP erro código {resultado.returncode}"
-                
-                self.adicionar_log(f"❌ {os.path.basename(arquivo_xml)} - {error_msg}")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            self.adicionar_log(f"❌ Timeout ao processar: {os.path.basename(arquivo_xml)}")
-            return False
-        except Exception as e:
-            self.adicionar_log(f"❌ Erro inesperado: {str(e)}")
-            return False
-            
     def abrir_janela_lote(self):
         # Criar janela popup
         self.janela_lote = ctk.CTkToplevel(self.root)
@@ -1422,30 +1609,24 @@ class DanfeAppMassa:
                 messagebox.showerror("Erro", f"Quantidade de linhas diferente!\n\nChaves: {len(linhas_chaves)} linhas\nNomes: {len(linhas_nomes)} linhas\n\nCada chave deve ter um nome correspondente.")
                 return
             
-            # Validar chaves (usando função auxiliar - elimina duplicação)
-            chaves_validas = []
-            for i, chave_original in enumerate(linhas_chaves):
-                chave = chave_original.strip()
-                if not self.validar_chave_nfe(chave):
-                    messagebox.showerror("Erro", f"Chave inválida na linha {i+1}:\n{chave_original}\n\nChaves devem ter exatamente 44 dígitos numéricos.")
-                    return
-                chaves_validas.append(chave)
-            
-            # Limpar tabela atual
-            for linha in self.linhas_renomeacao:
-                linha['frame'].destroy()
-            self.linhas_renomeacao.clear()
+            # Validar todas as chaves de uma vez (formato, DV, modelo, UF, data e emitente)
+            motivos = self.motor.validar_chaves_nfe(linhas_chaves)
+            invalidas = [
+                f"Linha {i+1}: {chave} ({self.motor.descrever_motivo_chave(motivo)})"
+                for i, (chave, motivo) in enumerate(zip(linhas_chaves, motivos)) if motivo
+            ]
+            if invalidas:
+                detalhes = "\n".join(invalidas[:10])
+                if len(invalidas) > 10:
+                    detalhes += f"\n... e mais {len(invalidas) - 10}"
+                messagebox.showerror("Erro", f"{len(invalidas)} chave(s) inválida(s):\n\n{detalhes}")
+                return
+            chaves_validas = linhas_chaves
             
-            # Adicionar dados processados
-            for chave, nome in zip(chaves_validas, linhas_nomes):
-                self.adicionar_linha_renomeacao()
-                ultima_linha = self.linhas_renomeacao[-1]
-                
-                # Preencher campos
-                ultima_linha['chave'].delete(0, 'end')
-                ultima_linha['chave'].insert(0, chave)
-                ultima_linha['nome'].delete(0, 'end')
-                ultima_linha['nome'].insert(0, nome)
+            # Substituir a tabela atual (só o modelo; a tela mostra as linhas visíveis)
+            self.tabela_renomeacao.carregar(zip(chaves_validas, linhas_nomes))
+            self.primeira_linha_tabela = 0
+            self.redesenhar_tabela()
             
             # Log
             total_processado = len(chaves_validas)
@@ -1463,6 +1644,186 @@ class DanfeAppMassa:
             messagebox.showerror("Erro", f"Erro ao processar lote: {str(e)}")
 
 
+    def importar_planilha(self):
+        caminho = filedialog.askopenfilename(
+            title="Selecione a planilha com chaves e nomes",
+            filetypes=[("Planilhas", "*.xlsx *.xlsm *.csv *.txt"), ("Todos os arquivos", "*.*")]
+        )
+        if not caminho:
+            return
+        
+        try:
+            import danfe_planilha  # pandas só é carregado quando a importação é usada
+        except ImportError as e:
+            messagebox.showerror(
+                "Erro",
+                f"Importação de planilhas indisponível: {e}\n\n"
+                "Instale as dependências: pip install -r requirements.txt"
+            )
+            return
+        
+        self.canal_log.escrever(f"\n📥 Lendo planilha {os.path.basename(caminho)}...", "renomeacao")
+        
+        # Planilhas grandes levam alguns segundos no openpyxl: leitura fora da interface
+        def ler():
+            try:
+                abas = danfe_planilha.abas_planilha(caminho)
+                tabela = danfe_planilha.ler_planilha(caminho)
+            except Exception as e:
+                mensagem = str(e)
+                self.canal_log.atualizar(
+                    "planilha", lambda: messagebox.showerror("Erro", f"Erro ao ler planilha: {mensagem}")
+                )
+                return
+            self.canal_log.atualizar("planilha", lambda: self.abrir_janela_planilha(caminho, abas, tabela))
+        
+        self.executar_thread_segura(ler)
+    
+    def abrir_janela_planilha(self, caminho, abas, tabela):
+        """Escolha da aba e das colunas de chave e de nome antes de importar"""
+        import danfe_planilha
+        
+        janela = ctk.CTkToplevel(self.root)
+        janela.title("📊 Importar Planilha")
+        janela.geometry("560x380")
+        janela.transient(self.root)
+        janela.grab_set()
+        
+        estado = {"tabela": tabela, "colunas": {}, "aba": abas[0] if abas else 0}
+        estado["aba_carregada"] = estado["aba"]
+        
+        ctk.CTkLabel(
+            janela,
+            text=f"📄 {os.path.basename(caminho)}",
+            font=ctk.CTkFont(size=14, weight="bold")
+        ).pack(pady=(15, 10))
+        
+        form = ctk.CTkFrame(janela)
+        form.pack(fill="x", padx=20, pady=5)
+        form.grid_columnconfigure(1, weight=1)
+        
+        menu_chave = ctk.CTkOptionMenu(form, values=["-"])
+        menu_nome = ctk.CTkOptionMenu(form, values=["-"])
+        label_linhas = ctk.CTkLabel(janela, text="", font=ctk.CTkFont(size=12), text_color="gray")
+        
+        def mostrar_colunas():
+            tabela_atual = estado["tabela"]
+            estado["colunas"] = {str(coluna): coluna for coluna in tabela_atual.columns}
+            nomes_colunas = list(estado["colunas"]) or ["-"]
+            sugestao_chave, sugestao_nome = danfe_planilha.sugerir_colunas(tabela_atual)
+            menu_chave.configure(values=nomes_colunas)
+            menu_nome.configure(values=nomes_colunas)
+            menu_chave.set(str(sugestao_chave) if sugestao_chave is not None else nomes_colunas[0])
+            menu_nome.set(str(sugestao_nome) if sugestao_nome is not None else nomes_colunas[0])
+            label_linhas.configure(text=f"{len(tabela_atual)} linha(s) de dados")
+        
+        def trocar_aba(aba):
+            # Mesma leitura fora da interface da primeira aba; só a última aba escolhida vale
+            estado["aba"] = aba
+            label_linhas.configure(text=f"⏳ Lendo a aba {aba}...")
+            
+            def ler():
+                tabela, erro = None, None
+                try:
+                    tabela = danfe_planilha.ler_planilha(caminho, aba)
+                except Exception as e:
+                    erro = str(e)
+                self.canal_log.atualizar("planilha_aba", lambda: aba_lida(aba, tabela, erro))
+            
+            self.executar_thread_segura(ler)
+        
+        def aba_lida(aba, tabela, erro):
+            if not janela.winfo_exists() or aba != estado["aba"]:
+                return
+            if erro is not None:
+                messagebox.showerror("Erro", f"Erro ao ler a aba {aba}: {erro}", parent=janela)
+                estado["aba"] = estado["aba_carregada"]
+                menu_aba.set(estado["aba_carregada"])
+            else:
+                estado["tabela"] = tabela
+                estado["aba_carregada"] = aba
+            mostrar_colunas()
+        
+        linha = 0
+        if len(abas) > 1:
+            ctk.CTkLabel(form, text="📑 Aba:").grid(row=linha, column=0, padx=10, pady=8, sticky="w")
+            menu_aba = ctk.CTkOptionMenu(form, values=abas, command=trocar_aba)
+            menu_aba.set(abas[0])
+            menu_aba.grid(row=linha, column=1, padx=10, pady=8, sticky="ew")
+            linha += 1
+        
+        ctk.CTkLabel(form, text="🔑 Coluna da chave:").grid(row=linha, column=0, padx=10, pady=8, sticky="w")
+        menu_chave.grid(row=linha, column=1, padx=10, pady=8, sticky="ew")
+        ctk.CTkLabel(form, text="📄 Coluna do nome:").grid(row=linha + 1, column=0, padx=10, pady=8, sticky="w")
+        menu_nome.grid(row=linha + 1, column=1, padx=10, pady=8, sticky="ew")
+        label_linhas.pack(pady=10)
+        mostrar_colunas()
+        
+        def importar():
+            if estado["aba"] != estado["aba_carregada"]:
+                messagebox.showinfo("Aguarde", "A aba escolhida ainda está sendo lida.", parent=janela)
+                return
+            coluna_chave = estado["colunas"].get(menu_chave.get())
+            coluna_nome = estado["colunas"].get(menu_nome.get())
+            if coluna_chave is None or coluna_nome is None or coluna_chave == coluna_nome:
+                messagebox.showerror("Erro", "Escolha colunas diferentes para a chave e o nome!", parent=janela)
+                return
+            self.aplicar_planilha(estado["tabela"], coluna_chave, coluna_nome)
+            janela.destroy()
+        
+        botoes = ctk.CTkFrame(janela, fg_color="transparent")
+        botoes.pack(fill="x", padx=20, pady=15, side="bottom")
+        ctk.CTkButton(
+            botoes,
+            text="✅ Importar",
+            command=importar,
+            width=150,
+            height=40,
+            font=ctk.CTkFont(size=14, weight="bold"),
+            fg_color="#2E8B57",
+            hover_color="#228B22"
+        ).pack(side="right", padx=(10, 0))
+        ctk.CTkButton(
+            botoes,
+            text="❌ Cancelar",
+            command=janela.destroy,
+            width=130,
+            height=40,
+            font=ctk.CTkFont(size=14, weight="bold"),
+            fg_color="#DC143C",
+            hover_color="#B22222"
+        ).pack(side="right")
+    
+    def aplicar_planilha(self, tabela, coluna_chave, coluna_nome, limite_detalhes=20):
+        """Valida todas as linhas de uma vez e carrega o resultado direto no modelo da tabela"""
+        import danfe_planilha
+        
+        # Sem escaneamento não há como saber quais chaves existem na pasta
+        resultado = danfe_planilha.validar_mapeamento(
+            tabela[coluna_chave], tabela[coluna_nome], self.chaves_xml or None
+        )
+        status = resultado["motivo"].map(danfe_planilha.STATUS_POR_MOTIVO)
+        self.tabela_renomeacao.carregar(zip(resultado["chave"], resultado["nome"]), status)
+        self.primeira_linha_tabela = 0
+        self.redesenhar_tabela()
+        
+        resumo = danfe_planilha.resumir_validacao(resultado)
+        self.canal_log.escrever(f"\n📊 PLANILHA IMPORTADA: {len(resultado)} linha(s)", "renomeacao")
+        self.canal_log.escrever(f"✅ Válidas: {resumo.pop('', 0)}", "renomeacao")
+        for motivo, quantidade in resumo.items():
+            self.canal_log.escrever(f"❌ {danfe_planilha.MOTIVOS[motivo]}: {quantidade}", "renomeacao")
+        
+        problemas = resultado[resultado["motivo"] != ""]
+        for registro in problemas.head(limite_detalhes).itertuples():
+            self.canal_log.escrever(
+                f"   Linha {registro.linha}: {danfe_planilha.MOTIVOS[registro.motivo]} ({registro.chave or '-'})",
+                "renomeacao"
+            )
+        if len(problemas) > limite_detalhes:
+            self.canal_log.escrever(f"   ... e mais {len(problemas) - limite_detalhes} linha(s)", "renomeacao")
+        if not self.chaves_xml:
+            self.canal_log.escrever("💡 Escaneie as chaves para conferir também se os XMLs existem", "renomeacao")
+
     def executar(self):
         # Configurar controles de janela
         self.root.protocol("WM_DELETE_WINDOW", self.fechar_aplicacao)
@@ -1479,7 +1840,13 @@ class DanfeAppMassa:
     def fechar_aplicacao(self):
         """Fecha a aplicação com cleanup adequado"""
         try:
+            # Interromper escaneamento de chaves e lote em andamento
+            for cancelar in (self.cancelar_chaves, self.cancelar_massa):
+                if cancelar is not None:
+                    cancelar.set()
+            
             # Fechar aplicação
+            self.canal_log.fechar()
             self.root.quit()
             print("👋 Aplicação fechada com sucesso")
             
@@ -1490,6 +1857,8 @@ class DanfeAppMassa:
 
 
 if __name__ == "__main__":
+    # Executável congelado: os processos de extração de chaves reentram por aqui
+    multiprocessing.freeze_support()
     app = DanfeAppMassa()
     app.executar()
 
@@ -1510,6 +1879,8 @@ ambientes hospitalares.
 📁 ARQUIVOS DO SISTEMA:
 -----------------------
 • danfe_app.py             - Aplicação principal com interface moderna
+• danfe_motor.py           - Engine de processamento (sem interface)
+• danfe_cli.py             - Processamento em lote pela linha de comando
 • gerador_danfe.php        - Engine PHP para geração de DANFEs
 • requirements.txt         - Dependências Python
 • composer.json           - Dependências PHP
@@ -1519,7 +1890,7 @@ ambientes hospitalares.
 
 1. 🚀 PROCESSAMENTO EM MASSA:
    • Converte múltiplos XMLs para PDF simultaneamente
-   • Processamento paralelo (até 5 documentos simultâneos)
+   • Processamento paralelo com concorrência adaptativa (ajustável)
    • Barras de progresso em tempo real
    • Logs detalhados de cada operação
 
@@ -1544,7 +1915,7 @@ ambientes hospitalares.
 🔧 CONFIGURAÇÕES TÉCNICAS:
 -------------------------
 
-• Threads Paralelas: 5 workers simultâneos
+• Threads Paralelas: automático pela CPU (ou fixo via RENAMERPRO_WORKERS)
 • Validação: Chaves NFe 44 dígitos obrigatórios
 • Formatos: XML → PDF via engine PHP
 • Interface: CustomTkinter com tema hospitalar
@@ -1558,10 +1929,11 @@ ambientes hospitalares.
    • Gerencia interface e processamento
    • Controla threading e validações
 
-2. Funcionalidades de Processamento:
+2. MotorDanfe (danfe_motor.py) - engine sem interface gráfica:
    • processar_xml_individual() - Processamento unitário
    • processar_xmls_paralelo() - Processamento em massa
    • validar_chave_nfe() - Validação de chaves
+   • Também usada pela linha de comando (danfe_cli.py)
 
 3. Interface Profissional:
    • criar_botao_profissional() - Botões com tema Einstein
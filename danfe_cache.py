@@ -0,0 +1,227 @@
+"""
+Controle de conversões já realizadas
+Registra cada XML convertido (tamanho e data de modificação) e o PDF gerado,
+para que execuções seguintes pulem documentos inalterados, e guarda os PDFs
+renderizados por conteúdo para que cópias do mesmo documento não passem pelo PHP
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+
+from danfe_dados import conectar_banco, diretorio_dados
+
+# Espaços entre tags, BOM e declaração <?xml ?> não mudam o DANFE impresso
+_RE_DECLARACAO = re.compile(rb"^\s*<\?xml[^>]*\?>")
+_RE_ENTRE_TAGS = re.compile(rb">\s+<")
+
+
+def caminho_pdf_destino(arquivo_xml, pasta_saida, nome_personalizado=None):
+    """Caminho final do PDF de um XML (mesma regra de nomes do gerador_danfe.php)"""
+    if nome_personalizado:
+        nome_base = nome_personalizado[:-4] if nome_personalizado.endswith(".pdf") else nome_personalizado
+    else:
+        nome_base = os.path.basename(arquivo_xml)
+        if nome_base.endswith(".xml"):
+            nome_base = nome_base[:-4]
+    return os.path.join(pasta_saida, nome_base + ".pdf")
+
+
+class RegistroIncremental:
+    """Histórico XML → PDF usado pelo modo incremental"""
+
+    GRAVAR_A_CADA = 200
+
+    def __init__(self, conexao=None):
+        self.conexao = conexao or conectar_banco()
+        self._lock = threading.Lock()
+        self._pendentes = []
+        with self._lock, self.conexao:
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS conversoes ("
+                " xml TEXT PRIMARY KEY,"
+                " tamanho INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " pdf TEXT NOT NULL,"
+                " pdf_tamanho INTEGER NOT NULL)"
+            )
+
+    def inalterado(self, arquivo_xml, arquivo_pdf):
+        """True se o XML não mudou desde a última conversão e o PDF gerado ainda existe"""
+        try:
+            info_xml = os.stat(arquivo_xml)
+        except OSError:
+            return False
+
+        with self._lock:
+            registro = self.conexao.execute(
+                "SELECT tamanho, mtime_ns, pdf, pdf_tamanho FROM conversoes WHERE xml = ?",
+                (os.path.abspath(arquivo_xml),)
+            ).fetchone()
+        if registro is None:
+            return False
+
+        tamanho, mtime_ns, pdf, pdf_tamanho = registro
+        if (tamanho, mtime_ns) != (info_xml.st_size, info_xml.st_mtime_ns):
+            return False
+        if pdf != os.path.abspath(arquivo_pdf):
+            return False  # Outra pasta de saída ou outro nome
+        try:
+            return os.stat(pdf).st_size == pdf_tamanho
+        except OSError:
+            return False  # PDF apagado
+
+    def registrar(self, arquivo_xml, arquivo_pdf):
+        """Anota uma conversão bem-sucedida (gravação em blocos; chamar finalizar() no fim do lote)"""
+        try:
+            info_xml = os.stat(arquivo_xml)
+            info_pdf = os.stat(arquivo_pdf)
+        except OSError:
+            return
+        with self._lock:
+            self._pendentes.append((
+                os.path.abspath(arquivo_xml), info_xml.st_size, info_xml.st_mtime_ns,
+                os.path.abspath(arquivo_pdf), info_pdf.st_size
+            ))
+            if len(self._pendentes) >= self.GRAVAR_A_CADA:
+                self._gravar()
+
+    def finalizar(self):
+        with self._lock:
+            self._gravar()
+
+    def _gravar(self):
+        if self._pendentes:
+            with self.conexao:
+                self.conexao.executemany("INSERT OR REPLACE INTO conversoes VALUES (?, ?, ?, ?, ?)", self._pendentes)
+            self._pendentes = []
+
+
+def normalizar_xml(conteudo):
+    """Bytes do XML sem BOM, declaração, quebras CR e espaços entre tags"""
+    if conteudo.startswith(b"\xef\xbb\xbf"):
+        conteudo = conteudo[3:]
+    conteudo = _RE_DECLARACAO.sub(b"", conteudo, count=1)
+    conteudo = conteudo.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return _RE_ENTRE_TAGS.sub(b"><", conteudo).strip()
+
+
+class CacheRenderizacao:
+    """PDFs já renderizados, endereçados por chave de acesso + hash do documento normalizado
+
+    O hash inclui a versão do renderizador (ex.: hash do gerador_danfe.php),
+    então mudanças no layout invalidam o cache. O tamanho total é limitado e
+    os PDFs usados há mais tempo são descartados primeiro (LRU).
+    """
+
+    LIMITE_PADRAO = 1024 * 1024 * 1024  # 1 GB
+
+    def __init__(self, versao="", limite_bytes=LIMITE_PADRAO, pasta=None, conexao=None):
+        self.versao = versao.encode("utf-8") if isinstance(versao, str) else versao
+        self.limite_bytes = limite_bytes
+        self.pasta = pasta or os.path.join(diretorio_dados(), "cache_pdf")
+        os.makedirs(self.pasta, exist_ok=True)
+        self.conexao = conexao or conectar_banco()
+        self._lock = threading.Lock()
+        with self._lock, self.conexao:
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS cache_pdf ("
+                " id TEXT PRIMARY KEY,"
+                " tamanho INTEGER NOT NULL,"
+                " ultimo_uso REAL NOT NULL)"
+            )
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_cache_pdf_uso ON cache_pdf (ultimo_uso)")
+            self._total = self.conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM cache_pdf").fetchone()[0]
+
+    def identificar(self, conteudo, chave):
+        """Identificador do documento no cache (None sem chave de acesso)"""
+        if not chave:
+            return None
+        resumo = hashlib.sha256(self.versao + b"\0" + normalizar_xml(conteudo)).hexdigest()
+        return f"{chave}-{resumo[:32]}"
+
+    def _caminho(self, identificador):
+        return os.path.join(self.pasta, identificador + ".pdf")
+
+    def obter(self, identificador, destino):
+        """Entrega o PDF em cache no destino (hard link ou cópia); False se não houver"""
+        origem = self._caminho(identificador)
+        with self._lock:
+            registro = self.conexao.execute(
+                "SELECT tamanho FROM cache_pdf WHERE id = ?", (identificador,)
+            ).fetchone()
+        if registro is None:
+            return False
+        try:
+            if os.stat(origem).st_size != registro[0]:
+                raise OSError("PDF em cache alterado")
+        except OSError:
+            self._esquecer(identificador)
+            return False
+
+        try:
+            if os.path.exists(destino):
+                os.remove(destino)
+            try:
+                os.link(origem, destino)
+            except OSError:
+                shutil.copyfile(origem, destino)  # Outro volume ou sistema sem hard links
+        except OSError:
+            return False
+
+        with self._lock, self.conexao:
+            self.conexao.execute("UPDATE cache_pdf SET ultimo_uso = ? WHERE id = ?", (time.time(), identificador))
+        return True
+
+    def guardar(self, identificador, arquivo_pdf):
+        """Copia um PDF recém-gerado para o cache e aplica o limite de tamanho"""
+        destino = self._caminho(identificador)
+        temporario = f"{destino}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(arquivo_pdf, temporario)
+            os.replace(temporario, destino)
+            tamanho = os.path.getsize(destino)
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+
+        with self._lock, self.conexao:
+            anterior = self.conexao.execute(
+                "SELECT tamanho FROM cache_pdf WHERE id = ?", (identificador,)
+            ).fetchone()
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO cache_pdf VALUES (?, ?, ?)", (identificador, tamanho, time.time())
+            )
+            self._total += tamanho - (anterior[0] if anterior else 0)
+            if self._total > self.limite_bytes:
+                self._despejar()
+
+    def _despejar(self):
+        """Remove os PDFs menos usados até o cache ficar em 90% do limite"""
+        alvo = self.limite_bytes * 0.9
+        removidos = []
+        for identificador, tamanho in self.conexao.execute(
+                "SELECT id, tamanho FROM cache_pdf ORDER BY ultimo_uso"):
+            if self._total <= alvo:
+                break
+            removidos.append((identificador,))
+            self._total -= tamanho
+        self.conexao.executemany("DELETE FROM cache_pdf WHERE id = ?", removidos)
+        for (identificador,) in removidos:
+            try:
+                os.remove(self._caminho(identificador))
+            except OSError:
+                pass  # Hard links nas pastas de saída continuam válidos
+
+    def _esquecer(self, identificador):
+        with self._lock, self.conexao:
+            registro = self.conexao.execute(
+                "SELECT tamanho FROM cache_pdf WHERE id = ?", (identificador,)
+            ).fetchone()
+            if registro:
+                self.conexao.execute("DELETE FROM cache_pdf WHERE id = ?", (identificador,))
+                self._total -= registro[0]
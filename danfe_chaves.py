@@ -0,0 +1,258 @@
+"""
+Extração de chaves de acesso de XMLs de NF-e
+Lê apenas o início do arquivo e para assim que encontra infNFe@Id ou chNFe,
+sem montar a árvore completa (itens det, assinatura, etc.)
+Mantém um índice persistente das chaves por pasta para reescaneamentos rápidos
+Lotes grandes são extraídos em processos separados (o GIL serializaria as threads)
+"""
+
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from danfe_dados import conectar_banco
+
+# infNFe@Id e protNFe/infProt/chNFe ficam nos primeiros KB de NFe/procNFe
+BYTES_CABECALHO = 8192
+
+# <infNFe ... Id="NFe<44 dígitos>"> e <chNFe>44 dígitos</chNFe>, com ou sem prefixo de namespace
+_RE_ID_INFNFE = re.compile(rb'<(?:[\w.-]+:)?infNFe\b[^>]*?\bId\s*=\s*["\'][A-Za-z]*(\d{44})["\']')
+_RE_CHNFE = re.compile(rb'<(?:[\w.-]+:)?chNFe\s*>\s*(\d{44})\s*<')
+
+# Extração em processos: abaixo deste número de arquivos o custo de iniciar os
+# processos (spawn no Windows) supera o ganho
+MINIMO_PROCESSOS = 2000
+# Arquivos por tarefa enviada a um processo (resultados voltam como lista de chaves)
+ARQUIVOS_POR_LOTE = 500
+# Limite do ProcessPoolExecutor no Windows
+MAXIMO_PROCESSOS = 61
+
+
+class OperacaoCancelada(Exception):
+    """Escaneamento interrompido a pedido do usuário"""
+
+
+def _verificar_cancelamento(cancelar):
+    if cancelar is not None and cancelar.is_set():
+        raise OperacaoCancelada("Escaneamento cancelado")
+
+
+def extrair_chave_bytes(conteudo):
+    """Procura a chave de acesso diretamente nos bytes do XML (None se não achar)"""
+    for regex in (_RE_ID_INFNFE, _RE_CHNFE):
+        encontrado = regex.search(conteudo)
+        if encontrado:
+            return encontrado.group(1).decode("ascii")
+    return None
+
+
+def extrair_chave_xml(caminho_arquivo):
+    """Chave de acesso de um XML: varredura do cabeçalho e, se necessário, parse incremental"""
+    try:
+        with open(caminho_arquivo, "rb") as f:
+            cabecalho = f.read(BYTES_CABECALHO)
+    except OSError:
+        return None
+
+    chave = extrair_chave_bytes(cabecalho)
+    if chave:
+        return chave
+
+    # Layouts incomuns (codificação UTF-16, prefixos, cabeçalhos longos)
+    return _extrair_chave_iterparse(caminho_arquivo)
+
+
+def _extrair_chave_iterparse(caminho_arquivo):
+    """Parse incremental: para em infNFe@Id ou chNFe; senão usa o primeiro Id com 44+ caracteres"""
+    candidato = None
+    try:
+        for evento, elem in ET.iterparse(caminho_arquivo, events=("start", "end")):
+            tag = elem.tag.rsplit("}", 1)[-1]
+
+            if evento == "start":
+                id_value = elem.get("Id")
+                if id_value and len(id_value) >= 44:
+                    if tag == "infNFe":
+                        return id_value[-44:]
+                    if candidato is None:
+                        candidato = id_value[-44:]  # Pegar os últimos 44 caracteres
+                continue
+
+            if tag == "chNFe" and elem.text and elem.text.strip():
+                return elem.text.strip()
+
+            # Descartar elementos já lidos (itens, assinatura) para não acumular memória
+            elem.clear()
+    except (ET.ParseError, OSError):
+        return None
+
+    return candidato
+
+
+def extrair_chaves_lote(caminhos):
+    """Chaves (ou None) de uma lista de arquivos, na mesma ordem; executada nos processos"""
+    return [extrair_chave_xml(caminho) for caminho in caminhos]
+
+
+def extrair_chaves_paralelo(caminhos, processos=None, ao_progresso=None, minimo=MINIMO_PROCESSOS,
+                            cancelar=None):
+    """Chaves (ou None) dos arquivos na mesma ordem, em processos para lotes grandes
+
+    ao_progresso(concluidos, total, lote) é chamado a cada lote concluído, com
+    lote = [(caminho, chave)]. Com o threading.Event cancelar acionado, os lotes
+    pendentes são descartados e OperacaoCancelada é levantada. Sem como iniciar
+    processos (ambientes restritos), a extração segue na thread atual.
+    """
+    caminhos = list(caminhos)
+    total = len(caminhos)
+    processos = min(processos or os.cpu_count() or 1, MAXIMO_PROCESSOS)
+    if total < minimo or processos < 2:
+        return _extrair_chaves_serial(caminhos, ao_progresso, cancelar)
+
+    # Lotes menores que o padrão quando há poucos arquivos por processo
+    tamanho = max(1, min(ARQUIVOS_POR_LOTE, total // (processos * 4) or 1))
+    chaves = [None] * total
+    concluidos = 0
+    try:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futures = {
+                executor.submit(extrair_chaves_lote, caminhos[inicio:inicio + tamanho]): inicio
+                for inicio in range(0, total, tamanho)
+            }
+            for future in as_completed(futures):
+                if cancelar is not None and cancelar.is_set():
+                    # Só os lotes já em execução terminam (são curtos)
+                    for pendente in futures:
+                        pendente.cancel()
+                    _verificar_cancelamento(cancelar)
+                inicio = futures[future]
+                lote = future.result()
+                chaves[inicio:inicio + len(lote)] = lote
+                concluidos += len(lote)
+                if ao_progresso:
+                    ao_progresso(concluidos, total, list(zip(caminhos[inicio:inicio + len(lote)], lote)))
+    except (OSError, BrokenProcessPool):
+        return _extrair_chaves_serial(caminhos, ao_progresso, cancelar)
+    return chaves
+
+
+def _extrair_chaves_serial(caminhos, ao_progresso=None, cancelar=None):
+    chaves = []
+    total = len(caminhos)
+    for inicio in range(0, total, ARQUIVOS_POR_LOTE):
+        _verificar_cancelamento(cancelar)
+        lote = extrair_chaves_lote(caminhos[inicio:inicio + ARQUIVOS_POR_LOTE])
+        chaves.extend(lote)
+        if ao_progresso:
+            ao_progresso(len(chaves), total, list(zip(caminhos[inicio:inicio + len(lote)], lote)))
+    return chaves
+
+
+class IndiceChaves:
+    """Índice persistente caminho → chave, invalidado por tamanho e data de modificação"""
+
+    def __init__(self, conexao=None):
+        self.conexao = conexao or conectar_banco()
+        self._lock = threading.Lock()
+        self.estatisticas = {"reaproveitadas": 0, "lidas": 0, "removidas": 0}
+        with self._lock, self.conexao:
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS indice_chaves ("
+                " caminho TEXT PRIMARY KEY,"
+                " pasta TEXT NOT NULL,"
+                " tamanho INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " chave TEXT)"
+            )
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_indice_chaves_pasta ON indice_chaves (pasta)")
+
+    def chaves_da_pasta(self, pasta, entradas, recursivo=False, completo=True, extrator=extrair_chaves_paralelo,
+                        cancelar=None):
+        """Lista [(caminho, chave ou None)] das os.DirEntry informadas, lendo só arquivos novos ou alterados
+
+        extrator recebe a lista de caminhos novos ou alterados e devolve as chaves
+        na mesma ordem. Com completo=True (varredura sem filtros) os registros de
+        arquivos que não apareceram mais são removidos do índice. Com o
+        threading.Event cancelar acionado, levanta OperacaoCancelada sem gravar nada.
+        """
+        pasta = os.path.abspath(pasta)
+        consulta = "SELECT caminho, tamanho, mtime_ns, chave FROM indice_chaves WHERE pasta = ?"
+        parametros = [pasta]
+        if recursivo:
+            # Subpastas: prefixo com os curingas do LIKE escapados
+            prefixo = os.path.join(pasta, "")
+            prefixo = prefixo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            consulta += " OR pasta LIKE ? ESCAPE '\\'"
+            parametros.append(prefixo + "%")
+
+        with self._lock:
+            registrados = {
+                caminho: (tamanho, mtime_ns, chave)
+                for caminho, tamanho, mtime_ns, chave in self.conexao.execute(consulta, parametros)
+            }
+
+        resultados = []
+        pendentes = []  # (posição em resultados, caminho, stat) dos arquivos a ler
+        for entrada in entradas:
+            _verificar_cancelamento(cancelar)
+            caminho = os.path.abspath(entrada.path)
+            info = entrada.stat()
+            registro = registrados.pop(caminho, None)
+            if registro and registro[0] == info.st_size and registro[1] == info.st_mtime_ns:
+                resultados.append((caminho, registro[2]))
+                continue
+
+            pendentes.append((len(resultados), caminho, info))
+            resultados.append((caminho, None))
+
+        # Extração em bloco: arquivos novos ou alterados de uma só vez
+        alterados = []
+        chaves = extrator([caminho for _, caminho, _ in pendentes]) if pendentes else []
+        _verificar_cancelamento(cancelar)
+        for (posicao, caminho, info), chave in zip(pendentes, chaves):
+            resultados[posicao] = (caminho, chave)
+            alterados.append((caminho, os.path.dirname(caminho), info.st_size, info.st_mtime_ns, chave))
+
+        removidos = list(registrados) if completo else []
+
+        # Gravar novidades e esquecer arquivos que saíram da pasta
+        with self._lock, self.conexao:
+            self.conexao.executemany("INSERT OR REPLACE INTO indice_chaves VALUES (?, ?, ?, ?, ?)", alterados)
+            self.conexao.executemany("DELETE FROM indice_chaves WHERE caminho = ?", [(c,) for c in removidos])
+
+        self.estatisticas = {
+            "reaproveitadas": len(resultados) - len(alterados),
+            "lidas": len(alterados),
+            "removidas": len(removidos),
+        }
+        return resultados
+
+    def renomear(self, caminho_antigo, caminho_novo):
+        """Acompanha uma renomeação feita pelo próprio sistema (tamanho e mtime não mudam)"""
+        with self._lock, self.conexao:
+            self.conexao.execute(
+                "UPDATE OR REPLACE indice_chaves SET caminho = ?, pasta = ? WHERE caminho = ?",
+                (os.path.abspath(caminho_novo), os.path.dirname(os.path.abspath(caminho_novo)),
+                 os.path.abspath(caminho_antigo))
+            )
+
+    def renomear_varios(self, pares):
+        """renomear para um lote [(antigo, novo)] numa só transação (aceita trocas de nome entre arquivos)"""
+        pares = [(os.path.abspath(antigo), os.path.abspath(novo)) for antigo, novo in pares]
+        with self._lock, self.conexao:
+            registros = []
+            for antigo, novo in pares:
+                linha = self.conexao.execute(
+                    "SELECT tamanho, mtime_ns, chave FROM indice_chaves WHERE caminho = ?", (antigo,)
+                ).fetchone()
+                if linha is not None:
+                    registros.append((novo, os.path.dirname(novo)) + tuple(linha))
+            # Remove todos antes de inserir: numa troca A↔B o novo caminho de um é o antigo do outro
+            self.conexao.executemany("DELETE FROM indice_chaves WHERE caminho = ?", [(antigo,) for antigo, _ in pares])
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO indice_chaves (caminho, pasta, tamanho, mtime_ns, chave) VALUES (?, ?, ?, ?, ?)",
+                registros
+            )
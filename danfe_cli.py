@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Processamento de DANFEs em lote pela linha de comando (sem interface gráfica)
+Permite agendar lotes noturnos, rodar em servidores e medir execuções de forma repetível
+
+Uso:
+    python danfe_cli.py PASTA_XML [-o PASTA_SAIDA] [-w auto|N] [--resumo resumo.json]
+                        [-r] [--padrao "*.xml"] [--cnpj CNPJ] [--desde DD/MM/AAAA]
+                        [--incremental] [--sem-cache] [--relatorio] [--via-pipe]
+                        [--leitura-antecipada MB] [--sem-diario] [--php CAMINHO]
+
+Ctrl+C encerra o lote após os documentos em andamento; a próxima execução com
+a mesma pasta de saída retoma do diário (documentos já concluídos são pulados).
+
+Códigos de saída:
+    0 - todos os documentos processados com sucesso
+    1 - um ou mais documentos com erro
+    2 - erro de uso (pasta inexistente, nenhum XML encontrado, argumentos inválidos)
+    130 - lote cancelado (Ctrl+C)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+
+from danfe_agendador import resolver_workers
+from danfe_motor import MotorDanfe
+from danfe_varredura import PADRAO_XML, converter_data
+
+SAIDA_OK = 0
+SAIDA_FALHAS = 1
+SAIDA_USO = 2
+SAIDA_CANCELADO = 130
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="danfe_cli",
+        description="renamerPRO© - geração de DANFEs em lote a partir de XMLs de NF-e"
+    )
+    parser.add_argument("entrada", help="Pasta com os arquivos XML")
+    parser.add_argument("-o", "--saida", help="Pasta de destino dos PDFs (padrão: a mesma dos XMLs)")
+    parser.add_argument("-w", "--workers", default="auto",
+                        help="Documentos simultâneos: 'auto' (padrão) ou um número fixo")
+    parser.add_argument("--resumo", help="Grava um resumo da execução em JSON neste arquivo ('-' para STDOUT, com as mensagens no STDERR)")
+    parser.add_argument("-r", "--recursivo", action="store_true", help="Inclui subpastas (ex.: CNPJ/AAAA/MM)")
+    parser.add_argument("--padrao", default=PADRAO_XML, help="Padrão de nome dos arquivos (padrão: *.xml)")
+    parser.add_argument("--cnpj", help="Somente arquivos com este CNPJ do emitente no nome")
+    parser.add_argument("--desde", help="Somente arquivos modificados a partir de DD/MM/AAAA")
+    parser.add_argument("--threads-varredura", type=int, default=4,
+                        help="Leituras de pasta simultâneas na varredura recursiva (padrão: 4)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Pula XMLs inalterados desde a última conversão cujo PDF ainda existe")
+    parser.add_argument("--via-pipe", action="store_true",
+                        help="Envia o XML ao PHP pelo pipe e recebe o PDF de volta (PHP não acessa o disco)")
+    parser.add_argument("--leitura-antecipada", type=int, default=0, metavar="MB",
+                        help="Lê os próximos XMLs na memória enquanto os anteriores são renderizados, "
+                             "até MB megabytes (útil em pastas de rede; implica --via-pipe)")
+    parser.add_argument("--relatorio", action="store_true",
+                        help="Grava na pasta de saída o relatório de tempos por etapa (CSV e JSON)")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Renderiza todos os documentos, sem reaproveitar PDFs de XMLs idênticos")
+    parser.add_argument("--sem-diario", action="store_true",
+                        help="Não retoma lotes interrompidos nem grava o diário de documentos concluídos")
+    parser.add_argument("--php", metavar="CAMINHO",
+                        help="Executável PHP (padrão: php/php.exe do projeto ou, sem ele, o php do PATH)")
+    parser.add_argument("-q", "--silencioso", action="store_true", help="Não exibe o log de cada documento")
+    return parser
+
+
+def gravar_resumo(destino, resumo):
+    """Grava o resumo JSON no arquivo ou, com '-', no STDOUT"""
+    conteudo = json.dumps(resumo, indent=2, ensure_ascii=False)
+    if destino == "-":
+        print(conteudo)
+    else:
+        with open(destino, "w", encoding="utf-8") as f:
+            f.write(conteudo + "\n")
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+
+    # Consoles Windows (cp1252) não exibem os emojis do log
+    for fluxo in (sys.stdout, sys.stderr):
+        if hasattr(fluxo, "reconfigure"):
+            fluxo.reconfigure(errors="replace")
+
+    # Com --resumo -, o STDOUT traz só o JSON: as mensagens vão para o STDERR
+    humano = sys.stderr if args.resumo == "-" else sys.stdout
+
+    def exibir(texto):
+        print(texto, file=humano)
+
+    pasta_xml = os.path.abspath(args.entrada)
+    pasta_saida = os.path.abspath(args.saida) if args.saida else pasta_xml
+
+    if not os.path.isdir(pasta_xml):
+        print(f"❌ Pasta não encontrada: {pasta_xml}", file=sys.stderr)
+        return SAIDA_USO
+
+    # "auto" ainda respeita a variável RENAMERPRO_WORKERS, se definida
+    workers = resolver_workers(args.workers)
+    if workers is None and args.workers.strip().lower() != "auto":
+        print(f"❌ Valor inválido para --workers: {args.workers}", file=sys.stderr)
+        return SAIDA_USO
+
+    try:
+        filtros = {
+            "recursivo": args.recursivo,
+            "padrao": args.padrao,
+            "cnpj": args.cnpj,
+            "modificado_desde": converter_data(args.desde),
+            "threads": max(args.threads_varredura, 1),
+        }
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return SAIDA_USO
+
+    executavel_php = None
+    if args.php:
+        executavel_php = shutil.which(args.php)
+        if executavel_php is None:
+            print(f"❌ PHP não encontrado: {args.php}", file=sys.stderr)
+            return SAIDA_USO
+        # O PHP roda a partir da pasta do projeto: caminhos relativos deixariam de valer
+        executavel_php = os.path.abspath(executavel_php)
+
+    motor = MotorDanfe(log=(lambda texto: None) if args.silencioso else exibir)
+    motor.executavel_php = executavel_php
+    motor.usar_cache_render = not args.sem_cache
+    # XMLs já lidos na memória seguem pelo pipe: o PHP não volta a abri-los na rede
+    motor.orcamento_leitura = max(args.leitura_antecipada, 0) * 2 ** 20
+    motor.enviar_conteudo = args.via_pipe or motor.orcamento_leitura > 0
+    motor.usar_diario = not args.sem_diario
+
+    # Primeiro Ctrl+C: termina os documentos em andamento e para; o segundo interrompe na hora
+    cancelar = threading.Event()
+
+    def ao_interromper(sinal, quadro):
+        if cancelar.is_set():
+            signal.default_int_handler(sinal, quadro)
+        cancelar.set()
+        print("\n⛔ Cancelando após os documentos em andamento (Ctrl+C de novo para interromper já)...",
+              file=sys.stderr)
+
+    signal.signal(signal.SIGINT, ao_interromper)
+
+    exibir(f"🚀 Processando XMLs de {pasta_xml}")
+    exibir(f"📤 Pasta saída: {pasta_saida}")
+
+    # A varredura alimenta o processamento à medida que encontra os arquivos
+    falhas = []
+    ignorados = []
+    sucessos, erros, tempo_total = motor.processar_xmls_paralelo(
+        motor.iterar_xmls_pasta_seguro(pasta_xml, **filtros), pasta_saida,
+        callback_erro=falhas.append,
+        max_workers=workers,
+        incremental=args.incremental,
+        callback_ignorado=ignorados.append,
+        relatorio=args.relatorio,
+        cancelar=cancelar
+    )
+
+    total = sucessos + erros + len(ignorados)
+    vazao = (sucessos + erros) / max(tempo_total, 1e-9)
+    if args.resumo:
+        resumo = {
+            "entrada": pasta_xml,
+            "saida": pasta_saida,
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - tempo_total)),
+            "workers": workers or "auto",
+            "total": total,
+            "sucessos": sucessos,
+            "erros": erros,
+            "ignorados": len(ignorados),
+            "tempo_total_s": round(tempo_total, 3),
+            "docs_por_segundo": round(vazao, 3),
+            "falhas": sorted(falhas),
+            "cancelado": cancelar.is_set(),
+        }
+        if motor.ultimo_relatorio:
+            resumo["relatorio_tempos"] = list(motor.ultimo_relatorio)
+
+    if total == 0:
+        print(f"❌ Nenhum arquivo XML encontrado em: {pasta_xml}", file=sys.stderr)
+        if args.resumo:
+            gravar_resumo(args.resumo, resumo)
+        return SAIDA_USO
+    exibir(f"\n⛔ PROCESSAMENTO CANCELADO!" if cancelar.is_set() else f"\n🎉 PROCESSAMENTO CONCLUÍDO!")
+    exibir(f"✅ Sucessos: {sucessos}")
+    exibir(f"❌ Erros: {erros}")
+    if ignorados:
+        exibir(f"⏭️ Pulados (inalterados ou já concluídos): {len(ignorados)}")
+    exibir(f"⏱️ Tempo total: {tempo_total:.1f} segundos ({vazao:.2f} docs/s)")
+
+    if args.resumo:
+        gravar_resumo(args.resumo, resumo)
+
+    if cancelar.is_set():
+        return SAIDA_CANCELADO
+    return SAIDA_OK if erros == 0 else SAIDA_FALHAS
+
+
+if __name__ == "__main__":
+    sys.exit(main())
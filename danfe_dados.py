@@ -0,0 +1,33 @@
+"""
+Dados persistentes do renamerPRO© (índices, caches e históricos)
+Ficam no perfil do usuário, fora das pastas de XMLs
+"""
+
+import os
+import sqlite3
+
+# Permite apontar os dados para outro local (ex.: servidores, benchmarks)
+VARIAVEL_DADOS = "RENAMERPRO_DADOS"
+NOME_BANCO = "renamerpro.db"
+
+
+def diretorio_dados():
+    """Diretório de dados do usuário (criado se não existir)"""
+    pasta = os.environ.get(VARIAVEL_DADOS)
+    if not pasta:
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        pasta = os.path.join(base, "renamerPRO" if os.environ.get("LOCALAPPDATA") else ".renamerPRO")
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def conectar_banco(nome=NOME_BANCO):
+    """Conexão SQLite compartilhável entre threads (o chamador serializa o acesso)"""
+    conexao = sqlite3.connect(
+        os.path.join(diretorio_dados(), nome),
+        timeout=30,
+        check_same_thread=False
+    )
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    return conexao
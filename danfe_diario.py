@@ -0,0 +1,116 @@
+"""
+Diário de lotes em andamento
+Cada documento concluído com sucesso vira uma linha JSON acrescentada a um
+arquivo por pasta de saída; se o lote for interrompido (cancelamento, queda
+do programa ou da máquina), a próxima execução pula o que já está no diário.
+As linhas são gravadas em disco (fsync) em blocos, não a cada documento.
+O diário é apagado quando o lote chega ao fim, com ou sem erros.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from danfe_dados import diretorio_dados
+
+# fsync a cada N documentos ou a cada X segundos, o que vier primeiro:
+# numa queda perdem-se no máximo esses documentos (que são refeitos)
+GRAVAR_A_CADA = 64
+INTERVALO_GRAVACAO = 2.0
+
+
+def arquivo_diario(pasta_saida):
+    """diarios/<hash da pasta de saída>.jsonl no diretório de dados do usuário"""
+    pasta = os.path.join(diretorio_dados(), "diarios")
+    os.makedirs(pasta, exist_ok=True)
+    identificador = hashlib.sha1(os.path.normcase(os.path.abspath(pasta_saida)).encode("utf-8")).hexdigest()
+    return os.path.join(pasta, f"{identificador[:16]}.jsonl")
+
+
+class DiarioLote:
+    """Registro só de acréscimo dos XMLs concluídos de um lote"""
+
+    def __init__(self, pasta_saida, caminho=None):
+        self.caminho = caminho or arquivo_diario(pasta_saida)
+        self._lock = threading.Lock()
+        self.concluidos = self._carregar()
+        self._arquivo = open(self.caminho, "a", encoding="utf-8")
+        if self._arquivo.tell() and not self._termina_em_nova_linha():
+            self._arquivo.write("\n")  # Última linha incompleta (queda durante a gravação)
+        self._pendentes = 0
+        self._ultima_gravacao = time.monotonic()
+
+    def _carregar(self):
+        concluidos = {}
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                        concluidos[registro["xml"]] = (registro["tamanho"], registro["mtime_ns"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # Linha truncada: o documento é refeito
+        except FileNotFoundError:
+            pass
+        return concluidos
+
+    def _termina_em_nova_linha(self):
+        with open(self.caminho, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def concluido(self, arquivo_xml, arquivo_pdf):
+        """True se o XML está no diário, não mudou desde então e o PDF ainda existe"""
+        registro = self.concluidos.get(os.path.abspath(arquivo_xml))
+        if registro is None:
+            return False
+        try:
+            info = os.stat(arquivo_xml)
+        except OSError:
+            return False
+        return registro == (info.st_size, info.st_mtime_ns) and os.path.exists(arquivo_pdf)
+
+    def registrar(self, arquivo_xml):
+        """Acrescenta um documento concluído (o fsync acontece em blocos)"""
+        try:
+            info = os.stat(arquivo_xml)
+        except OSError:
+            return
+        linha = json.dumps({
+            "xml": os.path.abspath(arquivo_xml),
+            "tamanho": info.st_size,
+            "mtime_ns": info.st_mtime_ns,
+        }, ensure_ascii=False)
+        with self._lock:
+            if self._arquivo is None:
+                return
+            self._arquivo.write(linha + "\n")
+            self._pendentes += 1
+            if (self._pendentes >= GRAVAR_A_CADA
+                    or time.monotonic() - self._ultima_gravacao >= INTERVALO_GRAVACAO):
+                self._sincronizar()
+
+    def _sincronizar(self):
+        try:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+        except OSError:
+            pass  # Disco cheio ou removido: o lote continua, só sem garantia de retomada
+        self._pendentes = 0
+        self._ultima_gravacao = time.monotonic()
+
+    def fechar(self, apagar=False):
+        """Grava o que estiver pendente; apagar=True descarta o diário (lote completo)"""
+        with self._lock:
+            if self._arquivo is None:
+                return
+            self._sincronizar()
+            self._arquivo.close()
+            self._arquivo = None
+            if apagar:
+                try:
+                    os.remove(self.caminho)
+                except OSError:
+                    pass
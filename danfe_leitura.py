@@ -0,0 +1,139 @@
+"""
+Leitura antecipada dos XMLs de um lote
+Threads leitoras carregam na memória os próximos XMLs da fila enquanto os
+workers renderizam os anteriores, de modo que a latência de abertura de cada
+arquivo (dezenas de ms em compartilhamentos SMB) se sobrepõe à renderização
+em vez de somar a ela. A memória ocupada pelos XMLs já lidos e ainda não
+consumidos é limitada por um orçamento em bytes.
+"""
+
+import queue
+import threading
+
+# Orçamento padrão da leitura antecipada (bytes de XML lidos e ainda não usados)
+ORCAMENTO_PADRAO = 64 * 1024 * 1024
+
+# Leituras simultâneas: em rede a latência domina, não a banda
+LEITORES_PADRAO = 4
+
+_FIM = object()
+
+
+class LeituraAntecipada:
+    """Lê os arquivos à frente do consumidor, na mesma ordem, dentro de um orçamento de bytes
+
+    O orçamento é verificado antes de cada nova leitura, então o pico de memória
+    fica em até orcamento + um arquivo por leitor.
+    """
+
+    def __init__(self, arquivos, ler, orcamento_bytes=ORCAMENTO_PADRAO, leitores=LEITORES_PADRAO):
+        self._fonte = iter(arquivos)
+        self._ler = ler
+        self.orcamento_bytes = orcamento_bytes
+        self._condicao = threading.Condition()
+        self._lock_fonte = threading.Lock()  # a fonte pode ser um gerador (não é thread-safe)
+        self._ordem = queue.Queue()
+        self._lidos = {}
+        self._lendo = set()
+        self._ocupados = 0
+        self._encerrado = False
+        self._erro = None
+        self._ativos = leitores
+        self.acertos = 0
+        self.faltas = 0
+
+        self._threads = [
+            threading.Thread(target=self._ler_continuamente, name=f"leitura-{i}", daemon=True)
+            for i in range(leitores)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def _ler_continuamente(self):
+        try:
+            while True:
+                with self._condicao:
+                    while self._ocupados >= self.orcamento_bytes and not self._encerrado:
+                        self._condicao.wait()
+                    if self._encerrado:
+                        return
+
+                # Retirada e registro na ordem juntos: a ordem de saída é a da fonte
+                with self._lock_fonte:
+                    try:
+                        arquivo = next(self._fonte)
+                    except StopIteration:
+                        return
+                    except Exception as e:
+                        # Falha na listagem: repassada ao consumidor no fim da fila
+                        self._erro = e
+                        return
+                    with self._condicao:
+                        self._lendo.add(arquivo)
+                    self._ordem.put(arquivo)
+
+                conteudo = self._ler(arquivo)
+
+                with self._condicao:
+                    self._lendo.discard(arquivo)
+                    if conteudo is not None and not self._encerrado:
+                        self._lidos[arquivo] = conteudo
+                        self._ocupados += len(conteudo)
+                    self._condicao.notify_all()
+        finally:
+            with self._condicao:
+                self._ativos -= 1
+                if self._ativos == 0:
+                    self._ordem.put(_FIM)
+
+    def iterar(self):
+        """Arquivos na ordem em que foram retirados da fonte (para o agendador)"""
+        while True:
+            arquivo = self._ordem.get()
+            if arquivo is _FIM:
+                if self._erro is not None:
+                    raise self._erro
+                return
+            yield arquivo
+
+    def obter(self, arquivo):
+        """Conteúdo já lido do arquivo (aguarda se a leitura estiver em andamento)
+
+        Retorna None se o arquivo não passou pela leitura antecipada ou falhou;
+        nesse caso quem chamou deve ler por conta própria.
+        """
+        with self._condicao:
+            while arquivo in self._lendo:
+                self._condicao.wait()
+            conteudo = self._lidos.pop(arquivo, None)
+            if conteudo is None:
+                self.faltas += 1
+                return None
+            self.acertos += 1
+            self._ocupados -= len(conteudo)
+            self._condicao.notify_all()
+            return conteudo
+
+    def descartar(self, arquivo):
+        """Libera o conteúdo de um arquivo que não chegou a ser usado"""
+        with self._condicao:
+            while arquivo in self._lendo:
+                self._condicao.wait()
+            conteudo = self._lidos.pop(arquivo, None)
+            if conteudo is not None:
+                self._ocupados -= len(conteudo)
+                self._condicao.notify_all()
+
+    def fechar(self):
+        """Interrompe as leituras pendentes e libera a memória ocupada"""
+        with self._condicao:
+            self._encerrado = True
+            self._lidos.clear()
+            self._ocupados = 0
+            self._condicao.notify_all()
@@ -0,0 +1,80 @@
+"""
+Canal de log e progresso entre as threads de trabalho e a interface
+As threads só publicam eventos numa fila; a interface drena a fila em lotes
+por timer, mantém na tela apenas as linhas recentes e o log completo vai para disco
+"""
+
+import os
+import queue
+import threading
+import time
+
+from danfe_dados import diretorio_dados
+
+INTERVALO_DRENAGEM_MS = 100
+EVENTOS_POR_DRENAGEM = 5000
+LINHAS_NA_TELA = 2000
+
+
+def arquivo_log_do_dia():
+    """logs/renamerpro_AAAAMMDD.log no diretório de dados do usuário"""
+    pasta = os.path.join(diretorio_dados(), "logs")
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, time.strftime("renamerpro_%Y%m%d.log"))
+
+
+class CanalLog:
+    """Fila thread-safe de mensagens por destino e de atualizações de tela coalescidas"""
+
+    def __init__(self, arquivo=None):
+        self._fila = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._atualizacoes = {}
+        try:
+            self._arquivo = open(arquivo or arquivo_log_do_dia(), "a", encoding="utf-8")
+        except OSError:
+            self._arquivo = None  # Sem log em disco: a tela continua funcionando
+
+    def escrever(self, texto, destino="log"):
+        """Publica uma mensagem (pode ser chamado de qualquer thread)"""
+        self._fila.put((destino, texto))
+
+    def atualizar(self, chave, funcao):
+        """Agenda uma atualização de tela; entre duas drenagens só a última de cada chave roda"""
+        with self._lock:
+            self._atualizacoes[chave] = funcao
+
+    def drenar(self, maximo=EVENTOS_POR_DRENAGEM):
+        """Retira até `maximo` mensagens: ({destino: [textos]}, [atualizações pendentes])"""
+        eventos = []
+        for _ in range(maximo):
+            try:
+                eventos.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+
+        linhas = {}
+        for destino, texto in eventos:
+            linhas.setdefault(destino, []).append(texto)
+
+        with self._lock:
+            atualizacoes = list(self._atualizacoes.values())
+            self._atualizacoes.clear()
+
+        if eventos and self._arquivo is not None:
+            carimbo = time.strftime("%Y-%m-%d %H:%M:%S")
+            try:
+                self._arquivo.write("".join(
+                    f"{carimbo} [{destino}] {texto.strip()}\n"
+                    for destino, texto in eventos
+                    if texto.strip()
+                ))
+                self._arquivo.flush()
+            except OSError:
+                pass
+        return linhas, atualizacoes
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
@@ -0,0 +1,691 @@
+"""
+Engine de processamento de DANFEs sem dependência de interface gráfica
+Usada pela aplicação CustomTkinter (danfe_app.py) e pela linha de comando (danfe_cli.py)
+"""
+
+import base64
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+
+from danfe_agendador import AgendadorAdaptativo
+from danfe_cache import CacheRenderizacao, RegistroIncremental, caminho_pdf_destino
+from danfe_chaves import (BYTES_CABECALHO, IndiceChaves, extrair_chave_bytes, extrair_chave_xml,
+                          extrair_chaves_paralelo)
+from danfe_diario import DiarioLote, arquivo_diario
+from danfe_leitura import LeituraAntecipada
+from danfe_php import CREATE_NO_WINDOW, PROCESSO_ISOLADO, PoolWorkersPHP, resposta_do_processo
+from danfe_relatorio import ETAPAS, RelatorioExecucao
+from danfe_renomeador import (RENOMEACOES_SIMULTANEAS, desfazer_renomeacoes, executar_renomeacoes,
+                              movimentos_liquidos, planejar_renomeacoes)
+from danfe_varredura import PADRAO_XML, iterar_xmls
+
+
+class MotorDanfe:
+    """Escaneamento, extração de chaves e geração de DANFEs em lote"""
+
+    def __init__(self, log=None):
+        # Destino das mensagens de progresso (log da interface, console, etc.)
+        self.log = log or print
+        # Executável PHP; None usa o php/php.exe do pacote ou, sem ele, o php do PATH
+        self.executavel_php = None
+        self.vcredist_tentado = False
+        self.pool_php = None
+        self.indice_chaves = None
+        self.registro_incremental = None
+        # PDFs de documentos repetidos (reenvios, cópias em outras pastas) vêm do cache
+        self.usar_cache_render = True
+        self.cache_render = None
+        # Diário do lote: um lote interrompido retoma de onde parou na próxima execução
+        self.usar_diario = True
+        # Enviar o conteúdo do XML pelo pipe e receber o PDF de volta (o PHP não
+        # acessa o disco; útil com XMLs em compartilhamentos de rede)
+        self.enviar_conteudo = False
+        # Leitura antecipada dos XMLs no processamento em massa: orçamento em bytes
+        # (0 desativa). O conteúdo lido só é aproveitado pelo cache de PDFs e pelo
+        # envio pelo pipe (enviar_conteudo)
+        self.orcamento_leitura = 0
+        self.leitura_antecipada = None
+        # Renomeações em lote executadas ao mesmo tempo (latência de compartilhamentos de rede)
+        self.renomeacoes_simultaneas = RENOMEACOES_SIMULTANEAS
+        # Renomear junto os PDFs já gerados de cada XML (mesmo nome-base ou chave no nome)
+        self.renomear_pdfs = True
+        # Caminhos (CSV, JSON) do relatório de tempos do último lote, se gravado
+        self.ultimo_relatorio = None
+
+    def iterar_xmls_pasta(self, pasta, **filtros):
+        """Gera os caminhos dos XMLs à medida que a varredura os encontra (ver danfe_varredura)"""
+        for entrada in iterar_xmls(pasta, ao_erro=lambda e: self.log(f"⚠️ Pasta ignorada: {e}"), **filtros):
+            yield entrada.path
+
+    def iterar_xmls_pasta_seguro(self, pasta, **filtros):
+        """Como iterar_xmls_pasta, mas registra no log (em vez de propagar) falhas da pasta raiz"""
+        try:
+            yield from self.iterar_xmls_pasta(pasta, **filtros)
+        except Exception as e:
+            self.log(f"❌ Erro ao escanear pasta: {e}")
+
+    def escanear_xmls_pasta(self, pasta, **filtros):
+        """Função auxiliar para escanear XMLs de uma pasta (elimina duplicação)"""
+        return list(self.iterar_xmls_pasta_seguro(pasta, **filtros))
+
+    def validar_chave_nfe(self, chave):
+        """Função auxiliar para validar chave NFe (elimina duplicação)"""
+        from danfe_validacao import motivo_chave  # numpy só quando há chaves a validar (início rápido da CLI)
+        return motivo_chave(chave) == ""
+
+    def validar_chaves_nfe(self, chaves):
+        """Motivo de rejeição de cada chave ('' se válida), todas validadas de uma vez"""
+        from danfe_validacao import validar_chaves
+        return validar_chaves(chaves).tolist()
+
+    def descrever_motivo_chave(self, motivo):
+        from danfe_validacao import MOTIVOS_CHAVE
+        return MOTIVOS_CHAVE.get(motivo, motivo)
+
+    def extrair_chave_xml(self, caminho_arquivo):
+        """Chave de acesso do XML (leitura parcial, sem parse completo)"""
+        return extrair_chave_xml(caminho_arquivo)
+
+    def mapear_chaves_pasta(self, pasta, ao_progresso=None, cancelar=None, **filtros):
+        """Lista [(arquivo, chave)] da pasta e as estatísticas do índice persistente (None sem índice)
+
+        Os XMLs novos ou alterados são lidos em processos separados quando são
+        muitos; ao_progresso(lidos, total, lote) acompanha essa leitura, lote a
+        lote. Acionar o threading.Event cancelar interrompe o escaneamento
+        com OperacaoCancelada.
+        """
+        def extrator(caminhos):
+            return extrair_chaves_paralelo(caminhos, ao_progresso=ao_progresso, cancelar=cancelar)
+        
+        try:
+            if self.indice_chaves is None:
+                self.indice_chaves = IndiceChaves()
+            entradas = iterar_xmls(pasta, ao_erro=lambda e: self.log(f"⚠️ Pasta ignorada: {e}"), **filtros)
+            resultados = self.indice_chaves.chaves_da_pasta(
+                pasta, entradas,
+                recursivo=filtros.get("recursivo", False),
+                completo=not self.varredura_filtrada(filtros),
+                extrator=extrator,
+                cancelar=cancelar
+            )
+            return resultados, self.indice_chaves.estatisticas
+        except (sqlite3.Error, OSError) as e:
+            self.log(f"⚠️ Índice de chaves indisponível ({e}), lendo todos os arquivos")
+            arquivos = self.escanear_xmls_pasta(pasta, **filtros)
+            return list(zip(arquivos, extrator(arquivos))), None
+
+    def varredura_filtrada(self, filtros):
+        """Indica se os filtros deixam arquivos de fora (então o índice não remove ausentes)"""
+        padrao = (filtros.get("padrao") or PADRAO_XML).lower()
+        return bool(filtros.get("modificado_desde") or filtros.get("cnpj") or padrao != PADRAO_XML)
+
+    def registrar_renomeacao(self, caminho_antigo, caminho_novo):
+        """Mantém o índice de chaves em dia após renomear um XML"""
+        if self.indice_chaves is not None:
+            try:
+                self.indice_chaves.renomear(caminho_antigo, caminho_novo)
+            except sqlite3.Error:
+                pass  # O próximo escaneamento relê o arquivo
+
+    def registrar_renomeacoes(self, pares):
+        """registrar_renomeacao para um lote [(antigo, novo)] numa só transação"""
+        if self.indice_chaves is not None and pares:
+            try:
+                self.indice_chaves.renomear_varios(pares)
+            except sqlite3.Error:
+                pass  # O próximo escaneamento relê os arquivos
+
+    def renomear_lote(self, pedidos, chaves_xml, pastas_pdf=()):
+        """Renomeia [(índice, chave, nome_final)] de uma vez, como uma transação
+
+        Planeja tudo em memória (PDFs de cada XML, colisões e trocas de nome
+        entre arquivos), executa em paralelo e, se algo falhar, reverte o lote inteiro.
+        Retorna (operações com status e mensagem na ordem dos índices, diário
+        para desfazer ou None). Além dos status de renomear_por_chave: "duplicada",
+        "nome_repetido" e "revertido". Os PDFs são procurados nas pastas dos XMLs
+        e em pastas_pdf (pastas de saída onde eles foram gerados).
+        """
+        operacoes, resolvidas = planejar_renomeacoes(pedidos, chaves_xml, self.renomear_pdfs, pastas_pdf)
+        diario, erros = executar_renomeacoes(operacoes, self.renomeacoes_simultaneas)
+        for mensagem in erros:
+            self.log(mensagem)
+        if erros:
+            self.log("⚠️ Reversão incompleta: use DESFAZER para tentar de novo e escaneie as chaves")
+
+        concluidas = [operacao for operacao in operacoes if operacao.status == "ok"]
+        self.registrar_renomeacoes([(operacao.origem, operacao.destino) for operacao in concluidas])
+        for operacao in concluidas:
+            chaves_xml[operacao.chave] = operacao.destino
+        return sorted(operacoes + resolvidas, key=lambda operacao: operacao.indice), diario
+
+    def desfazer_ultima_renomeacao(self, chaves_xml):
+        """Reverte o último lote renomeado; retorna (arquivos revertidos, mensagens de erro)"""
+        revertidos, erros = desfazer_renomeacoes(simultaneas=self.renomeacoes_simultaneas)
+        pares = movimentos_liquidos([(cadeia, destino, origem) for cadeia, origem, destino in revertidos])
+        self.registrar_renomeacoes(pares)
+
+        chave_do_caminho = {os.path.abspath(caminho): chave for chave, caminho in chaves_xml.items()}
+        for antigo, novo in pares:
+            chave = chave_do_caminho.get(os.path.abspath(antigo))
+            if chave is not None:
+                chaves_xml[chave] = novo
+        return len(pares), erros
+
+    def renomear_por_chave(self, chave, nome_final, chaves_xml):
+        """Renomeia o XML da chave para <nome_final>.xml na mesma pasta
+
+        chaves_xml é o mapa chave → caminho do último escaneamento (atualizado aqui).
+        Retorna (status, mensagem) com status "ok", "chave_invalida",
+        "nao_encontrada", "existe" ou "erro".
+        """
+        chave = str(chave).strip()
+        if not self.validar_chave_nfe(chave):
+            return "chave_invalida", f"❌ Chave inválida: {chave}"
+        if chave not in chaves_xml:
+            return "nao_encontrada", f"❌ Chave não encontrada: {chave}"
+
+        try:
+            arquivo_original = chaves_xml[chave]
+            novo_nome = os.path.join(os.path.dirname(arquivo_original), f"{nome_final}.xml")
+            if os.path.exists(novo_nome):
+                return "existe", f"❌ Arquivo já existe: {nome_final}.xml"
+
+            os.rename(arquivo_original, novo_nome)
+            self.registrar_renomeacao(arquivo_original, novo_nome)
+            chaves_xml[chave] = novo_nome
+            return "ok", f"✅ {os.path.basename(arquivo_original)} → {nome_final}.xml"
+        except Exception as e:
+            return "erro", f"❌ Erro: {e}"
+
+    def obter_registro_incremental(self):
+        """Histórico de conversões do modo incremental (None se o banco estiver indisponível)"""
+        try:
+            if self.registro_incremental is None:
+                self.registro_incremental = RegistroIncremental()
+            return self.registro_incremental
+        except sqlite3.Error as e:
+            self.log(f"⚠️ Modo incremental indisponível ({e}), processando todos os arquivos")
+            return None
+
+    def filtrar_inalterados(self, arquivos_xml, pasta_saida, registro, callback_ignorado=None):
+        """Gera apenas os XMLs novos ou alterados desde a última conversão"""
+        for arquivo in arquivos_xml:
+            if registro.inalterado(arquivo, caminho_pdf_destino(arquivo, pasta_saida)):
+                if callback_ignorado:
+                    callback_ignorado(os.path.basename(arquivo))
+                continue
+            yield arquivo
+
+    def abrir_diario(self, pasta_saida):
+        """Diário do lote para a pasta de saída (None se não for possível gravá-lo)"""
+        try:
+            return DiarioLote(pasta_saida)
+        except OSError as e:
+            self.log(f"⚠️ Diário do lote indisponível ({e}), o lote não poderá ser retomado")
+            return None
+
+    def descartar_diario(self, pasta_saida):
+        """Esquece um lote interrompido: o próximo processamento da pasta recomeça do zero"""
+        try:
+            os.remove(arquivo_diario(pasta_saida))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log(f"⚠️ Não foi possível descartar o diário do lote: {e}")
+
+    def filtrar_concluidos(self, arquivos_xml, pasta_saida, diario, callback_ignorado=None):
+        """Gera apenas os XMLs que ainda não constam no diário de um lote interrompido"""
+        for arquivo in arquivos_xml:
+            if diario.concluido(arquivo, caminho_pdf_destino(arquivo, pasta_saida)):
+                if callback_ignorado:
+                    callback_ignorado(os.path.basename(arquivo))
+                continue
+            yield arquivo
+
+    def obter_cache_render(self):
+        """Cache de PDFs renderizados (None se desativado ou indisponível)"""
+        if not self.usar_cache_render:
+            return None
+        try:
+            if self.cache_render is None:
+                self.cache_render = CacheRenderizacao(self.versao_renderizador())
+            return self.cache_render
+        except (sqlite3.Error, OSError) as e:
+            self.log(f"⚠️ Cache de PDFs indisponível ({e}), renderizando todos os arquivos")
+            self.usar_cache_render = False
+            return None
+
+    def versao_renderizador(self):
+        """Hash do que muda o PDF: gerador_danfe.php, bibliotecas do vendor/ e o PHP usado
+
+        Trocar qualquer um deles (atualização do sped-da, outro --php ou outra
+        versão do PHP) invalida o cache de PDFs.
+        """
+        php_full_path, script_php_full, php_dir = self.caminhos_php()
+        resumo = hashlib.sha256()
+        with open(script_php_full, "rb") as f:
+            resumo.update(f.read())
+        pasta_projeto = os.path.dirname(script_php_full)
+        for relativo in (("vendor", "composer", "installed.json"), ("composer.lock",)):
+            try:
+                with open(os.path.join(pasta_projeto, *relativo), "rb") as f:
+                    resumo.update(b"\0" + f.read())
+            except OSError:
+                resumo.update(b"\0")
+        resumo.update(b"\0" + os.path.normcase(os.path.abspath(php_full_path)).encode("utf-8"))
+        resumo.update(b"\0" + self.versao_php(php_full_path, php_dir).encode("utf-8"))
+        return resumo.hexdigest()
+
+    def versao_php(self, php_full_path, php_dir):
+        """PHP_VERSION do executável ('' se ele não rodar)"""
+        try:
+            resultado = subprocess.run(
+                [php_full_path, "-r", "echo PHP_VERSION;"],
+                capture_output=True,
+                text=True,
+                timeout=30,
+                creationflags=CREATE_NO_WINDOW,
+                cwd=php_dir
+            )
+        except (OSError, subprocess.SubprocessError):
+            return ""
+        return resultado.stdout.strip() if resultado.returncode == 0 else ""
+
+    def ler_xml(self, arquivo_xml):
+        """Bytes do XML (None se não for possível ler)"""
+        try:
+            with open(arquivo_xml, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def conteudo_xml(self, arquivo_xml):
+        """Bytes do XML, da leitura antecipada quando disponível"""
+        if self.leitura_antecipada is not None:
+            conteudo = self.leitura_antecipada.obter(arquivo_xml)
+            if conteudo is not None:
+                return conteudo
+        return self.ler_xml(arquivo_xml)
+
+    def gravar_pdf(self, destino_pdf, conteudo_pdf):
+        """Grava o PDF via arquivo temporário + renomeação (nunca fica pela metade no destino)"""
+        temporario = f"{destino_pdf}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporario, "wb") as f:
+                f.write(conteudo_pdf)
+            os.replace(temporario, destino_pdf)
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def identificar_no_cache(self, cache, arquivo_xml, conteudo):
+        """Identificador do XML no cache de PDFs (None se não for possível ler a chave)"""
+        chave = extrair_chave_bytes(conteudo[:BYTES_CABECALHO]) or extrair_chave_xml(arquivo_xml)
+        return cache.identificar(conteudo, chave)
+
+    def caminhos_php(self):
+        """Caminhos do executável PHP, do script gerador e do diretório de execução
+
+        O PHP do pacote roda a partir de php/ (extensões); qualquer outro roda da
+        pasta do projeto, de onde o gerador também encontra o vendor/.
+        """
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        php_dir = os.path.join(script_dir, "php")
+        php_pacote = os.path.join(php_dir, "php.exe")
+        script_php_full = os.path.join(script_dir, "gerador_danfe.php")
+
+        php_full_path = self.executavel_php or php_pacote
+        if not self.executavel_php and not os.path.exists(php_pacote):
+            # Fora do pacote Windows (ex.: servidores Linux): PHP do sistema
+            php_full_path = shutil.which("php") or php_pacote
+        if php_full_path != php_pacote:
+            php_dir = script_dir
+        return php_full_path, script_php_full, php_dir
+
+    def instalar_vcredist(self):
+        """Instala Visual C++ Redistributable 2015-2022 automaticamente"""
+        try:
+            import urllib.request
+            
+            # URL do Visual C++ Redistributable x64 2015-2022
+            url = "https://aka.ms/vs/17/release/vc_redist.x64.exe"
+            arquivo_installer = "vc_redist.x64.exe"
+            
+            self.log("📥 Baixando Visual C++ Redistributable...")
+            
+            # Baixar o installer
+            urllib.request.urlretrieve(url, arquivo_installer)
+            
+            self.log("⚙️ Instalando Visual C++ Redistributable...")
+            
+            # Executar instalação silenciosa
+            resultado = subprocess.run(
+                [arquivo_installer, "/quiet", "/norestart"],
+                capture_output=True,
+                text=True,
+                timeout=300  # 5 minutos
+            )
+            
+            # Limpar arquivo temporário
+            if os.path.exists(arquivo_installer):
+                os.remove(arquivo_installer)
+            
+            if resultado.returncode == 0:
+                self.log("✅ Visual C++ Redistributable instalado com sucesso!")
+                return True
+            else:
+                self.log(f"❌ Erro na instalação (código: {resultado.returncode})")
+                return False
+                
+        except Exception as e:
+            self.log(f"❌ Erro ao instalar dependências: {str(e)}")
+            return False
+
+    def descrever_tempos(self, resposta):
+        """Resumo das métricas medidas pelo gerador PHP para o log (vazio se ausentes)"""
+        tempos = resposta.get("tempos_ms") or {}
+        partes = [f"{etapa} {tempos[etapa]:.0f} ms" for etapa in ("parse", "render", "escrita") if etapa in tempos]
+        if resposta.get("paginas"):
+            partes.insert(0, f"{resposta['paginas']} pág.")
+        return f" ({', '.join(partes)})" if partes else ""
+
+    def processar_xml_individual(self, arquivo_xml, pasta_saida, tempos=None):
+        """Gera a DANFE de um XML na pasta de saída; retorna True em caso de sucesso
+
+        Se `tempos` for um dict, recebe os milissegundos de cada etapa
+        (ver danfe_relatorio.ETAPAS).
+        """
+        tempos = {} if tempos is None else tempos
+        inicio = time.perf_counter()
+        try:
+            return self._processar_xml(arquivo_xml, pasta_saida, tempos)
+        finally:
+            tempos["total"] = (time.perf_counter() - inicio) * 1000
+
+    def _processar_xml(self, arquivo_xml, pasta_saida, tempos):
+        try:
+            # Verificar se arquivo XML existe
+            if not os.path.exists(arquivo_xml):
+                self.log(f"❌ Arquivo não encontrado: {arquivo_xml}")
+                return False
+            
+            # Verificar se pasta de saída existe
+            if not os.path.exists(pasta_saida):
+                try:
+                    os.makedirs(pasta_saida, exist_ok=True)
+                except Exception as e:
+                    self.log(f"❌ Erro ao criar pasta: {pasta_saida} - {str(e)}")
+                    return False
+            
+            # O PDF é gravado uma única vez, direto no caminho final
+            destino_pdf = caminho_pdf_destino(arquivo_xml, pasta_saida)
+            
+            # Leitura única do XML no Python (cache de PDFs e envio pelo pipe)
+            marca = time.perf_counter()
+            cache = self.obter_cache_render()
+            enviar_conteudo = self.enviar_conteudo and self.pool_php is not None
+            conteudo = self.conteudo_xml(arquivo_xml) if cache is not None or enviar_conteudo else None
+            tempos["leitura"] = (time.perf_counter() - marca) * 1000
+            if enviar_conteudo and conteudo is None:
+                self.log(f"❌ Não foi possível ler: {os.path.basename(arquivo_xml)}")
+                return False
+            
+            # Documento já renderizado antes (mesma chave e mesmo conteúdo): servir do cache
+            marca = time.perf_counter()
+            id_cache = (self.identificar_no_cache(cache, arquivo_xml, conteudo)
+                        if cache is not None and conteudo is not None else None)
+            if id_cache:
+                if cache.obter(id_cache, destino_pdf):
+                    tempos["cache"] = (time.perf_counter() - marca) * 1000
+                    self.log(f"♻️ {os.path.basename(destino_pdf)} (cache)")
+                    return True
+            tempos["cache"] = (time.perf_counter() - marca) * 1000
+            
+            # Usar PHP para gerar DANFE
+            php_full_path, script_php_full, php_dir = self.caminhos_php()
+            
+            # Verificar se arquivos existem
+            if not os.path.exists(php_full_path):
+                self.log(f"❌ PHP não encontrado: {php_full_path}")
+                return False
+            
+            if not os.path.exists(script_php_full):
+                self.log(f"❌ Script PHP não encontrado: {script_php_full}")
+                return False
+            
+            # Comando para executar PHP (usar caminhos absolutos)
+            cmd = [php_full_path, script_php_full, arquivo_xml, "--destino", destino_pdf]
+            
+            # Executar PHP com melhor tratamento de erro
+            marca = time.perf_counter()
+            try:
+                if self.pool_php is not None:
+                    # Lote em andamento: reutilizar um worker PHP já carregado
+                    resposta = self.pool_php.renderizar(
+                        arquivo_xml, timeout=120, destino=destino_pdf,
+                        conteudo=conteudo if enviar_conteudo else None
+                    )
+                else:
+                    resposta = resposta_do_processo(subprocess.run(
+                        cmd, 
+                        capture_output=True, 
+                        text=True, 
+                        timeout=120,
+                        cwd=php_dir,  # Executar do diretório php para carregar extensões
+                        **PROCESSO_ISOLADO
+                    ))
+            except FileNotFoundError:
+                self.log(f"❌ PHP executável não encontrado: {php_full_path}")
+                return False
+            except subprocess.TimeoutExpired:
+                raise
+            except Exception as e:
+                self.log(f"❌ Erro ao executar PHP: {str(e)}")
+                return False
+            
+            # O que não foi medido dentro do gerador é inicialização do PHP e comunicação
+            ida_e_volta = (time.perf_counter() - marca) * 1000
+            tempos_php = resposta.get("tempos_ms") or {}
+            tempos.update(tempos_php)
+            tempos["inicio_php"] = max(ida_e_volta - sum(tempos_php.values()), 0)
+            
+            # Verificar se é erro de DLL faltando (Visual C++ Redistributable)
+            if resposta.get("dll_ausente"):
+                # Tentar instalar apenas uma vez
+                if not self.vcredist_tentado:
+                    self.log(f"❌ PHP precisa do Visual C++ Redistributable 2015-2022")
+                    self.log(f"🔧 Instalando dependências automaticamente...")
+                    
+                    if self.instalar_vcredist():
+                        self.log(f"🔄 Reinicie o aplicativo para usar o PHP corrigido")
+                    
+                    self.vcredist_tentado = True
+                
+                self.log(f"❌ {os.path.basename(arquivo_xml)} - Dependência Visual C++ necessária")
+                return False
+            
+            # Verificar resultado
+            if resposta.get("status") != "ok":
+                self.log(f"❌ {os.path.basename(arquivo_xml)} - {resposta.get('mensagem') or 'Erro desconhecido'}")
+                return False
+            
+            # PDF recebido pelo pipe: a gravação fica a cargo do Python
+            if "pdf_base64" in resposta:
+                marca = time.perf_counter()
+                try:
+                    self.gravar_pdf(destino_pdf, base64.b64decode(resposta["pdf_base64"]))
+                except OSError as e:
+                    self.log(f"❌ Erro ao gravar PDF: {destino_pdf} - {e}")
+                    return False
+                tempos["escrita"] = (time.perf_counter() - marca) * 1000
+                resposta["pdf"] = destino_pdf
+            
+            arquivo_pdf = resposta["pdf"]
+            
+            # Verificar se PDF foi criado
+            if not os.path.exists(arquivo_pdf):
+                self.log(f"❌ PDF não foi criado: {arquivo_pdf}")
+                return False
+            
+            marca = time.perf_counter()
+            nome_pdf = os.path.basename(arquivo_pdf)
+            if id_cache:
+                cache.guardar(id_cache, arquivo_pdf)
+            tempos["movimentacao"] = (time.perf_counter() - marca) * 1000
+            
+            self.log(f"✅ {nome_pdf}{self.descrever_tempos(resposta)}")
+            return True
+                
+        except subprocess.TimeoutExpired:
+            self.log(f"❌ Timeout ao processar: {os.path.basename(arquivo_xml)}")
+            return False
+        except Exception as e:
+            self.log(f"❌ Erro inesperado: {str(e)}")
+            return False
+            
+    def processar_xmls_paralelo(self, arquivos_xml, pasta_saida, callback_sucesso=None, callback_erro=None,
+                                max_workers=None, incremental=False, callback_ignorado=None, relatorio=False,
+                                cancelar=None):
+        """Função auxiliar para processamento paralelo (elimina duplicação)
+
+        Com relatorio=True grava o relatório de tempos por etapa na pasta de saída
+        e lista no log os documentos mais lentos. Acionar o threading.Event
+        cancelar encerra o lote após os documentos em andamento; o diário
+        permite retomá-lo depois.
+        """
+        sucessos = 0
+        erros = 0
+        inicio = time.time()
+        execucao = RelatorioExecucao()
+        self.ultimo_relatorio = None
+        
+        # Modo incremental: pular XMLs inalterados cujo PDF ainda existe
+        registro = self.obter_registro_incremental() if incremental else None
+        if registro is not None:
+            arquivos_xml = self.filtrar_inalterados(arquivos_xml, pasta_saida, registro, callback_ignorado)
+        
+        # Lote interrompido antes: pular o que o diário registra como concluído
+        diario = self.abrir_diario(pasta_saida) if self.usar_diario else None
+        if diario is not None and diario.concluidos:
+            self.log(f"⏯️ Retomando lote interrompido: {len(diario.concluidos)} documento(s) já concluído(s)")
+            arquivos_xml = self.filtrar_concluidos(arquivos_xml, pasta_saida, diario, callback_ignorado)
+        
+        # Horário em que cada XML entrou no agendador (tempo de fila)
+        enviados = {}
+        
+        def marcar_envio(arquivos):
+            for arquivo in arquivos:
+                if cancelar is not None and cancelar.is_set():
+                    return
+                enviados[arquivo] = time.perf_counter()
+                yield arquivo
+        
+        def processar(arquivo):
+            tempos = {"fila": (time.perf_counter() - enviados.pop(arquivo, time.perf_counter())) * 1000}
+            resultado = False
+            try:
+                resultado = self.processar_xml_individual(arquivo, pasta_saida, tempos)
+                if resultado and diario is not None:
+                    diario.registrar(arquivo)
+                return resultado
+            finally:
+                if leitura is not None:
+                    leitura.descartar(arquivo)
+                execucao.registrar(arquivo, resultado, tempos)
+        
+        # Abrir o cache antes das threads (evita instâncias concorrentes)
+        cache = self.obter_cache_render()
+        
+        # XMLs lidos à frente dos workers (só quando o conteúdo será usado)
+        leitura = None
+        if self.orcamento_leitura > 0 and (cache is not None or self.enviar_conteudo):
+            leitura = LeituraAntecipada(arquivos_xml, self.ler_xml, self.orcamento_leitura)
+            arquivos_xml = leitura.iterar()
+            self.log(f"📥 Leitura antecipada: até {self.orcamento_leitura / 2 ** 20:.0f} MB de XMLs à frente")
+        self.leitura_antecipada = leitura
+        
+        # Workers PHP persistentes durante todo o lote (um interpretador por thread)
+        php_full_path, script_php_full, php_dir = self.caminhos_php()
+        self.pool_php = PoolWorkersPHP(php_full_path, script_php_full, php_dir)
+        
+        # Concorrência ajustada pela CPU e pelo tempo medido de cada documento
+        agendador = AgendadorAdaptativo(
+            max_workers,
+            log=self.log,
+            ao_ajustar=self.pool_php.limitar
+        )
+        
+        def ao_concluir(arquivo, future):
+            nonlocal sucessos, erros
+            nome_arquivo = os.path.basename(arquivo)
+            
+            try:
+                resultado = future.result()
+                if resultado:
+                    sucessos += 1
+                    if registro is not None:
+                        registro.registrar(arquivo, caminho_pdf_destino(arquivo, pasta_saida))
+                    if callback_sucesso:
+                        callback_sucesso(nome_arquivo)
+                else:
+                    erros += 1
+                    if callback_erro:
+                        callback_erro(nome_arquivo)
+            except Exception as e:
+                erros += 1
+                if callback_erro:
+                    callback_erro(f"{nome_arquivo} - ERRO: {e}")
+        
+        completo = False
+        try:
+            with self.pool_php:
+                agendador.executar(processar, marcar_envio(arquivos_xml), ao_concluir)
+            completo = not (cancelar is not None and cancelar.is_set())
+        finally:
+            if diario is not None:
+                # Lote que chegou ao fim (mesmo com erros) descarta o diário: só
+                # cancelamento ou queda deixam algo para retomar
+                diario.fechar(apagar=completo)
+            if leitura is not None:
+                leitura.fechar()
+            self.leitura_antecipada = None
+            if registro is not None:
+                registro.finalizar()
+        
+        self.pool_php = None
+        tempo_total = time.time() - inicio
+        
+        if not completo:
+            self.log("⛔ Lote cancelado" + (
+                ": os documentos concluídos ficaram no diário; processe a mesma pasta novamente para retomar"
+                if diario is not None else ""
+            ))
+        
+        if relatorio and execucao.documentos:
+            self.concluir_relatorio(execucao, pasta_saida)
+        
+        return sucessos, erros, tempo_total
+
+    def concluir_relatorio(self, execucao, pasta_saida, quantidade=5):
+        """Grava o relatório de tempos do lote e mostra os documentos mais lentos no log"""
+        try:
+            self.ultimo_relatorio = execucao.gravar(pasta_saida)
+            self.log(f"📊 Relatório de tempos: {os.path.basename(self.ultimo_relatorio[0])} (+ .json)")
+        except OSError as e:
+            self.log(f"⚠️ Não foi possível gravar o relatório de tempos: {e}")
+        
+        mais_lentos = execucao.mais_lentos(quantidade)
+        self.log(f"🐢 Documentos mais lentos ({len(mais_lentos)}):")
+        for documento in mais_lentos:
+            tempos = documento["tempos_ms"]
+            etapas = ", ".join(
+                f"{etapa} {tempos[etapa]:.0f}" for etapa in ETAPAS
+                if etapa != "total" and tempos.get(etapa, 0) >= 1
+            )
+            self.log(f"   {documento['arquivo']}: {tempos.get('total', 0):.0f} ms ({etapas or '-'})")
@@ -0,0 +1,231 @@
+"""
+Pool de workers PHP persistentes para geração de DANFEs
+Mantém processos `gerador_danfe.php --worker` vivos durante todo o lote,
+evitando iniciar o interpretador e carregar o vendor/ a cada XML
+
+O gerador responde uma linha JSON por documento:
+    {"status": "ok", "pdf": ..., "paginas": ..., "bytes": ..., "tempos_ms": {"parse", "render", "escrita"}}
+    {"status": "ok", "pdf_base64": ..., ...}  (job enviado com o conteúdo do XML)
+    {"status": "erro", "mensagem": ...}
+"""
+
+import base64
+import json
+import os
+import queue
+import subprocess
+import threading
+from collections import deque
+
+# Flag do Windows para não abrir console; em outros sistemas não existe
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# PHP fora do grupo de processos do terminal: o Ctrl+C chega só ao Python, que
+# termina os documentos em andamento e depois encerra o pool
+if os.name == "nt":
+    PROCESSO_ISOLADO = {"creationflags": CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    PROCESSO_ISOLADO = {"start_new_session": True}
+
+# 0xC0000135 (STATUS_DLL_NOT_FOUND): o PHP nem chega a iniciar sem o Visual C++ Redistributable
+CODIGO_DLL_AUSENTE = 3221225781
+
+# Reciclagem padrão dos workers
+MAX_JOBS_POR_WORKER = 200
+LIMITE_MEMORIA_WORKER = 256 * 1024 * 1024  # 256 MB (memory_limit do PHP é 512M)
+
+
+def interpretar_resposta(linha):
+    """Resposta JSON do gerador (None se a linha não for do protocolo, ex.: avisos do PHP)"""
+    linha = linha.strip()
+    if not linha.startswith("{"):
+        return None
+    try:
+        resposta = json.loads(linha)
+    except ValueError:
+        return None
+    return resposta if isinstance(resposta, dict) and "status" in resposta else None
+
+
+def resposta_de_falha(returncode, stderr=""):
+    """Resposta de erro para um processo PHP que terminou sem responder"""
+    if returncode == CODIGO_DLL_AUSENTE:
+        return {"status": "erro", "mensagem": "Dependência Visual C++ necessária", "dll_ausente": True}
+    mensagem = stderr.strip().splitlines()[-1] if stderr and stderr.strip() else f"PHP erro código {returncode}"
+    return {"status": "erro", "mensagem": mensagem}
+
+
+def resposta_do_processo(resultado):
+    """Resposta de uma execução avulsa (subprocess.run) do gerador"""
+    for linha in reversed(resultado.stdout.splitlines() if resultado.stdout else []):
+        resposta = interpretar_resposta(linha)
+        if resposta is not None:
+            return resposta
+    return resposta_de_falha(resultado.returncode, resultado.stderr)
+
+
+class WorkerPHP:
+    """Um processo PHP em modo worker: um job JSON por linha no STDIN, uma resposta por linha no STDOUT"""
+
+    def __init__(self, php_path, script_php, cwd, limite_memoria=LIMITE_MEMORIA_WORKER):
+        self.cmd = [php_path, script_php, "--worker", str(limite_memoria)]
+        self.processo = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+            cwd=cwd,  # Executar do diretório php para carregar extensões
+            **PROCESSO_ISOLADO
+        )
+        self.jobs = 0
+        self.respostas = queue.Queue()
+        self.stderr = deque(maxlen=20)
+
+        # Leitores dedicados: permitem timeout por job e evitam bloqueio do pipe de stderr
+        threading.Thread(target=self._ler_stdout, daemon=True).start()
+        threading.Thread(target=self._ler_stderr, daemon=True).start()
+
+    def _ler_stdout(self):
+        for linha in self.processo.stdout:
+            # Ignorar qualquer saída que não seja resposta do protocolo
+            resposta = interpretar_resposta(linha)
+            if resposta is not None:
+                self.respostas.put(resposta)
+        self.respostas.put(None)  # Fim do STDOUT: processo encerrou
+
+    def _ler_stderr(self):
+        for linha in self.processo.stderr:
+            self.stderr.append(linha.rstrip())
+
+    def vivo(self):
+        return self.processo.poll() is None
+
+    def executar(self, arquivo_xml, nome_personalizado=None, timeout=120, destino=None, conteudo=None):
+        """Envia um job e aguarda a resposta.
+
+        Com `conteudo` (bytes do XML) o worker não lê nem grava arquivos: o PDF
+        volta em base64 na resposta ("pdf_base64").
+
+        Retorna a resposta JSON do gerador (dict), ou None se o worker já
+        havia encerrado (reciclagem) sem aceitar o job.
+        """
+        job = {"xml": arquivo_xml}
+        if nome_personalizado:
+            job["nome"] = nome_personalizado
+        if destino:
+            job["destino"] = destino  # PDF gravado direto no caminho final
+        if conteudo is not None:
+            job["conteudo"] = base64.b64encode(conteudo).decode("ascii")
+
+        try:
+            self.processo.stdin.write(json.dumps(job) + "\n")
+            self.processo.stdin.flush()
+        except OSError:
+            pass  # Pipe fechado: o processo morreu, tratado abaixo pelo fim do STDOUT
+
+        try:
+            resposta = self.respostas.get(timeout=timeout)
+        except queue.Empty:
+            self.encerrar(forcar=True)
+            raise subprocess.TimeoutExpired(self.cmd, timeout)
+
+        if resposta is None:
+            returncode = self.processo.wait()
+            if returncode == 0:
+                return None  # Encerramento voluntário por limite de memória
+            return resposta_de_falha(returncode, "\n".join(self.stderr))
+
+        self.jobs += 1
+        return resposta
+
+    def encerrar(self, forcar=False):
+        try:
+            if forcar:
+                self.processo.kill()
+            else:
+                self.processo.stdin.close()  # Fim do STDIN encerra o loop do worker
+            self.processo.wait(timeout=5)
+        except Exception:
+            self.processo.kill()
+
+
+class PoolWorkersPHP:
+    """Pool de WorkerPHP compartilhado pelas threads de processamento de um lote"""
+
+    def __init__(self, php_path, script_php, cwd, max_jobs=MAX_JOBS_POR_WORKER,
+                 limite_memoria=LIMITE_MEMORIA_WORKER):
+        self.php_path = php_path
+        self.script_php = script_php
+        self.cwd = cwd
+        self.max_jobs = max_jobs
+        self.limite_memoria = limite_memoria
+        self._livres = queue.Queue()
+        self._todos = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.encerrar()
+
+    def _obter_worker(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            # Workers são criados sob demanda: no máximo um por thread ativa
+            worker = WorkerPHP(self.php_path, self.script_php, self.cwd, self.limite_memoria)
+            with self._lock:
+                self._todos.append(worker)
+            return worker
+
+    def _devolver(self, worker):
+        if worker.vivo() and worker.jobs < self.max_jobs:
+            self._livres.put(worker)
+        else:
+            self._descartar(worker)
+
+    def _descartar(self, worker):
+        worker.encerrar()
+        with self._lock:
+            if worker in self._todos:
+                self._todos.remove(worker)
+
+    def limitar(self, max_workers):
+        """Encerra workers ociosos excedentes após uma redução da concorrência"""
+        while len(self._todos) > max_workers:
+            try:
+                worker = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(worker)
+
+    def renderizar(self, arquivo_xml, nome_personalizado=None, timeout=120, destino=None, conteudo=None):
+        """Gera a DANFE de um XML usando um worker livre e retorna a resposta do gerador"""
+        for _ in range(3):
+            worker = self._obter_worker()
+            try:
+                resultado = worker.executar(arquivo_xml, nome_personalizado, timeout, destino, conteudo)
+            except subprocess.TimeoutExpired:
+                self._descartar(worker)
+                raise
+
+            if resultado is None:
+                # Worker reciclado antes de aceitar o job: tentar em um novo processo
+                self._descartar(worker)
+                continue
+
+            self._devolver(worker)
+            return resultado
+
+        raise RuntimeError("Worker PHP encerrou sem processar o job")
+
+    def encerrar(self):
+        with self._lock:
+            workers = list(self._todos)
+            self._todos.clear()
+        for worker in workers:
+            worker.encerrar()
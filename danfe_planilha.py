@@ -0,0 +1,180 @@
+"""
+Importação de mapeamentos chave de acesso → nome de arquivo a partir de planilhas
+Lê XLSX/XLSM (openpyxl) ou CSV com pandas, sugere as colunas de chave e de nome
+e valida todas as linhas de uma vez, com operações vetorizadas: a chave em si
+(danfe_validacao), chaves repetidas, nomes repetidos e chaves que não estão
+entre os XMLs escaneados
+"""
+
+import csv
+import io
+import os
+
+import pandas as pd
+
+from danfe_validacao import MOTIVOS_CHAVE, validar_chaves
+
+EXTENSOES_EXCEL = (".xlsx", ".xlsm")
+EXTENSOES_PLANILHA = EXTENSOES_EXCEL + (".csv", ".txt")
+
+# Separadores de CSV aceitos e o trecho do arquivo usado para detectá-los
+SEPARADORES_CSV = ";,\t"
+AMOSTRA_CSV = 64 * 1024
+# Separador de unidade ASCII: não aparece em planilhas, então a linha inteira é uma célula
+SEPARADOR_COLUNA_UNICA = "\x1f"
+
+# Linhas de dados começam na 2ª linha da planilha (a 1ª é o cabeçalho)
+PRIMEIRA_LINHA_DADOS = 2
+
+# Número gravado como valor numérico no Excel (3,52401E+43): os dígitos já se perderam
+_RE_NOTACAO_CIENTIFICA = r"\d+(?:[.,]\d+)?[eE]\+?\d+"
+
+# O Excel guarda só 15 dígitos significativos de um número; acima disso a célula
+# numérica não pode ser uma chave (e o próprio Excel a mostra em notação científica)
+LIMITE_DIGITOS_EXCEL = 10 ** 15
+
+# Problemas de uma linha, na ordem de prioridade (cada linha recebe só o primeiro)
+MOTIVOS = {
+    "nome_vazio": "Nome vazio",
+    "notacao_cientifica": "Chave salva como número no Excel (dígitos perdidos; formate a coluna como texto)",
+    **MOTIVOS_CHAVE,
+    "duplicada": "Chave repetida na planilha",
+    "nome_repetido": "Mesmo nome para chaves diferentes",
+    "nao_encontrada": "Chave não encontrada nos XMLs escaneados",
+}
+
+# Status da tabela de renomeação para cada motivo (danfe_tabela.ROTULOS_STATUS)
+STATUS_POR_MOTIVO = {
+    "": "",
+    "nome_vazio": "",
+    "notacao_cientifica": "chave_invalida",
+    **{motivo: "chave_invalida" for motivo in MOTIVOS_CHAVE},
+    "duplicada": "duplicada",
+    "nome_repetido": "nome_repetido",
+    "nao_encontrada": "nao_encontrada",
+}
+
+
+def abas_planilha(caminho):
+    """Nomes das abas de um arquivo Excel ([] para CSV)"""
+    if os.path.splitext(caminho)[1].lower() not in EXTENSOES_EXCEL:
+        return []
+    with pd.ExcelFile(caminho, engine="openpyxl") as arquivo:
+        return list(arquivo.sheet_names)
+
+
+def _celula_texto(valor):
+    """Texto de uma célula do Excel; números grandes saem em notação científica, como o Excel os mostra"""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return str(valor)
+    if abs(valor) >= LIMITE_DIGITOS_EXCEL:
+        return f"{valor:.5E}"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def ler_planilha(caminho, aba=0):
+    """DataFrame com todas as células como texto (chaves não viram números)
+
+    No Excel, células numéricas com mais de 15 dígitos (chave digitada numa
+    coluna sem formato de texto) viram "3.52401E+43" e são apontadas como
+    notacao_cientifica na validação, em vez de parecerem uma chave com DV errado.
+    """
+    if os.path.splitext(caminho)[1].lower() in EXTENSOES_EXCEL:
+        tabela = pd.read_excel(caminho, sheet_name=aba, dtype=object, keep_default_na=False, engine="openpyxl")
+        # DataFrame.map só existe a partir do pandas 2.1 (antes, applymap)
+        aplicar = tabela.map if hasattr(pd.DataFrame, "map") else tabela.applymap
+        return aplicar(_celula_texto)
+
+    # CSV: codificação do Excel como alternativa ao UTF-8
+    with open(caminho, "rb") as f:
+        conteudo = f.read()
+    for codificacao in ("utf-8-sig", "cp1252"):
+        try:
+            texto = conteudo.decode(codificacao)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("Codificação do CSV não reconhecida (use UTF-8 ou Windows-1252)")
+    return pd.read_csv(io.StringIO(texto), sep=separador_csv(texto), dtype=str, keep_default_na=False)
+
+
+def separador_csv(texto):
+    """Separador do CSV (";" do Excel em português, "," ou tabulação)
+
+    Sem nenhum deles de forma consistente, o arquivo tem uma coluna só: o
+    separador devolvido não ocorre no texto, para nenhuma letra virar separador.
+    """
+    try:
+        amostra = texto[:AMOSTRA_CSV].rsplit("\n", 1)[0] if len(texto) > AMOSTRA_CSV else texto
+        return csv.Sniffer().sniff(amostra, delimiters=SEPARADORES_CSV).delimiter
+    except csv.Error:
+        return SEPARADOR_COLUNA_UNICA
+
+
+def normalizar_chaves(valores):
+    """Chaves como texto sem espaços (a DANFE impressa agrupa os dígitos de 4 em 4)"""
+    return pd.Series(valores, dtype=object).fillna("").astype(str).str.replace(r"\s+", "", regex=True)
+
+
+def sugerir_colunas(tabela):
+    """(coluna da chave, coluna do nome) pelo cabeçalho ou, na falta dele, pelo conteúdo"""
+    colunas = list(tabela.columns)
+    if not colunas:
+        return None, None
+
+    def proporcao_chaves(coluna):
+        return normalizar_chaves(tabela[coluna].head(200)).str.fullmatch(r"\d{44}").mean()
+
+    pelo_nome = [c for c in colunas if "chave" in str(c).lower()]
+    coluna_chave = pelo_nome[0] if pelo_nome else max(colunas, key=proporcao_chaves)
+
+    restantes = [c for c in colunas if c != coluna_chave]
+    coluna_nome = next(
+        (c for c in restantes if any(termo in str(c).lower() for termo in ("nome", "arquivo"))),
+        restantes[0] if restantes else None
+    )
+    return coluna_chave, coluna_nome
+
+
+def validar_mapeamento(chaves, nomes, chaves_conhecidas=None):
+    """DataFrame (linha, chave, nome, motivo) com o primeiro problema de cada linha ('' se ok)
+
+    chaves_conhecidas: chaves dos XMLs escaneados; None pula essa verificação.
+    """
+    chaves = normalizar_chaves(chaves).reset_index(drop=True)
+    nomes = pd.Series(nomes, dtype=object).fillna("").astype(str).str.strip().reset_index(drop=True)
+    motivo = pd.Series("", index=chaves.index, dtype=object)
+
+    def marcar(mascara, codigo):
+        motivo[mascara & (motivo == "")] = codigo
+
+    # Formato, DV, modelo, UF, data e emitente de todas as chaves de uma vez
+    motivo_chave = pd.Series(validar_chaves(chaves.tolist()), index=chaves.index, dtype=object)
+
+    # Mesmo nome (sem diferenciar maiúsculas, como no Windows) apontado para chaves diferentes
+    nomes_comparaveis = nomes.str.lower()
+    chaves_por_nome = chaves.groupby(nomes_comparaveis).transform("nunique")
+
+    marcar(nomes == "", "nome_vazio")
+    marcar(chaves.str.fullmatch(_RE_NOTACAO_CIENTIFICA), "notacao_cientifica")
+    pendentes = (motivo == "") & (motivo_chave != "")
+    motivo[pendentes] = motivo_chave[pendentes]
+    marcar(chaves.duplicated(keep=False), "duplicada")
+    marcar(chaves_por_nome > 1, "nome_repetido")
+    if chaves_conhecidas is not None:
+        marcar(~chaves.isin(list(chaves_conhecidas)), "nao_encontrada")
+
+    return pd.DataFrame({
+        "linha": chaves.index + PRIMEIRA_LINHA_DADOS,
+        "chave": chaves,
+        "nome": nomes,
+        "motivo": motivo,
+    })
+
+
+def resumir_validacao(resultado):
+    """{motivo: quantidade} apenas dos motivos presentes ('' = linhas válidas)"""
+    return resultado["motivo"].value_counts().to_dict()
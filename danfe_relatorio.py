@@ -0,0 +1,104 @@
+"""
+Relatório de tempos por etapa de um lote de DANFEs
+Cada documento registra quanto tempo passou em cada etapa; no fim do lote os
+tempos viram histogramas e um relatório CSV (por documento) + JSON (resumo)
+gravado na pasta de saída
+"""
+
+import csv
+import json
+import math
+import os
+import threading
+import time
+
+# Etapas medidas, em milissegundos:
+#   fila          - da entrada no agendador até o início do processamento
+#   leitura       - leitura do XML pelo Python (cache de PDFs / envio pelo pipe)
+#   cache         - consulta ao cache de PDFs (e entrega, quando há acerto)
+#   inicio_php    - tempo fora do gerador: inicialização do PHP (execução avulsa
+#                   ou worker novo) e comunicação com o processo
+#   parse, render, escrita - medidos dentro do gerador_danfe.php (a escrita é
+#                   medida no Python quando o PDF volta pelo pipe)
+#   movimentacao  - pós-processamento do PDF já gravado no destino (cópia para o cache)
+#   total         - do início ao fim do processamento do documento
+ETAPAS = ("fila", "leitura", "cache", "inicio_php", "parse", "render", "escrita", "movimentacao", "total")
+
+# Limites superiores (ms) das faixas dos histogramas; a última faixa é aberta
+FAIXAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+MAIS_LENTOS = 10
+
+
+def _percentil(ordenados, p):
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class RelatorioExecucao:
+    """Coleta thread-safe dos tempos por documento de um lote"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.documentos = []
+        self.inicio = time.time()
+
+    def registrar(self, arquivo_xml, sucesso, tempos):
+        with self._lock:
+            self.documentos.append({
+                "arquivo": os.path.basename(arquivo_xml),
+                "status": "ok" if sucesso else "erro",
+                "tempos_ms": {etapa: round(tempos[etapa], 2) for etapa in ETAPAS if etapa in tempos},
+            })
+
+    def histogramas(self):
+        """{etapa: {documentos, p50_ms, p95_ms, max_ms, soma_ms, faixas: [{ate_ms, documentos}]}}"""
+        resultado = {}
+        for etapa in ETAPAS:
+            valores = sorted(d["tempos_ms"][etapa] for d in self.documentos if etapa in d["tempos_ms"])
+            if not valores:
+                continue
+            contagens = [0] * (len(FAIXAS_MS) + 1)
+            for valor in valores:
+                indice = next((i for i, limite in enumerate(FAIXAS_MS) if valor <= limite), len(FAIXAS_MS))
+                contagens[indice] += 1
+            resultado[etapa] = {
+                "documentos": len(valores),
+                "p50_ms": _percentil(valores, 50),
+                "p95_ms": _percentil(valores, 95),
+                "max_ms": valores[-1],
+                "soma_ms": round(sum(valores), 2),
+                "faixas": [
+                    {"ate_ms": FAIXAS_MS[i] if i < len(FAIXAS_MS) else None, "documentos": n}
+                    for i, n in enumerate(contagens) if n
+                ],
+            }
+        return resultado
+
+    def mais_lentos(self, quantidade=MAIS_LENTOS):
+        return sorted(self.documentos, key=lambda d: d["tempos_ms"].get("total", 0), reverse=True)[:quantidade]
+
+    def gravar(self, pasta, prefixo="relatorio_renamerpro"):
+        """Grava <prefixo>_AAAAMMDD_HHMMSS.csv e .json na pasta; retorna os dois caminhos"""
+        base = os.path.join(pasta, f"{prefixo}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.inicio))}")
+
+        with open(base + ".csv", "w", newline="", encoding="utf-8-sig") as f:  # BOM: abre direto no Excel
+            escritor = csv.writer(f, delimiter=";")
+            escritor.writerow(["arquivo", "status"] + [f"{etapa}_ms" for etapa in ETAPAS])
+            for documento in self.documentos:
+                escritor.writerow(
+                    [documento["arquivo"], documento["status"]]
+                    + [documento["tempos_ms"].get(etapa, "") for etapa in ETAPAS]
+                )
+
+        resumo = {
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.inicio)),
+            "documentos": len(self.documentos),
+            "erros": sum(1 for d in self.documentos if d["status"] != "ok"),
+            "etapas": self.histogramas(),
+            "mais_lentos": self.mais_lentos(),
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(resumo, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+        return base + ".csv", base + ".json"
@@ -0,0 +1,422 @@
+"""
+Renomeação em lote transacional
+Cada chave renomeia o XML e os PDFs já gerados dele (mesmo nome-base do XML
+ou chave de acesso no nome), localizados por uma única listagem de cada pasta.
+Todas as renomeações são planejadas antes de tocar na pasta: chaves repetidas,
+nomes de destino repetidos e arquivos já existentes são recusados em memória,
+e encadeamentos (A→B enquanto B→C) e ciclos (A→B, B→A) são ordenados, com um
+nome temporário para quebrar cada ciclo. As cadeias independentes rodam em
+paralelo (em compartilhamentos de rede cada renomeação espera o servidor).
+Cada renomeação feita vai para um diário: se uma delas falhar o lote inteiro
+é revertido, e um lote concluído pode ser desfeito depois de uma só vez.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from danfe_dados import diretorio_dados
+
+# Renomeações simultâneas (limitadas pela latência do servidor, não pela CPU)
+RENOMEACOES_SIMULTANEAS = 8
+
+# Diários de lotes concluídos mantidos para desfazer (os mais antigos são apagados)
+MANTER_DIARIOS = 20
+
+# Chave de acesso no nome de um PDF (ex.: NFe3524...pdf, 3524...-procNFe.pdf)
+_RE_CHAVE_NOME = re.compile(r"(?<!\d)(\d{44})(?!\d)")
+
+
+def _normalizar(caminho):
+    """Caminho comparável (o Windows não diferencia maiúsculas)"""
+    return os.path.normcase(os.path.abspath(caminho))
+
+
+class Renomeacao:
+    """Um pedido da tabela (chave → nome) e os arquivos que ele move"""
+
+    def __init__(self, indice, chave, nome_final, origem=None):
+        self.indice = indice
+        self.chave = chave
+        self.nome_final = nome_final
+        # XML antes e depois; movimentos traz só o que muda de nome (XML e PDFs)
+        self.origem = origem
+        self.destino = os.path.join(os.path.dirname(origem), f"{nome_final}.xml") if origem else None
+        self.movimentos = []
+        self.pdfs = 0
+        self.status = ""
+        self.mensagem = ""
+        self._restantes = 0
+
+    def mover(self, origem, destino):
+        if origem != destino:
+            self.movimentos.append((origem, destino))
+
+    def concluir(self, status, mensagem):
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _mover(origem, destino):
+    """os.rename sem sobrescrever (no Windows o próprio rename já recusa)"""
+    if os.name != "nt" and os.path.lexists(destino) and _normalizar(origem) != _normalizar(destino):
+        raise FileExistsError(f"Arquivo já existe: {os.path.basename(destino)}")
+    os.rename(origem, destino)
+
+
+class ListagemPastas:
+    """Uma listagem por pasta: tudo o que existe nela e os PDFs por nome-base e por chave no nome"""
+
+    def __init__(self, pastas):
+        self.existentes = set()
+        self.pdfs_por_base = {}
+        self.pdfs_por_chave = {}
+        for pasta in pastas:
+            try:
+                with os.scandir(pasta) as entradas:
+                    for entrada in entradas:
+                        self.existentes.add(_normalizar(entrada.path))
+                        if entrada.name.lower().endswith(".pdf") and entrada.is_file():
+                            self._indexar_pdf(entrada.path)
+            except OSError:
+                pass
+
+    def _indexar_pdf(self, caminho):
+        base = caminho[:-4]
+        self.pdfs_por_base.setdefault(_normalizar(base), []).append(caminho)
+        for chave in set(_RE_CHAVE_NOME.findall(os.path.basename(base))):
+            self.pdfs_por_chave.setdefault(chave, []).append(caminho)
+
+    def pdfs_do_xml(self, chave, arquivo_xml, pastas_pdf=()):
+        """PDFs gerados do XML: mesmo nome-base (regra do gerador_danfe.php) ou a chave no nome
+
+        O nome-base é procurado na pasta do XML e em cada uma de pastas_pdf.
+        """
+        nome_base = os.path.splitext(os.path.basename(arquivo_xml))[0]
+        encontrados = []
+        for pasta in (os.path.dirname(arquivo_xml),) + tuple(pastas_pdf):
+            encontrados += self.pdfs_por_base.get(_normalizar(os.path.join(pasta, nome_base)), [])
+        return list(dict.fromkeys(encontrados + self.pdfs_por_chave.get(chave, [])))
+
+
+def planejar_renomeacoes(pedidos, chaves_xml, renomear_pdfs=True, pastas_pdf=()):
+    """Separa [(índice, chave, nome_final)] em (operações a executar, pedidos já resolvidos)
+
+    Os resolvidos já têm status: "nao_encontrada", "duplicada" (chave repetida),
+    "nome_repetido" (mesmo destino para chaves diferentes), "existe" ou "ok"
+    (os arquivos já têm esse nome). Os PDFs são procurados nas pastas dos XMLs
+    e em pastas_pdf (ex.: a pasta de saída do processamento em massa).
+    """
+    pastas_pdf = tuple(pasta for pasta in pastas_pdf if pasta)
+    operacoes = []
+    resolvidas = []
+    for indice, chave, nome_final in pedidos:
+        origem = chaves_xml.get(chave)
+        operacao = Renomeacao(indice, chave, nome_final, origem)
+        if origem is None:
+            operacao.concluir("nao_encontrada", f"❌ Chave não encontrada: {chave}")
+            resolvidas.append(operacao)
+            continue
+        operacao.mover(operacao.origem, operacao.destino)
+        operacoes.append(operacao)
+
+    # Uma listagem por pasta envolvida, em vez de um stat ou uma busca por linha
+    listagem = ListagemPastas({_normalizar(pasta) for pasta in [os.path.dirname(op.origem) for op in operacoes]
+                               + list(pastas_pdf)})
+    if renomear_pdfs:
+        atribuidos = set()
+        for operacao in operacoes:
+            pdfs = [pdf for pdf in listagem.pdfs_do_xml(operacao.chave, operacao.origem, pastas_pdf)
+                    if pdf not in atribuidos]
+            atribuidos.update(pdfs)
+            operacao.pdfs = len(pdfs)
+            usados = Counter()
+            for pdf in pdfs:
+                # Mais de um PDF da mesma nota na mesma pasta: "nome (2).pdf", "nome (3).pdf"...
+                pasta = os.path.dirname(pdf)
+                usados[pasta] += 1
+                sufixo = f" ({usados[pasta]})" if usados[pasta] > 1 else ""
+                operacao.mover(pdf, os.path.join(pasta, f"{operacao.nome_final}{sufixo}.pdf"))
+
+    def recusar(condicao, status, mensagem):
+        restantes = []
+        for operacao in operacoes:
+            if condicao(operacao):
+                operacao.concluir(status, mensagem(operacao))
+                resolvidas.append(operacao)
+            else:
+                restantes.append(operacao)
+        return restantes
+
+    # A mesma chave em duas linhas: não dá para saber qual nome vale
+    repetidas = Counter(operacao.chave for operacao in operacoes)
+    operacoes = recusar(lambda op: repetidas[op.chave] > 1, "duplicada",
+                        lambda op: f"❌ Chave repetida na tabela: {op.chave}")
+
+    operacoes = recusar(lambda op: not op.movimentos, "ok",
+                        lambda op: f"✅ {op.nome_final}.xml já tem esse nome")
+
+    destinos = Counter(_normalizar(destino) for op in operacoes for _, destino in op.movimentos)
+    operacoes = recusar(lambda op: any(destinos[_normalizar(destino)] > 1 for _, destino in op.movimentos),
+                        "nome_repetido", lambda op: f"❌ Mesmo nome para chaves diferentes: {op.nome_final}.xml")
+
+    # Arquivo removido ou renomeado por fora desde o escaneamento
+    existentes = listagem.existentes
+    operacoes = recusar(lambda op: _normalizar(op.origem) not in existentes,
+                        "nao_encontrada", lambda op: f"❌ Arquivo não existe mais: {os.path.basename(op.origem)}")
+
+    # Destino ocupado por um arquivo que não sai do lugar neste lote; recusar uma
+    # operação mantém o arquivo dela onde está, então repete até estabilizar
+    while True:
+        saindo = {_normalizar(origem) for op in operacoes for origem, _ in op.movimentos}
+
+        def ocupado(op):
+            """Primeiro destino ocupado da operação (None se todos estão livres)"""
+            return next((
+                destino for origem, destino in op.movimentos
+                if _normalizar(destino) in existentes
+                and _normalizar(destino) not in saindo
+                and _normalizar(destino) != _normalizar(origem)
+            ), None)
+
+        quantidade = len(operacoes)
+        operacoes = recusar(ocupado, "existe", lambda op: f"❌ Arquivo já existe: {os.path.basename(ocupado(op))}")
+        if len(operacoes) == quantidade:
+            return operacoes, resolvidas
+
+
+def agrupar_cadeias(operacoes):
+    """Listas de passos (operação, origem, destino) que precisam rodar em sequência
+
+    Um movimento cujo destino é a origem de outro espera esse outro; num ciclo,
+    o primeiro arquivo vai para um nome temporário e volta no último passo.
+    Cadeias diferentes são independentes entre si.
+    """
+    movimentos = [(op, origem, destino) for op in operacoes for origem, destino in op.movimentos]
+    por_origem = {_normalizar(origem): posicao for posicao, (_, origem, _) in enumerate(movimentos)}
+
+    # seguinte[i] = j: o movimento j só pode rodar depois que i liberar a origem
+    seguinte = {}
+    for posicao, (_, origem, destino) in enumerate(movimentos):
+        anterior = por_origem.get(_normalizar(destino))
+        if anterior is not None and anterior != posicao:
+            seguinte[anterior] = posicao
+    dependentes = set(seguinte.values())
+
+    visitados = set()
+
+    def seguir(posicao):
+        passos = []
+        while posicao is not None and posicao not in visitados:
+            visitados.add(posicao)
+            passos.append(movimentos[posicao])
+            posicao = seguinte.get(posicao)
+        return passos
+
+    cadeias = [seguir(posicao) for posicao in range(len(movimentos)) if posicao not in dependentes]
+
+    # O que sobrou está em ciclos
+    for posicao in range(len(movimentos)):
+        if posicao in visitados:
+            continue
+        operacao, origem, destino = movimentos[posicao]
+        temporario = f"{origem}.{uuid.uuid4().hex[:8]}.tmp"
+        visitados.add(posicao)
+        cadeias.append(
+            [(operacao, origem, temporario)] + seguir(seguinte[posicao]) + [(operacao, temporario, destino)]
+        )
+    return cadeias
+
+
+class DiarioRenomeacao:
+    """Passos (cadeia, origem, destino) executados de um lote, na ordem em que aconteceram"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.passos = []
+        self._lock = threading.Lock()
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+
+    def registrar(self, cadeia, origem, destino):
+        linha = json.dumps({"cadeia": cadeia, "origem": origem, "destino": destino}, ensure_ascii=False)
+        with self._lock:
+            self.passos.append((cadeia, origem, destino))
+            self._arquivo.write(linha + "\n")
+            self._arquivo.flush()
+
+    def fechar(self, apagar=False):
+        with self._lock:
+            if self._arquivo is None:
+                return
+            try:
+                os.fsync(self._arquivo.fileno())
+            except OSError:
+                pass
+            self._arquivo.close()
+            self._arquivo = None
+            if apagar or not self.passos:
+                try:
+                    os.remove(self.caminho)
+                except OSError:
+                    pass
+
+
+def pasta_diarios():
+    pasta = os.path.join(diretorio_dados(), "renomeacoes")
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _novo_diario():
+    nome = time.strftime("%Y%m%d-%H%M%S") + f"-{uuid.uuid4().hex[:6]}.jsonl"
+    return DiarioRenomeacao(os.path.join(pasta_diarios(), nome))
+
+
+def diarios_renomeacao():
+    """Diários de lotes que ainda podem ser desfeitos, do mais recente para o mais antigo"""
+    pasta = pasta_diarios()
+    return sorted(
+        (os.path.join(pasta, nome) for nome in os.listdir(pasta) if nome.endswith(".jsonl")),
+        reverse=True
+    )
+
+
+def _limpar_diarios_antigos():
+    for caminho in diarios_renomeacao()[MANTER_DIARIOS:]:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def _reverter(passos, simultaneas):
+    """Desfaz passos (cadeia, origem, destino): cada cadeia de trás para frente, cadeias em paralelo
+
+    Retorna (passos revertidos, mensagens de erro).
+    """
+    por_cadeia = {}
+    for passo in passos:
+        por_cadeia.setdefault(passo[0], []).append(passo)
+
+    revertidos = []
+    erros = []
+    lock = threading.Lock()
+
+    def reverter_cadeia(cadeia):
+        for passo in reversed(cadeia):
+            _, origem, destino = passo
+            if not os.path.lexists(destino) and os.path.lexists(origem):
+                continue  # Já revertido (ex.: desfazer interrompido e repetido)
+            try:
+                _mover(destino, origem)
+            except OSError as e:
+                with lock:
+                    erros.append(f"❌ {os.path.basename(destino)} → {os.path.basename(origem)}: {e}")
+                return  # Os passos anteriores da cadeia dependem deste
+            with lock:
+                revertidos.append(passo)
+
+    with ThreadPoolExecutor(max_workers=simultaneas, thread_name_prefix="desfazer") as executor:
+        list(executor.map(reverter_cadeia, por_cadeia.values()))
+    return revertidos, erros
+
+
+def executar_renomeacoes(operacoes, simultaneas=RENOMEACOES_SIMULTANEAS):
+    """Executa o plano e define o status de cada operação
+
+    Retorna (diário para desfazer ou None, erros da reversão). Se qualquer
+    renomeação falhar, as que já aconteceram são revertidas e as demais
+    operações ficam com status "revertido"; o diário só sobra se a própria
+    reversão falhar.
+    """
+    if not operacoes:
+        return None, []
+
+    cadeias = agrupar_cadeias(operacoes)
+    for operacao in operacoes:
+        operacao._restantes = len(operacao.movimentos)
+
+    diario = _novo_diario()
+    falha = threading.Event()
+    lock = threading.Lock()
+
+    def executar_cadeia(numero, passos):
+        for operacao, origem, destino in passos:
+            if falha.is_set():
+                return
+            try:
+                _mover(origem, destino)
+            except OSError as e:
+                operacao.concluir("erro", f"❌ Erro: {e}")
+                falha.set()
+                return
+            diario.registrar(numero, origem, destino)
+            with lock:
+                operacao._restantes -= 1
+                if operacao._restantes:
+                    continue
+            pdfs = f" (+{operacao.pdfs} PDF)" if operacao.pdfs else ""
+            operacao.concluir("ok", f"✅ {os.path.basename(operacao.origem)} → {os.path.basename(operacao.destino)}{pdfs}")
+
+    with ThreadPoolExecutor(max_workers=max(1, simultaneas), thread_name_prefix="renomear") as executor:
+        list(executor.map(executar_cadeia, range(len(cadeias)), cadeias))
+
+    if not falha.is_set():
+        diario.fechar()
+        _limpar_diarios_antigos()
+        return diario.caminho, []
+
+    # Transação: volta tudo o que este lote já tinha mudado
+    _, erros = _reverter(diario.passos, simultaneas)
+    diario.fechar(apagar=not erros)
+    for operacao in operacoes:
+        if operacao.status != "erro":
+            operacao.concluir("revertido", f"↩️ Revertido (outra renomeação do lote falhou): {operacao.nome_final}.xml")
+    return (diario.caminho if erros else None), erros
+
+
+def movimentos_liquidos(passos):
+    """[(caminho original, caminho final)] de uma sequência de passos (passos temporários somem)"""
+    origem_de = {}
+    for _, origem, destino in passos:
+        origem_de[destino] = origem_de.pop(origem, origem)
+    return [(origem, destino) for destino, origem in origem_de.items() if origem != destino]
+
+
+def ler_diario(caminho):
+    """Passos (cadeia, origem, destino) de um diário; linhas truncadas são ignoradas"""
+    passos = []
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+                passos.append((registro["cadeia"], registro["origem"], registro["destino"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return passos
+
+
+def desfazer_renomeacoes(caminho=None, simultaneas=RENOMEACOES_SIMULTANEAS):
+    """Desfaz um lote inteiro pelo diário (padrão: o mais recente)
+
+    Retorna (passos revertidos, mensagens de erro); o diário é apagado se tudo
+    foi revertido. Sem diário disponível retorna ([], []).
+    """
+    if caminho is None:
+        diarios = diarios_renomeacao()
+        if not diarios:
+            return [], []
+        caminho = diarios[0]
+
+    revertidos, erros = _reverter(ler_diario(caminho), simultaneas)
+    if not erros:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+    return revertidos, erros
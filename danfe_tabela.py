@@ -0,0 +1,94 @@
+"""
+Modelo da tabela de renomeação (chave de acesso → nome do arquivo)
+Listas paralelas em memória, sem dependência de interface: a tela mostra só
+as linhas visíveis e lê/grava os valores aqui, então colar, validar e
+atualizar o status de dezenas de milhares de linhas não cria widgets
+"""
+
+# Texto da coluna de status para cada código (os mesmos de MotorDanfe.renomear_por_chave)
+ROTULOS_STATUS = {
+    "": "⏳ Aguardando",
+    "ok": "✅ OK",
+    "chave_invalida": "❌ Chave",
+    "nao_encontrada": "❌ N/Existe",
+    "existe": "❌ Existe",
+    "erro": "❌ Erro",
+    "duplicada": "❌ Duplicada",
+    "nome_repetido": "❌ Nome rep.",
+    "revertido": "↩️ Revertido",
+}
+
+# Linhas com estes status ficam fora da renomeação até serem editadas
+STATUS_BLOQUEIO = {"chave_invalida", "duplicada", "nome_repetido"}
+
+
+class TabelaRenomeacao:
+    """Linhas da tabela de renomeação em listas paralelas (chaves, nomes, status)"""
+
+    def __init__(self):
+        self.chaves = []
+        self.nomes = []
+        self.status = []
+        # Muda quando os índices deixam de valer (lote carregado, linha removida)
+        self.versao = 0
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def adicionar(self, chave="", nome=""):
+        """Acrescenta uma linha e retorna o índice dela"""
+        self.chaves.append(chave)
+        self.nomes.append(nome)
+        self.status.append("")
+        return len(self.chaves) - 1
+
+    def carregar(self, pares, status=None):
+        """Substitui o conteúdo por [(chave, nome)] (lote colado ou planilha importada)
+
+        status: códigos já conhecidos de cada linha (validação da planilha).
+        """
+        self.chaves = []
+        self.nomes = []
+        for chave, nome in pares:
+            self.chaves.append(chave)
+            self.nomes.append(nome)
+        self.status = list(status) if status is not None else [""] * len(self.chaves)
+        self.versao += 1
+
+    def remover(self, indice):
+        del self.chaves[indice]
+        del self.nomes[indice]
+        del self.status[indice]
+        self.versao += 1
+
+    def limpar(self):
+        self.carregar([])
+
+    def definir_chave(self, indice, chave):
+        # Linha editada volta a aguardar validação
+        if indice < len(self.chaves) and self.chaves[indice] != chave:
+            self.chaves[indice] = chave
+            self.status[indice] = ""
+
+    def definir_nome(self, indice, nome):
+        if indice < len(self.nomes) and self.nomes[indice] != nome:
+            self.nomes[indice] = nome
+            self.status[indice] = ""
+
+    def definir_status(self, indice, status):
+        if indice < len(self.status):
+            self.status[indice] = status
+
+    def rotulo_status(self, indice):
+        return ROTULOS_STATUS.get(self.status[indice], self.status[indice])
+
+    def preenchidas(self):
+        """[(índice, chave, nome)] das linhas com chave e nome e sem status de bloqueio
+
+        Retorna uma cópia: a tela pode editar o modelo durante o uso.
+        """
+        return [
+            (indice, chave.strip(), nome.strip())
+            for indice, (chave, nome, status) in enumerate(zip(self.chaves, self.nomes, self.status))
+            if chave.strip() and nome.strip() and status not in STATUS_BLOQUEIO
+        ]
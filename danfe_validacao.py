@@ -0,0 +1,120 @@
+"""
+Validação de chaves de acesso de NF-e/NFC-e em lote
+Confere de uma vez, com operações vetorizadas do NumPy, todas as partes da
+chave (cUF AAMM CNPJ/CPF mod série nNF tpEmis cNF cDV): dígito verificador
+módulo 11, código da UF, mês/ano de emissão, dígitos verificadores do CNPJ
+(ou CPF) do emitente e modelo 55/65. Erros de digitação que mantêm os 44
+dígitos são barrados antes de qualquer acesso à pasta.
+"""
+
+import time
+
+import numpy as np
+
+# Motivos de rejeição, na ordem de prioridade (cada chave recebe só o primeiro)
+MOTIVOS_CHAVE = {
+    "formato": "Chave não tem 44 dígitos",
+    "dv": "Dígito verificador inválido",
+    "modelo": "Modelo diferente de 55 (NF-e) e 65 (NFC-e)",
+    "uf": "Código de UF inexistente",
+    "data": "Mês/ano de emissão inválido",
+    "emitente": "CNPJ/CPF do emitente inválido",
+}
+
+# Códigos IBGE das UFs (posições 1-2 da chave)
+CODIGOS_UF = np.array([
+    11, 12, 13, 14, 15, 16, 17,
+    21, 22, 23, 24, 25, 26, 27, 28, 29,
+    31, 32, 33, 35,
+    41, 42, 43,
+    50, 51, 52, 53,
+])
+
+MODELOS = np.array([55, 65])
+
+# AAMM da primeira NF-e (abril de 2006)
+PRIMEIRA_EMISSAO = 604
+
+
+def _pesos_modulo11(quantidade):
+    """Pesos 2..9 repetidos da direita para a esquerda (chave de acesso e CNPJ)"""
+    return np.array([2 + (quantidade - 1 - posicao) % 8 for posicao in range(quantidade)], dtype=np.int32)
+
+
+PESOS_CHAVE = _pesos_modulo11(43)
+PESOS_CNPJ = (_pesos_modulo11(12), _pesos_modulo11(13))
+PESOS_CPF = (np.arange(10, 1, -1, dtype=np.int32), np.arange(11, 1, -1, dtype=np.int32))
+
+
+def _digito_modulo11(digitos, pesos):
+    resto = digitos @ pesos % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+
+def _documento_valido(digitos, pesos):
+    """Os dois últimos dígitos de cada linha conferem com os pesos (CNPJ ou CPF)"""
+    base = len(pesos[0])
+    primeiro = _digito_modulo11(digitos[:, :base], pesos[0])
+    segundo = _digito_modulo11(digitos[:, :base + 1], pesos[1])
+    return (primeiro == digitos[:, base]) & (segundo == digitos[:, base + 1]) & digitos.any(axis=1)
+
+
+def _numero(digitos, inicio, fim):
+    """Valor inteiro dos dígitos [inicio, fim) de cada linha"""
+    pesos = 10 ** np.arange(fim - inicio - 1, -1, -1, dtype=np.int32)
+    return digitos[:, inicio:fim] @ pesos
+
+
+def _aamm_atual():
+    agora = time.localtime()
+    return (agora.tm_year % 100) * 100 + agora.tm_mon
+
+
+def validar_chaves(chaves, aamm_limite=None):
+    """Array com o motivo de rejeição de cada chave ('' se válida), na mesma ordem
+
+    As chaves são comparadas como texto, sem espaços nas pontas. aamm_limite é
+    a emissão mais recente aceita (padrão: o mês atual).
+    """
+    textos = np.asarray(list(chaves), dtype=str)
+    motivos = np.full(len(textos), "", dtype=f"U{max(map(len, MOTIVOS_CHAVE))}")
+    if len(textos) == 0:
+        return motivos
+
+    # strip só onde o tamanho não bate (o caso comum, 44 caracteres, não é copiado)
+    com_44 = np.char.str_len(textos) == 44
+    if not com_44.all():
+        textos[~com_44] = np.char.strip(textos[~com_44])
+        com_44 = np.char.str_len(textos) == 44
+    motivos[~com_44] = "formato"
+    if not com_44.any():
+        return motivos
+
+    # Cada caractere vira seu código Unicode (UCS-4): a matriz de dígitos sai sem laço em Python
+    codigos = textos[com_44].astype("U44").view(np.uint32).reshape(-1, 44).astype(np.int32)
+    digitos = codigos - ord("0")
+    numericas = ((digitos >= 0) & (digitos <= 9)).all(axis=1)
+    digitos[~numericas] = 0
+
+    aamm = _numero(digitos, 2, 6)
+    mes = aamm % 100
+    emitente = digitos[:, 6:20]
+    cpf = (emitente[:, :3] == 0).all(axis=1) & _documento_valido(emitente[:, 3:], PESOS_CPF)
+    limite = _aamm_atual() if aamm_limite is None else aamm_limite
+
+    verificacoes = [
+        ("formato", numericas),
+        ("dv", _digito_modulo11(digitos[:, :43], PESOS_CHAVE) == digitos[:, 43]),
+        ("modelo", np.isin(_numero(digitos, 20, 22), MODELOS)),
+        ("uf", np.isin(_numero(digitos, 0, 2), CODIGOS_UF)),
+        ("data", (mes >= 1) & (mes <= 12) & (aamm >= PRIMEIRA_EMISSAO) & (aamm <= limite)),
+        ("emitente", _documento_valido(emitente, PESOS_CNPJ) | cpf),
+    ]
+    resultado = np.select([~valida for _, valida in verificacoes], [codigo for codigo, _ in verificacoes], "")
+    motivos[com_44] = resultado
+    return motivos
+
+
+def motivo_chave(chave):
+    """Motivo de rejeição de uma única chave ('' se válida)"""
+    return str(validar_chaves([chave])[0])
@@ -0,0 +1,139 @@
+"""
+Varredura de pastas de XMLs baseada em os.scandir
+Suporta recursão (ex.: arquivos organizados em CNPJ/AAAA/MM), filtros por padrão
+de nome, data de modificação e CNPJ do emitente no nome, e entrega os arquivos
+à medida que são encontrados para que contagem e processamento comecem antes do fim
+"""
+
+import fnmatch
+import os
+import queue
+import threading
+from datetime import datetime
+
+PADRAO_XML = "*.xml"
+_FIM = object()
+
+
+def converter_data(texto):
+    """Converte 'DD/MM/AAAA' ou 'AAAA-MM-DD' em timestamp (None se vazio)"""
+    texto = (texto or "").strip()
+    if not texto:
+        return None
+    for formato in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {texto} (use DD/MM/AAAA)")
+
+
+def criar_filtro(padrao=PADRAO_XML, modificado_desde=None, cnpj=None):
+    """Função que decide se uma os.DirEntry de arquivo entra na varredura"""
+    padrao = (padrao or PADRAO_XML).lower()
+    cnpj = "".join(c for c in (cnpj or "") if c.isdigit())
+
+    def filtro(entrada):
+        nome = entrada.name.lower()
+        if not fnmatch.fnmatchcase(nome, padrao):
+            return False
+        if cnpj and cnpj not in nome:
+            return False
+        if modificado_desde is not None and entrada.stat().st_mtime < modificado_desde:
+            return False
+        return True
+
+    return filtro
+
+
+def iterar_xmls(pasta, recursivo=False, padrao=PADRAO_XML, modificado_desde=None, cnpj=None,
+                threads=1, ao_erro=None):
+    """Gera as os.DirEntry dos XMLs encontrados (threads > 1 varre subpastas em paralelo)"""
+    filtro = criar_filtro(padrao, modificado_desde, cnpj)
+    if recursivo and threads > 1:
+        yield from _varrer_paralelo(pasta, filtro, threads, ao_erro)
+    else:
+        yield from _varrer_sequencial(pasta, recursivo, filtro, ao_erro)
+
+
+def _listar(pasta, filtro, subpastas):
+    """Arquivos aceitos pelo filtro em uma pasta; subpastas vão para a lista informada"""
+    encontrados = []
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                if subpastas is not None:
+                    subpastas.append(entrada.path)
+            elif entrada.is_file() and filtro(entrada):
+                encontrados.append(entrada)
+    return encontrados
+
+
+def _varrer_sequencial(pasta, recursivo, filtro, ao_erro):
+    pendentes = [pasta]
+    while pendentes:
+        atual = pendentes.pop()
+        subpastas = [] if recursivo else None
+        try:
+            encontrados = _listar(atual, filtro, subpastas)
+        except OSError as e:
+            if atual == pasta:
+                raise  # Pasta raiz inacessível: erro para o chamador
+            if ao_erro:
+                ao_erro(e)
+            continue
+        yield from encontrados
+        if subpastas:
+            pendentes.extend(reversed(subpastas))
+
+
+def _varrer_paralelo(pasta, filtro, threads, ao_erro):
+    """Varredura com várias threads: útil em compartilhamentos de rede de alta latência"""
+    pendentes = queue.Queue()
+    saida = queue.Queue()
+    parar = threading.Event()
+    lock = threading.Lock()
+    em_aberto = [1]  # Pastas enfileiradas ou em leitura
+
+    def trabalhador():
+        while True:
+            atual = pendentes.get()
+            if atual is _FIM:
+                return
+            subpastas = []
+            try:
+                if not parar.is_set():
+                    for entrada in _listar(atual, filtro, subpastas):
+                        saida.put(entrada)
+            except OSError as e:
+                saida.put(e)
+            finally:
+                with lock:
+                    em_aberto[0] += len(subpastas) - 1
+                    terminou = em_aberto[0] == 0
+                for subpasta in subpastas:
+                    pendentes.put(subpasta)
+                if terminou:
+                    for _ in range(threads):
+                        pendentes.put(_FIM)
+                    saida.put(_FIM)
+
+    pendentes.put(pasta)
+    for _ in range(threads):
+        threading.Thread(target=trabalhador, daemon=True).start()
+
+    try:
+        while True:
+            item = saida.get()
+            if item is _FIM:
+                return
+            if isinstance(item, OSError):
+                if item.filename == pasta:
+                    raise item
+                if ao_erro:
+                    ao_erro(item)
+                continue
+            yield item
+    finally:
+        # Consumidor parou antes do fim: as threads só esvaziam a fila restante
+        parar.set()
@@ -1,5 +1,14 @@
 <?php
 // Gerador de DANFE - Integração com Python
+// Cada documento gera uma linha JSON no STDOUT:
+//   {"status":"ok","pdf":...,"paginas":...,"bytes":...,"tempos_ms":{"parse":...,"render":...,"escrita":...}}
+//   {"status":"erro","mensagem":...}
+
+// Incluído como biblioteca (ex.: benchmarks/bench_rastro.php): apenas declara as funções
+if (defined('GERADOR_DANFE_BIBLIOTECA')) {
+    return;
+}
+
 // Verificar se autoloader existe (pode estar no diretório atual ou pai)
 $autoload_paths = ['vendor/autoload.php', '../vendor/autoload.php'];
 $autoload_found = false;
@@ -13,7 +22,7 @@ foreach ($autoload_paths as $path) {
 }
 
 if (!$autoload_found) {
-    echo "ERROR:Dependências PHP não instaladas! Execute: composer install\n";
+    echo respostaErro("Dependências PHP não instaladas! Execute: composer install") . "\n";
     exit(1);
 }
 
@@ -30,21 +39,125 @@ ini_set('memory_limit', '512M');  // Aumentar limite de memória
 
 // Verifica se foi passado o arquivo XML como parâmetro
 if ($argc < 2) {
-    echo "ERROR:Arquivo XML não especificado!\n";
-    echo "Uso: php gerador_danfe.php arquivo.xml [nome_personalizado]\n";
+    echo respostaErro("Arquivo XML não especificado!") . "\n";
+    echo "Uso: php gerador_danfe.php arquivo.xml [nome_personalizado] [--destino arquivo.pdf]\n";
+    echo "     php gerador_danfe.php --worker [limite_memoria_bytes]\n";
     exit(1);
 }
 
+// Modo worker: processo persistente que atende vários XMLs pelo STDIN
+if ($argv[1] === '--worker') {
+    $limiteMemoria = isset($argv[2]) ? (int)$argv[2] : 0;
+    exit(executarWorker($limiteMemoria));
+}
+
 $arquivoXML = $argv[1];
-$nomePersonalizado = isset($argv[2]) ? $argv[2] : null; // Nome personalizado opcional
+$nomePersonalizado = null; // Nome personalizado opcional
+$destino = null;           // Caminho final do PDF (padrão: ao lado do XML)
+for ($i = 2; $i < $argc; $i++) {
+    if ($argv[$i] === '--destino' && isset($argv[$i + 1])) {
+        $destino = $argv[++$i];
+    } else {
+        $nomePersonalizado = $argv[$i];
+    }
+}
 
-// Verifica se arquivo XML existe
-if (!file_exists($arquivoXML)) {
-    echo "ERROR:Arquivo '$arquivoXML' não encontrado!\n";
+try {
+    $resultado = gerarDanfe($arquivoXML, $nomePersonalizado, $destino);
+    
+    // Retorna sucesso para o Python
+    echo respostaJson($resultado) . "\n";
+    
+} catch (Exception $e) {
+    // Retorna erro para o Python
+    echo respostaErro($e->getMessage()) . "\n";
     exit(1);
 }
 
-try {
+/**
+ * Serializa uma resposta do protocolo em uma única linha JSON
+ * (json_encode escapa quebras de linha; UTF-8 inválido do libxml é substituído)
+ */
+function respostaJson($dados) {
+    return json_encode($dados, JSON_UNESCAPED_UNICODE | JSON_UNESCAPED_SLASHES | JSON_INVALID_UTF8_SUBSTITUTE);
+}
+
+function respostaErro($mensagem) {
+    return respostaJson(['status' => 'erro', 'mensagem' => trim($mensagem)]);
+}
+
+/**
+ * Milissegundos decorridos desde um hrtime(true)
+ */
+function milissegundosDesde($inicio) {
+    return round((hrtime(true) - $inicio) / 1e6, 2);
+}
+
+/**
+ * Loop do worker persistente
+ * Lê um job JSON por linha do STDIN ({"xml": caminho, "nome": opcional, "destino": opcional})
+ * e responde uma linha JSON no STDOUT para cada job.
+ * Com "conteudo" (XML em base64) o worker não acessa o disco: o PDF volta
+ * em "pdf_base64" e o Python grava o arquivo.
+ * Encerra ao fim do STDIN ou quando a memória passa do limite informado,
+ * para que o Python recicle o processo.
+ */
+function executarWorker($limiteMemoria) {
+    // Avisos do PHP vão para o STDERR para não corromper o protocolo no STDOUT
+    ini_set('display_errors', 'stderr');
+    
+    while (($linha = fgets(STDIN)) !== false) {
+        $linha = trim($linha);
+        if ($linha === '') {
+            continue;
+        }
+        
+        try {
+            $job = json_decode($linha, true);
+            if (!is_array($job) || (empty($job['xml']) && !isset($job['conteudo']))) {
+                throw new Exception("Job inválido: " . substr($linha, 0, 200));
+            }
+            if (isset($job['conteudo'])) {
+                $resposta = respostaJson(gerarDanfeConteudo($job['conteudo']));
+            } else {
+                $resposta = respostaJson(gerarDanfe(
+                    $job['xml'],
+                    isset($job['nome']) ? $job['nome'] : null,
+                    isset($job['destino']) ? $job['destino'] : null
+                ));
+            }
+        } catch (Throwable $e) {
+            $resposta = respostaErro($e->getMessage());
+        }
+        
+        // Uma única linha por job
+        fwrite(STDOUT, $resposta . "\n");
+        fflush(STDOUT);
+        
+        gc_collect_cycles();
+        if ($limiteMemoria > 0 && memory_get_usage(true) > $limiteMemoria) {
+            break;
+        }
+    }
+    
+    return 0;
+}
+
+/**
+ * Gera a DANFE de um arquivo XML e retorna o resultado do protocolo
+ * (caminho do PDF, páginas, bytes e tempos de parse/render/escrita)
+ * Com $destino o PDF é gravado direto no caminho final (ex.: pasta de saída local
+ * para XMLs em rede), sem passar pela pasta do XML
+ * Lança Exception em qualquer falha de leitura, validação ou gravação
+ */
+function gerarDanfe($arquivoXML, $nomePersonalizado = null, $destino = null) {
+    $inicio = hrtime(true);
+    
+    // Verifica se arquivo XML existe
+    if (!file_exists($arquivoXML)) {
+        throw new Exception("Arquivo '$arquivoXML' não encontrado!");
+    }
+    
     // Carrega o XML da nota fiscal
     $xml = file_get_contents($arquivoXML);
     
@@ -56,9 +169,95 @@ try {
         throw new Exception("Arquivo XML está vazio");
     }
     
+    $renderizado = renderizarDanfe($xml, $inicio);
+    $pdf = $renderizado['pdf'];
+    $inicio = hrtime(true);
+    
+    // Nome do arquivo PDF - LÓGICA CORRIGIDA SEM _DANFE
+    if ($destino) {
+        $nomePDF = $destino;
+    } elseif ($nomePersonalizado) {
+        // Se nome personalizado foi fornecido, usar ele (sem extensão)
+        $nomeBase = basename($nomePersonalizado, '.pdf'); // Remove .pdf se fornecido
+        $nomePDF = dirname($arquivoXML) . '/' . $nomeBase . '.pdf';
+    } else {
+        // Comportamento padrão - apenas o nome do XML (SEM _DANFE)
+        $nomeBase = basename($arquivoXML, '.xml');
+        $nomePDF = dirname($arquivoXML) . '/' . $nomeBase . '.pdf';
+    }
+    
+    // Salva o PDF em arquivo temporário na mesma pasta e renomeia: quem lê o
+    // destino nunca encontra um PDF pela metade
+    $temporario = $nomePDF . '.' . getmypid() . '.tmp';
+    $bytesEscritos = file_put_contents($temporario, $pdf);
+    
+    if ($bytesEscritos === false) {
+        throw new Exception("Não foi possível salvar o arquivo PDF");
+    }
+    
+    if ($bytesEscritos == 0) {
+        @unlink($temporario);
+        throw new Exception("PDF salvo está vazio");
+    }
+    
+    if (!rename($temporario, $nomePDF)) {
+        @unlink($temporario);
+        throw new Exception("Não foi possível gravar o PDF em $nomePDF");
+    }
+    
+    // Verifica se o arquivo foi realmente criado
+    if (!file_exists($nomePDF)) {
+        throw new Exception("Arquivo PDF não foi criado");
+    }
+    
+    return [
+        'status' => 'ok',
+        'pdf' => $nomePDF,
+        'paginas' => $renderizado['paginas'],
+        'bytes' => $bytesEscritos,
+        'tempos_ms' => $renderizado['tempos_ms'] + ['escrita' => milissegundosDesde($inicio)],
+    ];
+}
+
+/**
+ * Gera a DANFE de um XML recebido em base64 e devolve o PDF em base64,
+ * sem leitura nem gravação de arquivos (o Python cuida do disco)
+ */
+function gerarDanfeConteudo($conteudoBase64) {
+    $inicio = hrtime(true);
+    $xml = base64_decode($conteudoBase64, true);
+    
+    if ($xml === false) {
+        throw new Exception("Conteúdo do XML não está em base64");
+    }
+    
+    if (empty($xml)) {
+        throw new Exception("Arquivo XML está vazio");
+    }
+    
+    $renderizado = renderizarDanfe($xml, $inicio);
+    
+    return [
+        'status' => 'ok',
+        'pdf_base64' => base64_encode($renderizado['pdf']),
+        'paginas' => $renderizado['paginas'],
+        'bytes' => strlen($renderizado['pdf']),
+        'tempos_ms' => $renderizado['tempos_ms'],
+    ];
+}
+
+/**
+ * Valida o XML, injeta os dados de rastro e renderiza a DANFE em memória
+ * Retorna o PDF, o número de páginas e os tempos de parse/render; $inicio
+ * (hrtime) permite incluir a leitura do XML no tempo de parse
+ */
+function renderizarDanfe($xml, $inicio = null) {
+    $inicio = $inicio ?? hrtime(true);
+    
     // Verifica se é um XML válido
     $dom = new DOMDocument();
     libxml_use_internal_errors(true);
+    libxml_clear_errors();
     $valid = $dom->loadXML($xml);
     
     if (!$valid) {
@@ -67,6 +266,7 @@ try {
         foreach ($errors as $error) {
             $errorMsg .= $error->message . " ";
         }
+        libxml_clear_errors();
         throw new Exception($errorMsg);
     }
     
@@ -89,8 +289,12 @@ try {
         throw new Exception("Tag modelo não encontrada no XML");
     }
     
-    // CUSTOMIZAÇÃO: Processar XML para incluir dados de rastro na descrição
-    $xml_customizado = adicionarDadosRastroNaDescricao($xml);
+    // CUSTOMIZAÇÃO: incluir dados de rastro na descrição, no mesmo DOM já validado
+    // Só reserializa se algum produto tiver rastro; senão o Danfe recebe o XML original
+    $xml_customizado = adicionarDadosRastroNaDescricao($dom, $xpath) ? $dom->saveXML() : $xml;
+    
+    $tempoParse = milissegundosDesde($inicio);
+    $inicio = hrtime(true);
     
     // Cria o gerador de DANFE com XML customizado
     $danfe = new Danfe($xml_customizado);
@@ -105,58 +309,27 @@ try {
         throw new Exception("PDF gerado está vazio");
     }
     
-    // Nome do arquivo PDF - LÓGICA CORRIGIDA SEM _DANFE
-    if ($nomePersonalizado) {
-        // Se nome personalizado foi fornecido, usar ele (sem extensão)
-        $nomeBase = basename($nomePersonalizado, '.pdf'); // Remove .pdf se fornecido
-        $nomePDF = dirname($arquivoXML) . '/' . $nomeBase . '.pdf';
-    } else {
-        // Comportamento padrão - apenas o nome do XML (SEM _DANFE)
-        $nomeBase = basename($arquivoXML, '.xml');
-        $nomePDF = dirname($arquivoXML) . '/' . $nomeBase . '.pdf';
-    }
-    
-    // Salva o PDF
-    $bytesEscritos = file_put_contents($nomePDF, $pdf);
-    
-    if ($bytesEscritos === false) {
-        throw new Exception("Não foi possível salvar o arquivo PDF");
-    }
-    
-    if ($bytesEscritos == 0) {
-        throw new Exception("PDF salvo está vazio");
-    }
-    
-    // Verifica se o arquivo foi realmente criado
-    if (!file_exists($nomePDF)) {
-        throw new Exception("Arquivo PDF não foi criado");
-    }
-    
-    // Retorna sucesso para o Python
-    echo "SUCCESS:$nomePDF\n";
-    
-} catch (Exception $e) {
-    // Retorna erro para o Python
-    echo "ERROR:" . $e->getMessage() . "\n";
-    exit(1);
+    return [
+        'pdf' => $pdf,
+        'paginas' => preg_match_all('#/Type\s*/Page\b(?!s)#', $pdf),
+        'tempos_ms' => [
+            'parse' => $tempoParse,
+            'render' => milissegundosDesde($inicio),
+        ],
+    ];
 }
 
 /**
  * Função para adicionar dados de rastro na descrição do produto
  * Inclui: nLote, qLote, dFab, dVal dentro da descrição do produto
+ * Altera o DOM recebido e retorna true se alguma descrição mudou
+ *
+ * Uma única consulta XPath localiza os det/prod; o restante é uma passada
+ * em ordem pelos filhos de cada prod (xProd e rastro), sem consultas por item
  */
-function adicionarDadosRastroNaDescricao($xml) {
+function adicionarDadosRastroNaDescricao($dom, $xpath) {
+    $alterado = false;
     try {
-        $dom = new DOMDocument();
-        $dom->preserveWhiteSpace = false;
-        $dom->formatOutput = true;
-        
-        if (!$dom->loadXML($xml)) {
-            return $xml; // Retorna XML original se não conseguir processar
-        }
-        
-        $xpath = new DOMXPath($dom);
-        
         // Registrar namespaces se necessário
         $xpath->registerNamespace('nfe', 'http://www.portalfiscal.inf.br/nfe');
         
@@ -164,71 +337,78 @@ function adicionarDadosRastroNaDescricao($xml) {
         $produtos = $xpath->query('//det/prod | //nfe:det/nfe:prod');
         
         foreach ($produtos as $prod) {
-            // Buscar elemento rastro
-            $rastros = $xpath->query('.//rastro | .//nfe:rastro', $prod);
+            $xProd = null;
+            $rastroInfo = [];
             
-            if ($rastros->length > 0) {
-                $rastroInfo = [];
-                
-                foreach ($rastros as $rastro) {
-                    $infoRastro = [];
-                    
-                    // Extrair dados de rastro
-                    $nLote = $xpath->query('.//nLote | .//nfe:nLote', $rastro);
-                    $qLote = $xpath->query('.//qLote | .//nfe:qLote', $rastro);
-                    $dFab = $xpath->query('.//dFab | .//nfe:dFab', $rastro);
-                    $dVal = $xpath->query('.//dVal | .//nfe:dVal', $rastro);
-                    
-                    if ($nLote->length > 0) {
-                        $infoRastro[] = "LOTE: " . trim($nLote->item(0)->nodeValue);
-                    }
-                    
-                    if ($qLote->length > 0) {
-                        $qtd = number_format(floatval($qLote->item(0)->nodeValue), 3, ',', '.');
-                        $infoRastro[] = "QTD LOTE: " . $qtd;
-                    }
-                    
-                    if ($dFab->length > 0) {
-                        $dataFab = formatarData($dFab->item(0)->nodeValue);
-                        $infoRastro[] = "FAB: " . $dataFab;
-                    }
-                    
-                    if ($dVal->length > 0) {
-                        $dataVal = formatarData($dVal->item(0)->nodeValue);
-                        $infoRastro[] = "VAL: " . $dataVal;
-                    }
-                    
+            for ($filho = $prod->firstChild; $filho !== null; $filho = $filho->nextSibling) {
+                if ($filho->nodeType !== XML_ELEMENT_NODE) {
+                    continue;
+                }
+                if ($filho->localName === 'xProd') {
+                    $xProd = $xProd ?? $filho;
+                } elseif ($filho->localName === 'rastro') {
+                    $infoRastro = lerDadosRastro($filho);
                     if (!empty($infoRastro)) {
                         $rastroInfo[] = implode(' | ', $infoRastro);
                     }
                 }
+            }
+            
+            // Adicionar informações de rastro à descrição do produto
+            if (!empty($rastroInfo) && $xProd !== null) {
+                $descricaoOriginal = trim($xProd->nodeValue);
                 
-                // Adicionar informações de rastro à descrição do produto
-                if (!empty($rastroInfo)) {
-                    $xProd = $xpath->query('.//xProd | .//nfe:xProd', $prod);
-                    
-                    if ($xProd->length > 0) {
-                        $descricaoOriginal = trim($xProd->item(0)->nodeValue);
-                        
-                        // Criar box visual para os dados de rastro
-                        $dadosRastro = "\n" . str_repeat("-", 45) . "\n";
-                        $dadosRastro .= "📋 DADOS DE RASTRO:\n";
-                        $dadosRastro .= implode("\n", $rastroInfo) . "\n";
-                        $dadosRastro .= str_repeat("-", 45);
-                        
-                        $novaDescricao = $descricaoOriginal . $dadosRastro;
-                        $xProd->item(0)->nodeValue = $novaDescricao;
-                    }
-                }
+                // Criar box visual para os dados de rastro
+                $dadosRastro = "\n" . str_repeat("-", 45) . "\n";
+                $dadosRastro .= "📋 DADOS DE RASTRO:\n";
+                $dadosRastro .= implode("\n", $rastroInfo) . "\n";
+                $dadosRastro .= str_repeat("-", 45);
+                
+                $xProd->nodeValue = $descricaoOriginal . $dadosRastro;
+                $alterado = true;
             }
         }
         
-        return $dom->saveXML();
+        return $alterado;
         
     } catch (Exception $e) {
-        // Em caso de erro, retorna XML original
-        return $xml;
+        // Em caso de erro, o Danfe usa o XML original
+        return false;
+    }
+}
+
+/**
+ * Dados de um grupo rastro (primeira ocorrência de nLote, qLote, dFab e dVal)
+ * formatados para a descrição, na ordem LOTE, QTD LOTE, FAB, VAL
+ */
+function lerDadosRastro($rastro) {
+    $valores = [];
+    for ($campo = $rastro->firstChild; $campo !== null; $campo = $campo->nextSibling) {
+        if ($campo->nodeType === XML_ELEMENT_NODE && !isset($valores[$campo->localName])) {
+            $valores[$campo->localName] = $campo->nodeValue;
+        }
+    }
+    
+    $infoRastro = [];
+    
+    if (isset($valores['nLote'])) {
+        $infoRastro[] = "LOTE: " . trim($valores['nLote']);
     }
+    
+    if (isset($valores['qLote'])) {
+        $qtd = number_format(floatval($valores['qLote']), 3, ',', '.');
+        $infoRastro[] = "QTD LOTE: " . $qtd;
+    }
+    
+    if (isset($valores['dFab'])) {
+        $infoRastro[] = "FAB: " . formatarData($valores['dFab']);
+    }
+    
+    if (isset($valores['dVal'])) {
+        $infoRastro[] = "VAL: " . formatarData($valores['dVal']);
+    }
+    
+    return $infoRastro;
 }
 
 /**
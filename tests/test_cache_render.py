@@ -0,0 +1,81 @@
+"""Versão do cache de PDFs: gerador, vendor/ e executável PHP"""
+
+import os
+import stat
+
+import pytest
+
+from danfe_motor import MotorDanfe
+
+XML = b"<nfeProc><NFe><infNFe Id='NFe35240112345678000199550010000000011000000019'/></NFe></nfeProc>"
+CHAVE = "35240112345678000199550010000000011000000019"
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="PHP falso em shell script")
+
+
+def criar_php(caminho, versao):
+    with open(caminho, "w") as f:
+        f.write(f"#!/bin/sh\nprintf '%s' '{versao}'\n")
+    os.chmod(caminho, os.stat(caminho).st_mode | stat.S_IEXEC)
+    return str(caminho)
+
+
+@pytest.fixture
+def projeto(tmp_path, monkeypatch):
+    monkeypatch.setenv("RENAMERPRO_DADOS", str(tmp_path / "dados"))
+    pasta = tmp_path / "projeto"
+    (pasta / "vendor" / "composer").mkdir(parents=True)
+    (pasta / "gerador_danfe.php").write_text("<?php // v1")
+    (pasta / "vendor" / "composer" / "installed.json").write_text('{"sped-da": "1.0"}')
+    return pasta
+
+
+def motor_para(projeto, php):
+    motor = MotorDanfe(log=lambda *_: None)
+    motor.caminhos_php = lambda: (php, str(projeto / "gerador_danfe.php"), str(projeto))
+    return motor
+
+
+def pdf_em_cache(motor, tmp_path):
+    """True se o PDF guardado pela primeira execução é entregue a este motor"""
+    cache = motor.obter_cache_render()
+    return cache.obter(cache.identificar(XML, CHAVE), str(tmp_path / "saida.pdf"))
+
+
+@pytest.fixture
+def cache_preenchido(projeto, tmp_path):
+    php = criar_php(tmp_path / "php", "8.1.0")
+    cache = motor_para(projeto, php).obter_cache_render()
+    pdf = tmp_path / "gerado.pdf"
+    pdf.write_bytes(b"%PDF-1.4 gerado")
+    cache.guardar(cache.identificar(XML, CHAVE), str(pdf))
+    return php
+
+
+def test_mesmo_renderizador_usa_cache(projeto, tmp_path, cache_preenchido):
+    assert pdf_em_cache(motor_para(projeto, cache_preenchido), tmp_path)
+
+
+def test_gerador_alterado_invalida(projeto, tmp_path, cache_preenchido):
+    (projeto / "gerador_danfe.php").write_text("<?php // v2")
+    assert not pdf_em_cache(motor_para(projeto, cache_preenchido), tmp_path)
+
+
+def test_vendor_atualizado_invalida(projeto, tmp_path, cache_preenchido):
+    (projeto / "vendor" / "composer" / "installed.json").write_text('{"sped-da": "1.1"}')
+    assert not pdf_em_cache(motor_para(projeto, cache_preenchido), tmp_path)
+
+
+def test_outro_executavel_php_invalida(projeto, tmp_path, cache_preenchido):
+    outro = tmp_path / "outro"
+    outro.mkdir()
+    assert not pdf_em_cache(motor_para(projeto, criar_php(outro / "php", "8.1.0")), tmp_path)
+
+
+def test_outra_versao_php_invalida(projeto, tmp_path, cache_preenchido):
+    criar_php(cache_preenchido, "8.3.0")
+    assert not pdf_em_cache(motor_para(projeto, cache_preenchido), tmp_path)
+
+
+def test_php_que_nao_roda_invalida(projeto, tmp_path, cache_preenchido):
+    assert not pdf_em_cache(motor_para(projeto, str(tmp_path / "php-inexistente")), tmp_path)
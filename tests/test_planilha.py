@@ -0,0 +1,36 @@
+"""Leitura de CSVs: separador detectado só entre ";", "," e tabulação"""
+
+import pytest
+
+from danfe_planilha import ler_planilha
+
+CHAVE = "35240112345678000199550010000000011000000019"
+OUTRA = "35240112345678000199550010000000021000000024"
+
+
+def gravar(tmp_path, texto, codificacao="utf-8"):
+    caminho = tmp_path / "mapa.csv"
+    caminho.write_bytes(texto.encode(codificacao))
+    return str(caminho)
+
+
+def test_csv_coluna_unica_de_chaves(tmp_path):
+    tabela = ler_planilha(gravar(tmp_path, f"chave\n{CHAVE}\n{OUTRA}\n"))
+    assert list(tabela.columns) == ["chave"]
+    assert list(tabela["chave"]) == [CHAVE, OUTRA]
+
+
+def test_csv_coluna_unica_de_nomes_com_letra_em_comum(tmp_path):
+    nomes = ["nova venda", "vivo", "valvula"]
+    tabela = ler_planilha(gravar(tmp_path, "nome\n" + "\n".join(nomes) + "\n"))
+    assert list(tabela.columns) == ["nome"]
+    assert list(tabela["nome"]) == nomes
+
+
+@pytest.mark.parametrize("separador", [";", ",", "\t"])
+def test_csv_duas_colunas(tmp_path, separador):
+    texto = f"chave{separador}nome\n{CHAVE}{separador}nota fiscal\n{OUTRA}{separador}devolução\n"
+    tabela = ler_planilha(gravar(tmp_path, texto, "cp1252"))
+    assert list(tabela.columns) == ["chave", "nome"]
+    assert list(tabela["nome"]) == ["nota fiscal", "devolução"]
+    assert list(tabela["chave"]) == [CHAVE, OUTRA]